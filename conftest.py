@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Tests import the core package as my_hf_program and the API server modules by name, as api.py does
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, "deployment", "api_server"))
+
+# The API server modules read their settings at import; keep their files out of the real data directory
+os.environ.setdefault("QC_DATA_DIR", tempfile.mkdtemp(prefix="qc-test-data-"))
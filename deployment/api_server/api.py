@@ -1,15 +1,18 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Depends, Header, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, RedirectResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-import tempfile
 import os
 import sys
 import shutil
 import time
 import uuid
+import asyncio
+import hashlib
 import uvicorn
 import json
+import math
 from pathlib import Path
 
 # Add parent directory to path to import the quantum chemistry modules
@@ -17,7 +20,18 @@ parent_dir = str(Path(__file__).resolve().parent.parent.parent)
 sys.path.append(parent_dir)
 
 from my_hf_program.visualize_trajectory_py3dmol import read_xyz_trajectory, visualize_trajectory_py3dmol
-from my_hf_program.optimize_geometry import optimize_geometry
+from my_hf_program.instrumentation import REGISTRY
+from my_hf_program.viewer_bundle import VIEWER_VERSION, BUNDLE_FILES, THREEDMOL_URL, bundle_path
+from my_hf_program.memory_planner import MEMORY_BUDGET_MB, MemoryBudgetError
+
+sys.path.append(str(Path(__file__).resolve().parent))
+from job_store import JobStore, QueueFull
+from spool import SpoolQueue
+from jobs import (TEMP_DIR, JOB_DB, SPOOL_DIR, RESULT_FILES, VIEWER_URL, JOB_CPU_SECONDS, JOB_MEMORY_BUDGET_MB,
+                  WARM_WORKERS, read_progress, single_point_energy, preload_compute)
+from energy import build_molecule, plan_scf
+from artifacts import serve_artifact, precompress
+from worker import Worker
 
 app = FastAPI(
     title="Quantum Chemistry API",
@@ -25,18 +39,65 @@ app = FastAPI(
     version="1.0.0",
 )
 
-# Configuration
-TEMP_DIR = os.path.join(tempfile.gettempdir(), "quantum-chemistry-api")
-os.makedirs(TEMP_DIR, exist_ok=True)
+# Persistent job records on this host, and the work queue shared with workers on any host
+job_store = JobStore(JOB_DB, queue=SpoolQueue(SPOOL_DIR))
+REAPER_INTERVAL = float(os.environ.get("QC_REAPER_INTERVAL", 60))
+QUEUE_SYNC_INTERVAL = float(os.environ.get("QC_QUEUE_SYNC_INTERVAL", 1))
+
+# Jobs run by a worker embedded in the API process; 0 leaves them to standalone workers (worker.py)
+MAX_WORKERS = int(os.environ.get("QC_MAX_WORKERS", os.cpu_count() or 1))
+MAX_QUEUE = int(os.environ.get("QC_MAX_QUEUE", 32))
+MAX_BATCH = int(os.environ.get("QC_MAX_BATCH", 1000))
+JOB_LIFETIME = 60 * 60 * 24  # 24 hours
+
+# Single points up to this size run inline in /energy; larger ones are queued
+ENERGY_MAX_ATOMS = int(os.environ.get("QC_ENERGY_MAX_ATOMS", 20))
+ENERGY_MAX_BASIS = int(os.environ.get("QC_ENERGY_MAX_BASIS", 150))
+# Memory the inline path may use for integrals in the API process itself (QC_MEMORY_BUDGET_MB)
+ENERGY_MEMORY_MB = MEMORY_BUDGET_MB
+local_worker = Worker(job_store.queue, concurrency=MAX_WORKERS) if MAX_WORKERS > 0 else None
+
+# Metrics: request latency here; stage timings come from the instrumented modules and job processes
+HTTP_SECONDS = REGISTRY.histogram("qc_http_request_duration_seconds", "API request latency by route")
+REGISTRY.gauge("qc_queue_depth", "Jobs waiting to be claimed by a worker",
+               lambda: [({}, job_store.count_status("pending"))])
+REGISTRY.gauge("qc_jobs", "Unexpired jobs by status",
+               lambda: [({"status": status}, n) for status, n in job_store.count_by_status().items()])
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    )
+    return response
+
 
-# Store temporary files with their expiration
-file_storage = {}
+# Progress streaming: how often job files are polled, and idle time between keep-alive messages
+EVENT_POLL_INTERVAL = float(os.environ.get("QC_EVENT_POLL_INTERVAL", 0.5))
+EVENT_KEEPALIVE = 15.0
 
 # Models
 class OptimizationRequest(BaseModel):
     charge: int = 0
     basis: str = "sto-3g"
     max_steps: int = 100
+    priority: int = 0
+
+def optimization_form(
+    charge: int = Form(0),
+    basis: str = Form("sto-3g"),
+    max_steps: int = Form(100),
+    priority: int = Form(0)
+) -> OptimizationRequest:
+    """Read optimization parameters from the multipart form sent with the molecule"""
+    return OptimizationRequest(charge=charge, basis=basis, max_steps=max_steps, priority=priority)
 
 class OptimizationResult(BaseModel):
     job_id: str
@@ -44,26 +105,159 @@ class OptimizationResult(BaseModel):
     message: str
     result_url: Optional[str] = None
     visualization_url: Optional[str] = None
+    queue_position: Optional[int] = None
+
+class EnergyResult(BaseModel):
+    energy: float
+    converged: bool
+    scf_cycles: Optional[int] = None
+    n_basis: int
+    cached: bool
+    elapsed_ms: float
+
+class BatchJob(OptimizationResult):
+    name: str
+    deduplicated: bool = False
+
+class BatchResult(BaseModel):
+    batch_id: str
+    jobs: List[BatchJob]
+    counts: Dict[str, int]
 
 
 # Helpers
-def cleanup_old_files():
-    """Clean up expired temporary files"""
-    now = time.time()
-    for job_id, file_info in list(file_storage.items()):
-        if now > file_info["expires_at"]:
-            cleanup_job(job_id)
-
-def cleanup_job(job_id: str):
-    """Remove a job's files"""
-    if job_id in file_storage:
+def job_result(job_id: str, job_info: Dict[str, Any]) -> OptimizationResult:
+    """Status response for a job record, with result URLs once it is complete"""
+    result = OptimizationResult(
+        job_id=job_id,
+        status=job_info["status"],
+        message=job_info.get("message", ""),
+        queue_position=job_store.queue_position(job_id)
+    )
+    if job_info["status"] == "complete" and job_info.get("kind") in RESULT_FILES:
+        base_url = f"/files/{job_id}"
+        result_file, visualization_file = RESULT_FILES[job_info["kind"]]
+        result.result_url = f"{base_url}/{result_file}"
+        if visualization_file:
+            result.visualization_url = f"{base_url}/{visualization_file}"
+    return result
+
+
+def split_xyz(text: str):
+    """Molecules of an XYZ file with one or more frames, as (comment, atom lines) pairs"""
+    lines = text.splitlines()
+    molecules = []
+    i = 0
+    while i < len(lines):
+        if not lines[i].strip():
+            i += 1
+            continue
+        n_atoms = int(lines[i].split()[0])
+        if n_atoms < 1:
+            raise ValueError(f"Invalid atom count on line {i + 1}")
+        atom_lines = [line.strip() for line in lines[i + 2:i + 2 + n_atoms]]
+        if len(atom_lines) < n_atoms or any(len(line.split()) < 4 for line in atom_lines):
+            raise ValueError(f"Truncated XYZ frame starting at line {i + 1}")
+        for j, line in enumerate(atom_lines):
+            try:
+                coords = [float(x) for x in line.split()[1:4]]
+            except ValueError:
+                coords = [math.nan]
+            if not all(map(math.isfinite, coords)):
+                raise ValueError(f"Invalid coordinates on line {i + 3 + j}")
+        comment = lines[i + 1].strip() if i + 1 < len(lines) else ""
+        molecules.append((comment, atom_lines))
+        i += 2 + n_atoms
+    return molecules
+
+
+def content_job_id(atom_lines: List[str], params: OptimizationRequest) -> str:
+    """Job id derived from the atoms and the settings that affect the result"""
+    atoms = []
+    for line in atom_lines:
+        parts = line.split()
+        atoms.append([parts[0].capitalize(), *(round(float(x), 6) + 0.0 for x in parts[1:4])])
+    payload = json.dumps({
+        "atoms": atoms,
+        "charge": params.charge,
+        "basis": params.basis.lower(),
+        "max_steps": params.max_steps
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def queue_full(detail: str) -> HTTPException:
+    """HTTP 429 for a request that would overfill the job queue"""
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": "30"})
+
+
+def plan_job(atom_lines: List[str], basis: str) -> Dict[str, Any]:
+    """
+    Integral strategy for a queued job on the workers' memory budget
+
+    Rejects molecules that no strategy fits into the budget (or into the
+    per-job CPU limit) with 413 and the estimate, before anything is queued.
+    """
+    symbols = [line.split()[0] for line in atom_lines]
+    try:
+        return plan_scf(symbols, basis, budget_mb=JOB_MEMORY_BUDGET_MB, max_seconds=JOB_CPU_SECONDS)
+    except MemoryBudgetError as e:
+        raise HTTPException(status_code=413, detail=f"Molecule too large for this server: {str(e)}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def plan_batch(entries, basis: str) -> Dict[str, str]:
+    """Integral strategy by job id for batch entries; the first molecule that cannot fit rejects the batch"""
+    strategies = {}
+    for name, _, atom_lines, job_id in entries:
         try:
-            job_dir = file_storage[job_id]["directory"]
-            if os.path.exists(job_dir):
-                shutil.rmtree(job_dir)
-            del file_storage[job_id]
-        except Exception as e:
-            print(f"Error cleaning up job {job_id}: {str(e)}")
+            strategies[job_id] = plan_job(atom_lines, basis)["strategy"]
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{name}: {e.detail}")
+    return strategies
+
+
+async def job_events(job_id: str, from_step: int = 0):
+    """
+    Yield (event, data) pairs for a job until it finishes
+
+    "step" events carry one optimization step (step, energy, grad_norm,
+    scf_cycles, coords) and start after ``from_step``; "status" events report
+    status changes. A "keepalive" with no data is yielded while nothing happens.
+    """
+    offset = 0
+    last_step = from_step
+    last_status = None
+    idle = 0.0
+    while True:
+        # Read the status first: once it is final, the progress file is complete
+        job_info = job_store.get(job_id)
+        if job_info is None:
+            yield "status", {"status": "expired", "message": "Job not found"}
+            return
+        events, offset = read_progress(job_info["directory"], offset)
+        sent = False
+        for event in events:
+            if event["step"] > last_step:
+                last_step = event["step"]
+                sent = True
+                yield "step", event
+        if job_info["status"] != last_status:
+            last_status = job_info["status"]
+            sent = True
+            yield "status", {
+                "status": last_status,
+                "message": job_info.get("message", ""),
+                "queue_position": job_store.queue_position(job_id)
+            }
+        if last_status in ("complete", "failed"):
+            return
+        idle = 0.0 if sent else idle + EVENT_POLL_INTERVAL
+        if idle >= EVENT_KEEPALIVE:
+            idle = 0.0
+            yield "keepalive", None
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
 
 
 # API routes
@@ -74,12 +268,21 @@ def read_root():
 
 @app.post("/optimize", response_model=OptimizationResult)
 async def start_optimization(
-    background_tasks: BackgroundTasks,
-    params: OptimizationRequest,
+    params: OptimizationRequest = Depends(optimization_form),
     molecule: UploadFile = File(...)
 ):
     """Start a geometry optimization job"""
     
+    # Reject molecules too large for the workers up front
+    content = await molecule.read()
+    try:
+        frames = split_xyz(content.decode())
+    except (ValueError, IndexError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid XYZ file: {str(e)}")
+    if not frames:
+        raise HTTPException(status_code=400, detail="No molecule found in the upload")
+    choice = await run_in_threadpool(plan_job, frames[0][1], params.basis)
+    
     # Create a unique job ID and directory
     job_id = str(uuid.uuid4())
     job_dir = os.path.join(TEMP_DIR, job_id)
@@ -88,95 +291,317 @@ async def start_optimization(
     # Save the uploaded molecule
     molecule_path = os.path.join(job_dir, "input.xyz")
     with open(molecule_path, "wb") as f:
-        f.write(await molecule.read())
+        f.write(content)
     
-    # Store job info
-    file_storage[job_id] = {
-        "directory": job_dir,
-        "expires_at": time.time() + 60 * 60 * 24,  # 24 hours
-        "status": "pending"
-    }
-    
-    # Start optimization in background
-    background_tasks.add_task(
-        run_optimization,
-        job_id,
-        molecule_path,
-        params.charge,
-        params.basis,
-        params.max_steps
-    )
+    # Queue optimization for the workers; admission control across all API processes sharing the queue
+    try:
+        job_store.enqueue(
+            job_id,
+            directory=job_dir,
+            expires_at=time.time() + JOB_LIFETIME,
+            kind="optimize",
+            params={
+                "molecule_path": molecule_path,
+                "charge": params.charge,
+                "basis": params.basis,
+                "max_steps": params.max_steps,
+                "scf_strategy": choice["strategy"]
+            },
+            priority=params.priority,
+            max_pending=MAX_QUEUE
+        )
+    except QueueFull as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise queue_full(str(e))
     
     # Return initial response
     return OptimizationResult(
         job_id=job_id,
         status="pending",
-        message="Optimization job started"
+        message="Optimization job queued",
+        queue_position=job_store.queue_position(job_id)
+    )
+
+
+@app.post("/energy", response_model=EnergyResult, responses={202: {"model": OptimizationResult}})
+async def compute_energy(
+    charge: int = Form(0),
+    basis: str = Form("sto-3g"),
+    molecule: UploadFile = File(...)
+):
+    """
+    Single-point RHF energy
+    
+    Small molecules are computed inline and answered directly; molecules over
+    the size limit are queued as a job, answered with 202 and the job's URL.
+    """
+    
+    try:
+        frames = split_xyz((await molecule.read()).decode())
+    except (ValueError, IndexError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid XYZ file: {str(e)}")
+    if len(frames) != 1:
+        raise HTTPException(status_code=400, detail="Expected exactly one molecule")
+    comment, atom_lines = frames[0]
+    symbols = [line.split()[0].capitalize() for line in atom_lines]
+    coords = [[float(x) for x in line.split()[1:4]] for line in atom_lines]
+    
+    # Fast path: compute in the server's thread pool with warm basis and result caches
+    if len(symbols) <= ENERGY_MAX_ATOMS:
+        try:
+            mol = await run_in_threadpool(build_molecule, symbols, coords, charge, basis)
+        except RuntimeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if mol.nao <= ENERGY_MAX_BASIS:
+            try:
+                choice = await run_in_threadpool(plan_scf, symbols, basis, ENERGY_MEMORY_MB)
+            except MemoryBudgetError:
+                choice = None  # too large for the API process; a worker may still fit it
+            if choice is not None:
+                return await run_in_threadpool(single_point_energy, symbols, coords, charge, basis, mol=mol,
+                                               strategy=choice["strategy"], max_memory_mb=ENERGY_MEMORY_MB)
+    
+    # Too large to answer inline: queue it for the workers, if any strategy fits their budget
+    choice = await run_in_threadpool(plan_job, atom_lines, basis)
+    job_id = str(uuid.uuid4())
+    job_dir = os.path.join(TEMP_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    molecule_path = os.path.join(job_dir, "input.xyz")
+    with open(molecule_path, "w") as f:
+        f.write(f"{len(atom_lines)}\n{comment}\n" + "\n".join(atom_lines) + "\n")
+    try:
+        job_store.enqueue(
+            job_id,
+            directory=job_dir,
+            expires_at=time.time() + JOB_LIFETIME,
+            kind="energy",
+            params={"molecule_path": molecule_path, "charge": charge, "basis": basis,
+                    "scf_strategy": choice["strategy"]},
+            max_pending=MAX_QUEUE
+        )
+    except QueueFull as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise queue_full(str(e))
+    queued = OptimizationResult(
+        job_id=job_id,
+        status="pending",
+        message="Molecule exceeds the inline size limit; energy job queued",
+        queue_position=job_store.queue_position(job_id)
     )
+    return JSONResponse(status_code=202, content=queued.dict(), headers={"Location": f"/jobs/{job_id}"})
+
+
+@app.post("/optimize/batch", response_model=BatchResult)
+async def start_batch_optimization(
+    params: OptimizationRequest = Depends(optimization_form),
+    molecules: List[UploadFile] = File(...)
+):
+    """
+    Start geometry optimizations for many molecules with shared parameters
+    
+    Each upload may hold several molecules as consecutive XYZ frames. Job ids
+    are content hashes, so a molecule submitted before with the same settings
+    maps to its existing job (and result) instead of being recomputed.
+    """
+    
+    # Parse every molecule before queueing anything
+    entries = []
+    for upload in molecules:
+        try:
+            frames = split_xyz((await upload.read()).decode())
+        except (ValueError, IndexError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid XYZ file {upload.filename}: {str(e)}")
+        for index, (comment, atom_lines) in enumerate(frames):
+            name = upload.filename if len(frames) == 1 else f"{upload.filename}[{index}]"
+            entries.append((name, comment, atom_lines, content_job_id(atom_lines, params)))
+    if not entries:
+        raise HTTPException(status_code=400, detail="No molecules found in the upload")
+    if len(entries) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH} molecules")
+    strategies = await run_in_threadpool(plan_batch, entries, params.basis)
+    
+    # Failed jobs are retried; any other existing job is reused
+    existing = job_store.get_many(entry[3] for entry in entries)
+    reused = {job_id for job_id, job_info in existing.items() if job_info["status"] != "failed"}
+    new_ids = {entry[3] for entry in entries} - reused
+    
+    expires_at = time.time() + JOB_LIFETIME
+    new_jobs, inputs = [], {}
+    for name, comment, atom_lines, job_id in entries:
+        if job_id not in new_ids:
+            continue  # reused, or the same molecule appeared earlier in this batch
+        new_ids.discard(job_id)
+        job_dir = os.path.join(TEMP_DIR, job_id)
+        molecule_path = os.path.join(job_dir, "input.xyz")
+        inputs[job_id] = f"{len(atom_lines)}\n{comment}\n" + "\n".join(atom_lines) + "\n"
+        new_jobs.append({
+            "job_id": job_id,
+            "directory": job_dir,
+            "expires_at": expires_at,
+            "kind": "optimize",
+            "params": {
+                "molecule_path": molecule_path,
+                "charge": params.charge,
+                "basis": params.basis,
+                "max_steps": params.max_steps,
+                "scf_strategy": strategies[job_id]
+            },
+            "priority": params.priority
+        })
+    def write_input(job):
+        # Called under the job store's write lock, so the reaper cannot remove an expired job's directory meanwhile
+        os.makedirs(job["directory"], exist_ok=True)
+        with open(job["params"]["molecule_path"], "w") as f:
+            f.write(inputs[job["job_id"]])
+    
+    # All new jobs are admitted together or not at all; failed jobs being retried are replaced
+    try:
+        job_store.enqueue_many(new_jobs, max_pending=MAX_QUEUE, prepare=write_input,
+                               replace=[job["job_id"] for job in new_jobs if job["job_id"] in existing])
+    except QueueFull as e:
+        raise queue_full(f"Job queue cannot take {len(new_jobs)} more jobs ({e.pending} of {MAX_QUEUE} waiting)")
+    for job_id in reused:
+        job_store.update(job_id, expires_at=max(expires_at, existing[job_id]["expires_at"]))
+    
+    job_ids = [entry[3] for entry in entries]
+    names = [entry[0] for entry in entries]
+    batch_id = hashlib.sha256(" ".join(job_ids).encode()).hexdigest()[:32]
+    job_store.create_batch(batch_id, job_ids, names, expires_at)
+    # A molecule is deduplicated if it was submitted before or earlier in this batch
+    seen = set(reused)
+    deduplicated = []
+    for job_id in job_ids:
+        deduplicated.append(job_id in seen)
+        seen.add(job_id)
+    return batch_result(batch_id, job_ids, names, deduplicated)
+
+
+@app.get("/batches/{batch_id}", response_model=BatchResult)
+async def get_batch_status(batch_id: str):
+    """Get the status of every job in a batch"""
+    
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch_result(batch_id, *batch)
+
+
+def batch_result(batch_id: str, job_ids: List[str], names: List[str],
+                 deduplicated: Optional[List[bool]] = None) -> BatchResult:
+    """Statuses of a batch's jobs, read in one query"""
+    jobs_info = job_store.get_many(job_ids)
+    jobs = []
+    counts: Dict[str, int] = {}
+    for index, job_id in enumerate(job_ids):
+        job_info = jobs_info.get(job_id)
+        if job_info is None:
+            result = OptimizationResult(job_id=job_id, status="expired", message="Job not found")
+        else:
+            result = job_result(job_id, job_info)
+        counts[result.status] = counts.get(result.status, 0) + 1
+        jobs.append(BatchJob(
+            **result.dict(),
+            name=names[index],
+            deduplicated=deduplicated[index] if deduplicated else False
+        ))
+    return BatchResult(batch_id=batch_id, jobs=jobs, counts=counts)
 
 
 @app.get("/jobs/{job_id}", response_model=OptimizationResult)
 async def get_job_status(job_id: str):
     """Get the status of a job"""
     
-    cleanup_old_files()
-    
-    if job_id not in file_storage:
+    job_info = job_store.get(job_id)
+    if job_info is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job_info = file_storage[job_id]
+    return job_result(job_id, job_info)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, from_step: int = 0, last_event_id: Optional[str] = Header(None)):
+    """Stream a job's progress as Server-Sent Events, resuming after ``from_step`` or Last-Event-ID"""
     
-    # Build response
-    result = OptimizationResult(
-        job_id=job_id,
-        status=job_info["status"],
-        message=job_info.get("message", "")
-    )
+    if job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    # Add URLs if job is complete
-    if job_info["status"] == "complete":
-        base_url = f"/files/{job_id}"
-        result.result_url = f"{base_url}/geometry_trajectory.xyz"
-        result.visualization_url = f"{base_url}/visualization.html"
+    # Step events carry the step number as their id, so reconnecting clients resume where they left off
+    if last_event_id and last_event_id.isdigit():
+        from_step = max(from_step, int(last_event_id))
+    
+    async def sse():
+        async for event, data in job_events(job_id, from_step):
+            if event == "keepalive":
+                yield ": keepalive\n\n"
+                continue
+            event_id = f"id: {data['step']}\n" if event == "step" else ""
+            yield f"{event_id}event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return StreamingResponse(
+        sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str, from_step: int = 0):
+    """Push a job's progress over a WebSocket as JSON messages {"event": ..., "data": ...}"""
     
-    return result
+    await websocket.accept()
+    if job_store.get(job_id) is None:
+        await websocket.close(code=4404, reason="Job not found")
+        return
+    try:
+        async for event, data in job_events(job_id, from_step):
+            if event != "keepalive":
+                await websocket.send_json({"event": event, "data": data})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 
 @app.get("/files/{job_id}/{filename}")
-async def get_job_file(job_id: str, filename: str):
-    """Get a file from a job"""
+async def get_job_file(job_id: str, filename: str, request: Request):
+    """Get a file from a job, streamed with compression, ETag and range support"""
     
-    if job_id not in file_storage:
+    job_info = job_store.get(job_id)
+    if job_info is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job_dir = file_storage[job_id]["directory"]
-    file_path = os.path.join(job_dir, filename)
+    job_dir = os.path.realpath(job_info["directory"])
+    file_path = os.path.realpath(os.path.join(job_dir, filename))
     
-    if not os.path.exists(file_path):
+    if os.path.dirname(file_path) != job_dir or not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    # For HTML visualization, return HTML response
-    if filename.endswith(".html"):
-        with open(file_path, "r") as f:
-            content = f.read()
-        return HTMLResponse(content)
-    
-    # For other files, return as download
-    return FileResponse(
-        file_path,
-        filename=filename,
-        media_type="application/octet-stream"
-    )
+    # HTML is displayed inline; other files are offered as downloads
+    return serve_artifact(request, file_path, filename=filename)
+
+
+@app.get("/viewer/{version}/{filename}")
+async def get_viewer_asset(version: str, filename: str, request: Request):
+    """Static trajectory viewer bundle; versioned URLs are cached by clients indefinitely"""
+    if filename not in BUNDLE_FILES:
+        raise HTTPException(status_code=404, detail="File not found")
+    if version != VIEWER_VERSION:
+        # Pages generated by an older release still work with the current bundle
+        return RedirectResponse(f"/viewer/{VIEWER_VERSION}/{filename}", status_code=307)
+    path = bundle_path(filename)
+    if not os.path.exists(path):
+        # 3Dmol.js has not been vendored (python my_hf_program/viewer_bundle.py --vendor)
+        return RedirectResponse(THREEDMOL_URL, status_code=307)
+    return serve_artifact(request, path, cache_control="public, max-age=31536000, immutable")
 
 
 @app.get("/visualize/{job_id}")
-async def visualize_job(job_id: str):
+async def visualize_job(job_id: str, request: Request):
     """Get visualization for a job"""
     
-    if job_id not in file_storage:
+    job_info = job_store.get(job_id)
+    if job_info is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job_info = file_storage[job_id]
     job_dir = job_info["directory"]
     
     if job_info["status"] != "complete":
@@ -192,15 +617,12 @@ async def visualize_job(job_id: str):
     if not os.path.exists(html_path):
         try:
             symbols, trajectory = read_xyz_trajectory(trajectory_path)
-            visualize_trajectory_py3dmol(symbols, trajectory, html_path)
+            visualize_trajectory_py3dmol(symbols, trajectory, html_path, viewer_url=VIEWER_URL)
+            precompress(html_path)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Visualization error: {str(e)}")
     
-    # Return the HTML content
-    with open(html_path, "r") as f:
-        content = f.read()
-    
-    return HTMLResponse(content)
+    return serve_artifact(request, html_path)
 
 
 @app.post("/visualize/upload")
@@ -225,17 +647,19 @@ async def visualize_uploaded_trajectory(
     # Generate visualization
     try:
         symbols, trajectory = read_xyz_trajectory(trajectory_path)
-        visualize_trajectory_py3dmol(symbols, trajectory, html_path)
+        visualize_trajectory_py3dmol(symbols, trajectory, html_path, viewer_url=VIEWER_URL)
+        precompress(html_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Visualization error: {str(e)}")
     
     # Store job info
-    file_storage[job_id] = {
-        "directory": job_dir,
-        "expires_at": time.time() + 60 * 60,  # 1 hour
-        "status": "complete",
-        "message": "Visualization generated"
-    }
+    job_store.create(
+        job_id,
+        directory=job_dir,
+        expires_at=time.time() + 60 * 60,  # 1 hour
+        status="complete",
+        message="Visualization generated"
+    )
     
     # Return the URL to the visualization
     return {
@@ -244,6 +668,15 @@ async def visualize_uploaded_trajectory(
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: this process's samples plus those recorded by job processes"""
+    return PlainTextResponse(
+        REGISTRY.render(extra_samples=job_store.metric_samples()),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.get("/molecules", response_model=List[Dict[str, Any]])
 async def list_molecules():
     """Get a list of example molecules"""
@@ -281,54 +714,34 @@ async def startup_event():
     
     # Create example molecules if they don't exist
     create_example_molecules(examples_dir)
+    
+    # Remove expired jobs, and record what workers do with queued jobs, in the background
+    job_store.start_reaper(interval=REAPER_INTERVAL)
+    job_store.start_queue_sync(interval=QUEUE_SYNC_INTERVAL)
+    
+    if local_worker is not None:
+        if not WARM_WORKERS:
+            # Jobs are forked from this process, so import the compute stack once before the first fork
+            await run_in_threadpool(preload_compute)
+        local_worker.start()
+    
+    # Compress the viewer bundle once; a read-only install falls back to on-the-fly gzip
+    for filename in BUNDLE_FILES:
+        try:
+            if os.path.exists(bundle_path(filename)):
+                precompress(bundle_path(filename))
+        except OSError as e:
+            print(f"Could not pre-compress viewer bundle file {filename}: {e}")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
-    # Clean up all temporary files
-    for job_id in list(file_storage.keys()):
-        cleanup_job(job_id)
-
-
-# Background task for optimization
-def run_optimization(job_id: str, molecule_path: str, charge: int, basis: str, max_steps: int):
-    """Run geometry optimization as a background task"""
-    
-    job_dir = file_storage[job_id]["directory"]
-    
-    try:
-        # Change working directory to job directory
-        original_dir = os.getcwd()
-        os.chdir(job_dir)
-        
-        # Run optimization
-        optimize_geometry(molecule_path, charge, basis, max_steps=max_steps)
-        
-        # Check for output files
-        trajectory_path = os.path.join(job_dir, "geometry_trajectory.xyz")
-        optimized_path = os.path.join(job_dir, "optimized.xyz")
-        
-        if os.path.exists(trajectory_path) and os.path.exists(optimized_path):
-            # Create visualization
-            html_path = os.path.join(job_dir, "visualization.html")
-            symbols, trajectory = read_xyz_trajectory(trajectory_path)
-            visualize_trajectory_py3dmol(symbols, trajectory, html_path)
-            
-            # Update job status
-            file_storage[job_id]["status"] = "complete"
-            file_storage[job_id]["message"] = "Optimization completed successfully"
-        else:
-            file_storage[job_id]["status"] = "failed"
-            file_storage[job_id]["message"] = "Optimization failed to produce output files"
-    
-    except Exception as e:
-        file_storage[job_id]["status"] = "failed"
-        file_storage[job_id]["message"] = f"Error during optimization: {str(e)}"
+    if local_worker is not None:
+        local_worker.stop()
     
-    finally:
-        # Restore original working directory
-        os.chdir(original_dir)
+    # Job files stay on disk for other workers and restarts; the reaper removes them once expired
+    job_store.stop_reaper()
 
 
 # Helper to create example molecules
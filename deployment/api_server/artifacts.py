@@ -0,0 +1,198 @@
+"""
+Serving job artifacts efficiently
+
+- Text artifacts are pre-compressed once when a job completes (``.gz`` and,
+  if the ``brotli`` package is installed, ``.br`` siblings).
+- Responses stream the file in chunks instead of reading it into memory.
+- The encoding is negotiated from Accept-Encoding; files without a
+  pre-compressed sibling are gzip-compressed on the fly.
+- Strong ETags answer If-None-Match with 304 Not Modified.
+- Single byte ranges (``Range: bytes=a-b``) are served as 206 Partial Content
+  on the uncompressed representation.
+"""
+import gzip
+import mimetypes
+import os
+import re
+import zlib
+
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_EXTENSIONS = {".html", ".xyz", ".json", ".jsonl", ".txt", ".csv", ".js", ".css", ".svg"}
+MEDIA_TYPES = {
+    ".html": "text/html",
+    ".xyz": "chemical/x-xyz",
+    ".json": "application/json",
+    ".jsonl": "application/x-ndjson",
+    ".js": "text/javascript",
+    ".css": "text/css",
+}
+# Pre-compressed siblings in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def is_compressible(path):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def precompress(path):
+    """Write compressed siblings of a text artifact next to it; returns the paths written"""
+    if not is_compressible(path) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    variants = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+    for suffix, compress in variants:
+        tmp_path = f"{path}{suffix}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compress(data))
+        os.replace(tmp_path, path + suffix)
+        written.append(path + suffix)
+    return written
+
+
+def precompress_directory(directory):
+    """Pre-compress every text artifact in a job directory"""
+    written = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            written.extend(precompress(path))
+    return written
+
+
+def _etag(stat, encoding=None):
+    tag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def _accepted_encodings(header):
+    """Encodings the client accepts (q > 0)"""
+    accepted = set()
+    for part in (header or "").split(","):
+        fields = [field.strip() for field in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(fields[0].lower())
+    return accepted
+
+
+def _iter_file(path, start=0, length=None):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _iter_gzip(path):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in _iter_file(path):
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None to ignore it, or 'invalid'"""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (header or "").strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "invalid"
+    return start, end
+
+
+def serve_artifact(request, path, filename=None, cache_control="no-cache"):
+    """
+    Streaming response for a job artifact, honouring Accept-Encoding, If-None-Match and Range
+
+    Parameters:
+    -----------
+    request : starlette.requests.Request
+    path : str
+        File to serve
+    filename : str, optional
+        Offered as an attachment name for non-HTML files
+    cache_control : str
+        Cache-Control header; job artifacts are revalidated, versioned static files need not be
+    """
+    extension = os.path.splitext(path)[1].lower()
+    media_type = MEDIA_TYPES.get(extension) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding", "Accept-Ranges": "bytes"}
+    if filename and extension != ".html":
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    # Choose the representation: pre-compressed sibling, on-the-fly gzip or identity
+    accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+    stat = os.stat(path)
+    encoding, source = None, path
+    if "range" not in request.headers and is_compressible(path):
+        for name, suffix in ENCODINGS:
+            # A sibling older than the file itself is stale
+            if name in accepted and os.path.exists(path + suffix) and \
+                    os.stat(path + suffix).st_mtime_ns >= stat.st_mtime_ns:
+                encoding, source = name, path + suffix
+                break
+        else:
+            if "gzip" in accepted and stat.st_size >= MIN_COMPRESS_SIZE:
+                encoding, source = "gzip", None
+
+    etag = _etag(stat, encoding)
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        if source is None:
+            return StreamingResponse(_iter_gzip(path), media_type=media_type, headers=headers)
+        headers["Content-Length"] = str(os.path.getsize(source))
+        return StreamingResponse(_iter_file(source), media_type=media_type, headers=headers)
+
+    byte_range = _parse_range(request.headers.get("range"), stat.st_size)
+    if_range = request.headers.get("if-range")
+    if byte_range is not None and if_range and if_range != etag:
+        byte_range = None  # the client's copy is stale: send the whole file
+    if byte_range == "invalid":
+        headers["Content-Range"] = f"bytes */{stat.st_size}"
+        return Response(status_code=416, headers=headers)
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_iter_file(path, start, end - start + 1), status_code=206,
+                                 media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(stat.st_size)
+    return StreamingResponse(_iter_file(path), media_type=media_type, headers=headers)
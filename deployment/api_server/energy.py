@@ -0,0 +1,145 @@
+"""
+Single-point RHF energies with warm in-process state
+
+Used inline by the API's ``/energy`` fast path and by queued "energy" jobs.
+Two caches stay warm for the life of the process:
+
+- parsed basis sets per (element, basis) (``integrals.basis_template``), so
+  building a molecule does not re-read basis files,
+- recent results keyed by the molecule's canonical fingerprint (see
+  ``result_cache``), so a repeated molecule in any position, orientation or
+  atom order is answered without an SCF.
+
+``plan_scf`` sizes a molecule from per-element basis counts and picks its
+integral strategy within a memory budget (see ``memory_planner``), which
+the API uses to reject molecules that cannot fit before queueing them.
+
+PySCF is imported on first use, so importing this module is cheap.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from my_hf_program.result_cache import canonicalize, cache_key
+from my_hf_program.instrumentation import timed, SCF_ITERATIONS, CACHE_REQUESTS
+from my_hf_program.memory_planner import PYSCF_STRATEGIES, basis_dimensions, plan, make_rhf
+
+
+def build_molecule(symbols, coords, charge=0, basis='sto-3g'):
+    """PySCF molecule from symbols and coordinates (Angstrom) using the cached basis templates"""
+    from pyscf import gto  # imported on first use (see preload_compute in jobs.py)
+    from my_hf_program.integrals import basis_template
+    mol = gto.Mole()
+    mol.atom = [(symbol, tuple(xyz)) for symbol, xyz in zip(symbols, coords)]
+    mol.charge = charge
+    mol.basis = {symbol: basis_template(symbol, basis.lower()) for symbol in set(symbols)}
+    mol.verbose = 0
+    mol.build()
+    return mol
+
+
+@lru_cache(maxsize=512)
+def element_dimensions(symbol, basis):
+    """Basis and density-fitting auxiliary functions contributed by one atom"""
+    from pyscf import gto
+    from my_hf_program.integrals import basis_template
+    atom = gto.M(atom=[(symbol, (0.0, 0.0, 0.0))], basis={symbol: basis_template(symbol, basis)},
+                 spin=gto.charge(symbol) % 2, verbose=0)
+    return basis_dimensions(atom, strategies=PYSCF_STRATEGIES)
+
+
+def plan_scf(symbols, basis='sto-3g', budget_mb=None, max_seconds=None):
+    """
+    Fastest PySCF integral strategy for a molecule within a memory budget
+
+    Raises ``RuntimeError`` for unknown elements or basis sets and
+    ``memory_planner.MemoryBudgetError`` if no strategy fits.
+    """
+    nbf = naux = 0
+    for symbol in symbols:
+        n, a = element_dimensions(symbol.capitalize(), basis.lower())
+        nbf += n
+        naux = None if a is None or naux is None else naux + a  # None: density fitting is not a candidate
+    return plan(nbf, naux, budget_mb=budget_mb, max_seconds=max_seconds, strategies=PYSCF_STRATEGIES)
+
+
+class EnergyCache:
+    """Thread-safe LRU of single-point results keyed by canonical molecule and settings"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache='energy', result='miss')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache='energy', result='hit')
+            return dict(entry)
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+energy_cache = EnergyCache()
+
+
+def single_point_energy(symbols, coords, charge=0, basis='sto-3g', mol=None, strategy='packed',
+                        max_memory_mb=None):
+    """
+    RHF total energy of a molecule given in Angstrom
+
+    Parameters:
+    -----------
+    mol : pyscf.gto.Mole, optional
+        Molecule already built by ``build_molecule`` for the same input
+    strategy : str
+        Integral strategy from ``memory_planner.PYSCF_STRATEGIES``
+    max_memory_mb : float, optional
+        Memory PySCF may use (its default otherwise)
+
+    Returns:
+    --------
+    dict with ``energy`` (Hartree), ``converged``, ``scf_cycles``, ``n_basis``,
+    ``cached`` and ``elapsed_ms``
+    """
+    start = time.perf_counter()
+    fingerprint, _ = canonicalize(symbols, coords)
+    # Density fitting changes the energy slightly, so it is cached separately
+    method = 'rhf-df' if strategy == 'density_fit' else 'rhf'
+    key = cache_key(fingerprint, charge=charge, basis=basis.lower(), method=method)
+    entry = energy_cache.get(key)
+    if entry is None:
+        if mol is None:
+            mol = build_molecule(symbols, coords, charge, basis)
+        mf = make_rhf(mol, strategy, max_memory_mb)
+        with timed('scf'):
+            energy = mf.kernel()
+        if getattr(mf, 'cycles', None) is not None:
+            SCF_ITERATIONS.observe(mf.cycles)
+        entry = {
+            'energy': float(energy),
+            'converged': bool(mf.converged),
+            'scf_cycles': getattr(mf, 'cycles', None),
+            'n_basis': int(mol.nao),
+        }
+        if mf.converged:
+            energy_cache.put(key, entry)
+        entry = dict(entry, cached=False)
+    else:
+        entry['cached'] = True
+    entry['elapsed_ms'] = (time.perf_counter() - start) * 1000
+    return entry
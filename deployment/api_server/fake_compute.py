@@ -0,0 +1,95 @@
+"""
+Deterministic stand-in for the PySCF compute backend
+
+Enabled with ``QC_FAKE_COMPUTE=1`` (see ``jobs.py``) so that the API and its
+workers can be load-tested without real chemistry. The fakes write the same
+files and report the same progress events as the real code, take
+``QC_FAKE_COMPUTE_SECONDS`` per optimization step, and produce results that
+depend only on the input.
+"""
+import hashlib
+import os
+import time
+
+from my_hf_program.utils import ANGSTROM_TO_BOHR
+
+FAKE_STEP_SECONDS = float(os.environ.get("QC_FAKE_COMPUTE_SECONDS", 0.05))
+FAKE_STEPS = 5
+
+
+def _read_xyz(xyz_file):
+    with open(xyz_file, "r") as f:
+        lines = f.readlines()
+    n_atoms = int(lines[0])
+    symbols, coords = [], []
+    for line in lines[2:2 + n_atoms]:
+        parts = line.split()
+        symbols.append(parts[0])
+        coords.append([float(x) for x in parts[1:4]])
+    return symbols, coords
+
+
+def _seed_energy(symbols, coords, charge, basis):
+    # Fixed pseudo-energy from the input, about -0.5 Hartree per atom
+    digest = hashlib.sha256(repr((symbols, coords, charge, basis.lower())).encode()).digest()
+    return -0.5 * len(symbols) - int.from_bytes(digest[:4], "big") / 2 ** 32
+
+
+def _format_xyz(symbols, coords, comment):
+    lines = [f"{len(symbols)}\n{comment}\n"]
+    for sym, xyz in zip(symbols, coords):
+        lines.append(f"{sym} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}\n")
+    return "".join(lines)
+
+
+def fake_optimize_geometry(xyz_file, charge=0, basis='sto-3g', max_steps=100, output_dir='.', callback=None,
+                           **kwargs):
+    """Mimic ``optimize_geometry``: a short trajectory relaxing 2% towards the input geometry"""
+    symbols, coords = _read_xyz(xyz_file)
+    target = [[x * ANGSTROM_TO_BOHR for x in xyz] for xyz in coords]
+    e_final = _seed_energy(symbols, coords, charge, basis)
+    trajectory, energies = [], []
+    n_steps = max(1, min(max_steps, FAKE_STEPS))
+    for step in range(1, n_steps + 1):
+        time.sleep(FAKE_STEP_SECONDS)
+        scale = 1.0 + 0.02 * (n_steps - step) / n_steps
+        frame = [[x * scale for x in xyz] for xyz in target]
+        energy = e_final + 0.01 * (n_steps - step) / n_steps
+        trajectory.append(frame)
+        energies.append(energy)
+        if callback is not None:
+            callback({'step': step, 'energy': energy, 'grad_norm': 0.01 * (n_steps - step) / n_steps,
+                      'scf_cycles': 1, 'coords': frame})
+    optimized_xyz = _format_xyz(symbols, trajectory[-1], "Optimized geometry (fake backend)")
+    trajectory_xyz = "".join(_format_xyz(symbols, frame, f"Step {i+1}") for i, frame in enumerate(trajectory))
+    if output_dir is not None:
+        with open(os.path.join(output_dir, 'optimized.xyz'), 'w') as f:
+            f.write(optimized_xyz)
+        with open(os.path.join(output_dir, 'geometry_trajectory.xyz'), 'w') as f:
+            f.write(trajectory_xyz)
+    return {
+        'symbols': symbols,
+        'coords': trajectory[-1],
+        'trajectory': trajectory,
+        'energy': e_final,
+        'energies': energies,
+        'converged': True,
+        'optimized_xyz': optimized_xyz,
+        'trajectory_xyz': trajectory_xyz,
+    }
+
+
+def fake_single_point_energy(symbols, coords, charge=0, basis='sto-3g', mol=None, strategy='packed',
+                             max_memory_mb=None):
+    """Mimic ``energy.single_point_energy``"""
+    start = time.perf_counter()
+    time.sleep(FAKE_STEP_SECONDS)
+    coords = [[float(x) for x in xyz] for xyz in coords]
+    return {
+        'energy': _seed_energy(list(symbols), coords, charge, basis),
+        'converged': True,
+        'scf_cycles': 1,
+        'n_basis': 2 * len(symbols),
+        'cached': False,
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
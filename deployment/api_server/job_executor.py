@@ -0,0 +1,249 @@
+"""
+Bounded process executor with a priority queue for CPU-bound API jobs
+
+Every job runs in its own child process, so PySCF work never blocks the
+server's event loop and a job that exceeds its CPU or memory limit can be
+killed without affecting other jobs. At most ``max_workers`` children run at
+once; further jobs wait in a priority queue of at most ``max_queue`` entries.
+
+With ``warm_processes``, that many job processes are started ahead of time
+and run ``preload`` (e.g. importing PySCF) while they wait; a job is handed
+to a waiting process and a replacement is started. Each process still runs
+a single job and exits, so isolation and limits are unchanged.
+"""
+import heapq
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows: no per-process rlimits
+    resource = None
+
+
+# RLIMIT_CPU sends SIGXCPU at the soft limit and SIGKILL at the hard limit
+CPU_LIMIT_EXITCODES = {-getattr(signal, 'SIGXCPU', signal.SIGTERM), -getattr(signal, 'SIGKILL', signal.SIGTERM)}
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+def _apply_limits(cpu_seconds, memory_mb, threads):
+    if resource is not None:
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if threads:
+        os.environ['OMP_NUM_THREADS'] = str(threads)
+        try:
+            from pyscf import lib
+            lib.num_threads(threads)
+        except ImportError:
+            pass
+
+
+def _run_child(conn, func, args, limits):
+    """Entry point of the job process: apply limits, run ``func`` and report (status, message)"""
+    try:
+        _apply_limits(*limits)
+        status, message = func(*args)
+    except MemoryError:
+        status, message = "failed", "Job exceeded its memory limit"
+    except Exception as e:
+        traceback.print_exc()
+        status, message = "failed", f"Error during job: {str(e)}"
+    conn.send((status, message))
+    conn.close()
+
+
+def _run_warm_child(task_conn, conn, preload):
+    """Entry point of a warm job process: preload, then wait for a single job"""
+    if preload is not None:
+        try:
+            preload()
+        except Exception:
+            traceback.print_exc()
+    try:
+        func, args, limits = task_conn.recv()
+    except EOFError:
+        return  # the executor shut down before handing over a job
+    task_conn.close()
+    _run_child(conn, func, args, limits)
+
+
+class JobExecutor:
+    """
+    Run jobs in child processes with admission control
+
+    Parameters:
+    -----------
+    max_workers : int
+        Maximum number of jobs running concurrently
+    max_queue : int
+        Maximum number of jobs waiting to run; ``submit`` raises QueueFullError beyond it
+    cpu_seconds, memory_mb, threads : int
+        Per-job CPU time limit, address-space limit and OpenMP thread count
+    timeout : float
+        Per-job wall-clock limit in seconds
+    on_status : callable
+        Called as ``on_status(job_id, status, message)`` when a job starts
+        ("running") and when it ends ("complete" or "failed", or "interrupted"
+        if ``shutdown`` terminated it before it finished)
+    warm_processes : int
+        Job processes to keep started and preloaded ahead of demand
+    preload : callable, optional
+        Run by every warm process before it waits for its job
+    """
+
+    def __init__(self, max_workers=2, max_queue=32, cpu_seconds=3600, memory_mb=4096, threads=1,
+                 timeout=None, on_status=None, warm_processes=0, preload=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.limits = (cpu_seconds, memory_mb, threads)
+        self.timeout = timeout
+        self.on_status = on_status or (lambda job_id, status, message: None)
+        self._queue = []
+        self._counter = itertools.count()
+        self._running = {}
+        self._cancelled = set()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self.warm_processes = warm_processes
+        self.preload = preload
+        self._spares = []
+        self._dispatcher = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, job_id, func, args=(), priority=0):
+        """Queue ``func(*args)``, which must return (status, message); higher priority runs first"""
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFullError(f"Job queue is full ({self.max_queue} jobs waiting)")
+            heapq.heappush(self._queue, (-priority, next(self._counter), job_id, func, args))
+            self._cond.notify_all()
+
+    def cancel(self, job_id):
+        """Drop a queued job or terminate a running one"""
+        with self._cond:
+            for i, entry in enumerate(self._queue):
+                if entry[2] == job_id:
+                    self._queue.pop(i)
+                    heapq.heapify(self._queue)
+                    return True
+            process = self._running.get(job_id)
+            if process is not None:
+                self._cancelled.add(job_id)
+                process.terminate()
+                return True
+        return False
+
+    def queue_position(self, job_id):
+        """1-based position of a waiting job, 0 if running, None if unknown"""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            for position, entry in enumerate(sorted(self._queue), start=1):
+                if entry[2] == job_id:
+                    return position
+        return None
+
+    def stats(self):
+        with self._cond:
+            return {'running': len(self._running), 'queued': len(self._queue), 'warm': len(self._spares),
+                    'max_workers': self.max_workers, 'max_queue': self.max_queue}
+
+    def shutdown(self):
+        with self._cond:
+            self._shutdown = True
+            self._queue.clear()
+            for process in self._running.values():
+                process.terminate()
+            for process, task_conn, _ in self._spares:
+                task_conn.close()
+                process.terminate()
+            self._spares.clear()
+            self._cond.notify_all()
+
+    def start_warm(self):
+        """Start the warm processes; call once the parent has finished importing (it forks them)"""
+        with self._cond:
+            self._fill_spares()
+
+    def _fill_spares(self):
+        # Called with the lock held
+        self._spares = [spare for spare in self._spares if spare[0].is_alive()]
+        while not self._shutdown and len(self._spares) < self.warm_processes:
+            task_recv, task_send = multiprocessing.Pipe(duplex=False)
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_run_warm_child, args=(task_recv, child_conn, self.preload),
+                                              name="job-warm", daemon=True)
+            process.start()
+            task_recv.close()
+            child_conn.close()
+            self._spares.append((process, task_send, parent_conn))
+
+    def _start(self, job_id, func, args):
+        """Hand a job to a warm process if one is waiting, else fork a new one; returns (process, result conn)"""
+        while self._spares:
+            process, task_conn, parent_conn = self._spares.pop(0)
+            if not process.is_alive():
+                continue
+            task_conn.send((func, args, self.limits))
+            task_conn.close()
+            self._fill_spares()
+            return process, parent_conn
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_run_child, args=(child_conn, func, args, self.limits),
+                                          name=f"job-{job_id}", daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._shutdown and (not self._queue or len(self._running) >= self.max_workers):
+                    self._cond.wait()
+                if self._shutdown:
+                    return
+                _, _, job_id, func, args = heapq.heappop(self._queue)
+                process, parent_conn = self._start(job_id, func, args)
+                self._running[job_id] = process
+            self.on_status(job_id, "running", "Job is running")
+            threading.Thread(target=self._watch, args=(job_id, process, parent_conn), daemon=True).start()
+
+    def _watch(self, job_id, process, conn):
+        result = None
+        if conn.poll(self.timeout):
+            try:
+                result = conn.recv()
+            except EOFError:
+                pass
+        if result is None and process.is_alive():
+            process.terminate()
+        process.join()
+        with self._cond:
+            self._running.pop(job_id, None)
+            cancelled = job_id in self._cancelled
+            self._cancelled.discard(job_id)
+            stopped = self._shutdown
+            self._cond.notify_all()
+        if result is None:
+            if cancelled:
+                result = ("failed", "Job was cancelled")
+            elif stopped:
+                result = ("interrupted", "Job was stopped by a shutdown")
+            elif process.exitcode in CPU_LIMIT_EXITCODES:
+                result = ("failed", "Job exceeded its CPU time limit")
+            elif process.exitcode == -signal.SIGTERM:
+                result = ("failed", f"Job exceeded its time limit of {self.timeout} s")
+            else:
+                result = ("failed", f"Job process exited with code {process.exitcode}")
+        self.on_status(job_id, *result)
@@ -0,0 +1,337 @@
+"""
+Persistent job store for the API server, backed by SQLite in WAL mode
+
+Job records survive restarts and are shared by every uvicorn worker that
+points at the same database file. WAL mode needs shared memory between those
+processes, so the file must be on a local filesystem of the API's host.
+Lookups by job id, status and expiry are indexed, and a background reaper
+deletes expired jobs and their directories in batches instead of scanning
+every job on each request.
+
+Workers never open the database: queued jobs are handed to them through a
+``spool.SpoolQueue`` on the shared job volume, and a background sync records
+claims, requeues, outcomes and job metrics from the spool in the database.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id     TEXT PRIMARY KEY,
+    directory  TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    message    TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id   TEXT PRIMARY KEY,
+    job_ids    TEXT NOT NULL,
+    names      TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batches_expires_at ON batches (expires_at);
+CREATE TABLE IF NOT EXISTS metrics (
+    sample TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value  REAL NOT NULL,
+    PRIMARY KEY (sample, labels)
+);
+"""
+
+# Queue columns, added to databases created before jobs were queued for workers
+QUEUE_COLUMNS = {
+    "kind": "TEXT",
+    "params": "TEXT",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "worker_id": "TEXT",
+}
+
+JOB_FIELDS = ("directory", "status", "message", "created_at", "updated_at", "expires_at", *QUEUE_COLUMNS)
+
+
+class QueueFull(RuntimeError):
+    """Enqueueing would leave more than the allowed number of jobs waiting"""
+
+    def __init__(self, pending, max_pending):
+        super().__init__(f"Job queue is full ({pending} of {max_pending} jobs waiting)")
+        self.pending = pending
+        self.max_pending = max_pending
+
+
+class JobStore:
+    """
+    SQLite-backed job records
+
+    Parameters:
+    -----------
+    path : str
+        Database file; every process using the same file sees the same jobs
+    queue : spool.SpoolQueue, optional
+        Work queue that enqueued jobs are handed to
+    """
+
+    def __init__(self, path, queue=None):
+        self.path = path
+        self.queue = queue
+        self._local = threading.local()
+        self._threads = []
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, decl in QUEUE_COLUMNS.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)")
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id, directory, expires_at, status="pending", message=""):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (job_id, directory, status, message, created_at, updated_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, directory, status, message, now, now, expires_at),
+        )
+
+    def enqueue(self, job_id, directory, expires_at, kind, params, priority=0, max_pending=None):
+        """
+        Add a pending job of ``kind`` for workers to run with ``params`` (JSON-serializable)
+
+        Returns False, leaving the existing record alone, if ``job_id`` is already taken.
+        Raises ``QueueFull`` if ``max_pending`` jobs are already waiting.
+        """
+        job = {"job_id": job_id, "directory": directory, "expires_at": expires_at, "kind": kind,
+               "params": params, "priority": priority}
+        return bool(self.enqueue_many([job], max_pending))
+
+    def enqueue_many(self, jobs, max_pending=None, replace=(), prepare=None):
+        """
+        Add several pending jobs (dicts with the arguments of ``enqueue``) in one transaction
+
+        The pending count is checked and the jobs inserted under one write lock,
+        so concurrent requests cannot overfill the queue: if the jobs would take
+        it past ``max_pending``, none is added and ``QueueFull`` is raised.
+        Existing records of the ``replace`` job ids (e.g. failed jobs being
+        retried) and expired records not reaped yet are deleted first.
+        ``prepare``, if given, is called with each inserted job before the
+        commit to write its input files; the reaper removes directories under
+        the same lock, so it cannot delete them meanwhile. The inserted jobs
+        are then handed to the queue; their ids are returned.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if max_pending is not None:
+                pending = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND expires_at > ?", (now,)
+                ).fetchone()[0]
+                if pending + len(jobs) > max_pending:
+                    raise QueueFull(pending, max_pending)
+            for job_id in replace:
+                conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            inserted = []
+            for job in jobs:
+                # A content-addressed job id may still belong to an expired record
+                conn.execute("DELETE FROM jobs WHERE job_id = ? AND expires_at <= ?", (job["job_id"], now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO jobs (job_id, directory, status, message, created_at, updated_at, "
+                    "expires_at, kind, params, priority) VALUES (?, ?, 'pending', 'Job queued', ?, ?, ?, ?, ?, ?)",
+                    (job["job_id"], job["directory"], now, now, job["expires_at"], job["kind"],
+                     json.dumps(job["params"]), job.get("priority", 0)),
+                )
+                if cursor.rowcount == 1:
+                    inserted.append(job["job_id"])
+                    if prepare is not None:
+                        prepare(job)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if self.queue is not None:
+            queued = {job["job_id"]: job for job in jobs}
+            try:
+                for job_id in inserted:
+                    job = queued[job_id]
+                    self.queue.put({"job_id": job_id, "directory": job["directory"], "kind": job["kind"],
+                                    "params": job["params"], "priority": job.get("priority", 0),
+                                    "created_at": now, "expires_at": job["expires_at"]})
+            except OSError:
+                # Do not leave records that no worker will ever see
+                for job_id in inserted:
+                    self.queue.discard(job_id)
+                    self.delete(job_id)
+                raise
+        return inserted
+
+    def get(self, job_id):
+        """Job record as a dict, or None if unknown or expired"""
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE job_id = ? AND expires_at > ?", (job_id, time.time())
+        ).fetchone()
+        return self._record(row)
+
+    def get_many(self, job_ids):
+        """Job records by id for the unexpired jobs among ``job_ids``"""
+        job_ids = list(job_ids)
+        jobs = {}
+        # Stay well below SQLite's limit on bound parameters
+        for i in range(0, len(job_ids), 500):
+            chunk = job_ids[i:i + 500]
+            rows = self._conn().execute(
+                f"SELECT * FROM jobs WHERE job_id IN ({', '.join('?' * len(chunk))}) AND expires_at > ?",
+                (*chunk, time.time()),
+            ).fetchall()
+            jobs.update((row["job_id"], self._record(row)) for row in rows)
+        return jobs
+
+    @staticmethod
+    def _record(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job.get("params") else {}
+        return job
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+    def update(self, job_id, **fields):
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._conn().execute(
+            f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id)
+        )
+
+    def delete(self, job_id):
+        self._conn().execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def create_batch(self, batch_id, job_ids, names, expires_at):
+        """Record the jobs of a batch submission, replacing an earlier batch with the same id"""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO batches (batch_id, job_ids, names, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (batch_id, json.dumps(list(job_ids)), json.dumps(list(names)), time.time(), expires_at),
+        )
+
+    def get_batch(self, batch_id):
+        """(job ids, names) of a batch in submission order, or None if unknown or expired"""
+        row = self._conn().execute(
+            "SELECT job_ids, names FROM batches WHERE batch_id = ? AND expires_at > ?", (batch_id, time.time())
+        ).fetchone()
+        return (json.loads(row["job_ids"]), json.loads(row["names"])) if row else None
+
+    def queue_position(self, job_id):
+        """1-based position of a pending job in claim order, 0 if running, None otherwise"""
+        job = self.get(job_id)
+        if job is None or job["status"] not in ("pending", "running"):
+            return None
+        if job["status"] == "running":
+            return 0
+        ahead = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND kind IS NOT NULL AND expires_at > ? "
+            "AND (priority > ? OR (priority = ? AND created_at < ?))",
+            (time.time(), job["priority"], job["priority"], job["created_at"]),
+        ).fetchone()[0]
+        return ahead + 1
+
+    def add_metrics(self, samples):
+        """Add additive metric samples (name, labels dict, value) recorded by a job or worker process"""
+        self._conn().executemany(
+            "INSERT INTO metrics (sample, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (sample, labels) DO UPDATE SET value = value + excluded.value",
+            [(sample, json.dumps(labels, sort_keys=True), value) for sample, labels, value in samples],
+        )
+
+    def metric_samples(self):
+        rows = self._conn().execute("SELECT sample, labels, value FROM metrics").fetchall()
+        return [(row["sample"], json.loads(row["labels"]), row["value"]) for row in rows]
+
+    def count_status(self, status):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND expires_at > ?", (status, time.time())
+        ).fetchone()[0]
+
+    def count_by_status(self):
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) AS n FROM jobs WHERE expires_at > ? GROUP BY status", (time.time(),)
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def reap_expired(self, batch_size=100):
+        """Delete up to ``batch_size`` expired jobs and their directories; returns the number removed"""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT job_id, directory FROM jobs WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+            (time.time(), batch_size),
+        ).fetchall()
+        removed = 0
+        for row in rows:
+            # One job per write lock: a resubmission may have replaced the record since the SELECT
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute("DELETE FROM jobs WHERE job_id = ? AND expires_at <= ?",
+                                      (row["job_id"], time.time()))
+                if cursor.rowcount == 1:
+                    if self.queue is not None:
+                        self.queue.discard(row["job_id"])
+                    shutil.rmtree(row["directory"], ignore_errors=True)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            removed += cursor.rowcount
+        conn.execute("DELETE FROM batches WHERE expires_at <= ?", (time.time(),))
+        return removed
+
+    def start_reaper(self, interval=60, batch_size=100):
+        """Reap expired jobs in a daemon thread every ``interval`` seconds"""
+        def reap():
+            while self.reap_expired(batch_size) == batch_size:
+                pass
+
+        self._start_loop("job-reaper", reap, interval)
+
+    def start_queue_sync(self, interval=1.0):
+        """Record the queue's claims, requeues, outcomes and metrics in a daemon thread every ``interval`` seconds"""
+        self._start_loop("job-queue-sync", lambda: self.queue.sync(self), interval)
+
+    def _start_loop(self, name, task, interval):
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    task()
+                except (sqlite3.Error, OSError) as e:
+                    print(f"Error in {name}: {str(e)}")
+
+        self._stop.clear()
+        thread = threading.Thread(target=loop, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop_reaper(self):
+        """Stop the reaper and queue sync threads"""
+        self._stop.set()
@@ -0,0 +1,192 @@
+"""
+Job definitions and settings shared by the API server and its workers
+
+The API only enqueues jobs; workers (``worker.py`` on any host, or the API's
+embedded worker) claim them from the spool queue and run the job bodies
+defined here. All of them must see the same ``QC_DATA_DIR``, e.g. a shared
+volume mounted at the same path, which holds the job directories and the
+spool (``QC_SPOOL_DIR``). The job database (``QC_JOB_DB``) is only opened by
+the API and must be on a local disk of its host.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path to import the quantum chemistry modules
+parent_dir = str(Path(__file__).resolve().parent.parent.parent)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from my_hf_program.visualize_trajectory_py3dmol import read_xyz_trajectory, visualize_trajectory_py3dmol
+from my_hf_program.result_cache import ResultCache
+from my_hf_program.molecule import load_molecule
+from my_hf_program.instrumentation import REGISTRY
+from my_hf_program.viewer_bundle import VIEWER_VERSION
+from spool import SpoolQueue
+from artifacts import precompress_directory
+
+# Deterministic fake compute backend for load tests (QC_FAKE_COMPUTE=1)
+FAKE_COMPUTE = os.environ.get("QC_FAKE_COMPUTE", "0") not in ("", "0")
+if FAKE_COMPUTE:
+    from fake_compute import fake_optimize_geometry as optimize_geometry
+    from fake_compute import fake_single_point_energy as single_point_energy
+else:
+    from my_hf_program.optimize_geometry import optimize_geometry
+    from energy import single_point_energy
+
+# Shared artifact directory and work queue, and the API's job database
+TEMP_DIR = os.environ.get("QC_DATA_DIR", os.path.join(tempfile.gettempdir(), "quantum-chemistry-api"))
+os.makedirs(TEMP_DIR, exist_ok=True)
+SPOOL_DIR = os.environ.get("QC_SPOOL_DIR", os.path.join(TEMP_DIR, "spool"))
+JOB_DB = os.environ.get("QC_JOB_DB", os.path.join(TEMP_DIR, "jobs.sqlite3"))
+
+# Per-job execution limits
+JOB_CPU_SECONDS = int(os.environ.get("QC_JOB_CPU_SECONDS", 3600))
+JOB_MEMORY_MB = int(os.environ.get("QC_JOB_MEMORY_MB", 4096))
+JOB_THREADS = int(os.environ.get("QC_JOB_THREADS", 1))
+JOB_TIMEOUT = float(os.environ.get("QC_JOB_TIMEOUT", 2 * 3600))
+# Memory the integral planner may give a job's arrays, leaving room for the interpreter and libraries
+JOB_MEMORY_BUDGET_MB = int(os.environ.get("QC_JOB_MEMORY_BUDGET_MB", JOB_MEMORY_MB * 3 // 4))
+
+# Worker liveness: heartbeat period, and silence after which a running job is requeued
+HEARTBEAT_INTERVAL = float(os.environ.get("QC_HEARTBEAT_INTERVAL", 10))
+STALE_AFTER = float(os.environ.get("QC_STALE_AFTER", 60))
+
+# Generated visualization pages load the player from the API's versioned viewer bundle (or another host's)
+VIEWER_URL = os.environ.get("QC_VIEWER_URL", f"/viewer/{VIEWER_VERSION}")
+
+# Optimization results shared across jobs and workers, keyed by canonical molecular fingerprint
+result_cache = ResultCache(os.path.join(TEMP_DIR, "result_cache"))
+
+
+# Job processes kept started ahead of time with the compute stack imported (0: fork each job on demand)
+WARM_WORKERS = int(os.environ.get("QC_WARM_WORKERS", 0))
+
+
+def preload_compute():
+    """
+    Import the compute stack (PySCF, SciPy) that the modules above only load on first use
+
+    Run in a process before it forks job processes, or in warm job
+    processes while they wait, so that jobs do not pay the import time.
+    """
+    if FAKE_COMPUTE:
+        return
+    import scipy.optimize  # noqa: F401
+    import pyscf.grad  # noqa: F401
+    import pyscf.df  # noqa: F401
+    from pyscf.symm import geom  # noqa: F401
+
+
+# Per-step progress of a job, one JSON event per line, in the job directory
+PROGRESS_FILE = "progress.jsonl"
+
+
+def progress_logger(job_dir: str):
+    """Callback for ``optimize_geometry`` appending each step to the job's progress file"""
+    path = os.path.join(job_dir, PROGRESS_FILE)
+    # A requeued job starts over, so drop events from an earlier attempt
+    open(path, "w").close()
+
+    def log(event):
+        with open(path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+
+    return log
+
+
+def read_progress(job_dir: str, offset: int = 0):
+    """Complete progress events written after byte ``offset``; returns (events, new offset)"""
+    path = os.path.join(job_dir, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return [], offset
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < offset:
+            offset = 0  # the file was truncated by a retry
+        f.seek(offset)
+        data = f.read()
+    # Ignore a trailing partial line still being written
+    end = data.rfind(b"\n") + 1
+    events = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return events, offset + end
+
+
+def run_optimization(job_dir: str, molecule_path: str, charge: int, basis: str, max_steps: int,
+                     scf_strategy: str = "packed"):
+    """Run geometry optimization and return (status, message)"""
+
+    # Run optimization, writing its output files and per-step progress into the job directory
+    optimize_geometry(molecule_path, charge, basis, max_steps=max_steps, cache=result_cache, output_dir=job_dir,
+                      callback=progress_logger(job_dir), scf_strategy=scf_strategy,
+                      max_memory_mb=JOB_MEMORY_BUDGET_MB)
+
+    # Check for output files
+    trajectory_path = os.path.join(job_dir, "geometry_trajectory.xyz")
+    optimized_path = os.path.join(job_dir, "optimized.xyz")
+
+    if os.path.exists(trajectory_path) and os.path.exists(optimized_path):
+        # Create visualization
+        html_path = os.path.join(job_dir, "visualization.html")
+        symbols, trajectory = read_xyz_trajectory(trajectory_path)
+        visualize_trajectory_py3dmol(symbols, trajectory, html_path, viewer_url=VIEWER_URL)
+        # Compress once here rather than on every download
+        precompress_directory(job_dir)
+        return "complete", "Optimization completed successfully"
+    return "failed", "Optimization failed to produce output files"
+
+
+def run_energy(job_dir: str, molecule_path: str, charge: int, basis: str, scf_strategy: str = "packed"):
+    """Compute a single-point energy too large for the API's fast path and return (status, message)"""
+    mol = load_molecule(molecule_path, charge=charge)
+    symbols = [symbol for symbol, _ in mol.atoms]
+    result = single_point_energy(symbols, mol.get_nuclear_coords(), charge, basis, strategy=scf_strategy,
+                                 max_memory_mb=JOB_MEMORY_BUDGET_MB)
+    with open(os.path.join(job_dir, "energy.json"), "w") as f:
+        json.dump(result, f)
+    if not result["converged"]:
+        return "failed", "SCF did not converge"
+    return "complete", f"Energy: {result['energy']:.8f} a.u."
+
+
+# Job bodies by the ``kind`` stored with each queued job
+JOB_KINDS = {
+    "optimize": run_optimization,
+    "energy": run_energy,
+}
+
+# Files linked from a complete job's status: (result_url, visualization_url)
+RESULT_FILES = {
+    "optimize": ("geometry_trajectory.xyz", "visualization.html"),
+    "energy": ("energy.json", None),
+}
+
+
+QUEUE_WAIT = REGISTRY.histogram("qc_job_queue_wait_seconds", "Time from submission until a job starts")
+JOB_SECONDS = REGISTRY.histogram("qc_job_duration_seconds", "Wall time of job bodies by kind")
+JOBS_FINISHED = REGISTRY.counter("qc_jobs_finished_total", "Jobs finished by kind and status")
+
+
+def run_job(kind: str, job_dir: str, params: dict, queued_at: float = None):
+    """Run a queued job in a worker's child process and return (status, message)"""
+    # Samples inherited from the forking process are reported by that process
+    REGISTRY.drain()
+    start = time.time()
+    if queued_at is not None:
+        QUEUE_WAIT.observe(max(start - queued_at, 0.0), kind=kind)
+    status, message = "failed", f"Unknown job kind '{kind}'"
+    try:
+        if kind in JOB_KINDS:
+            status, message = JOB_KINDS[kind](job_dir, **params)
+        return status, message
+    finally:
+        # Errors propagate to the executor; they are counted as failed here
+        JOB_SECONDS.observe(time.time() - start, kind=kind)
+        JOBS_FINISHED.inc(kind=kind, status=status)
+        # The job process exits after this, so hand its metrics to the API (through the spool) for /metrics
+        try:
+            SpoolQueue(SPOOL_DIR).add_metrics(REGISTRY.drain())
+        except Exception as e:
+            print(f"Error saving job metrics: {str(e)}")
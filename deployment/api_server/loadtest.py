@@ -0,0 +1,325 @@
+"""
+Load-testing harness for the quantum chemistry API
+
+Starts the API locally (or targets a running one with --url), replays a
+weighted mix of traffic from concurrent clients and reports throughput,
+latency percentiles and error rates per operation:
+
+- optimize: POST /optimize with one of the sample molecules
+- jobs:     GET /jobs/{job_id} for a submitted job
+- upload:   POST /visualize/upload with a short trajectory
+- download: GET /files/{job_id}/geometry_trajectory.xyz of a completed job
+
+With --fake the locally started API runs jobs on the deterministic fake
+compute backend (QC_FAKE_COMPUTE=1), so server regressions and capacity
+changes can be measured without real chemistry.
+
+Usage as script:
+    python loadtest.py --fake --duration 30 --concurrency 16 --mix optimize=1,jobs=6,upload=1,download=2
+    python loadtest.py --url http://localhost:8000 --requests 500 --output report.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+MOLECULES = {
+    "h2.xyz": "2\nHydrogen molecule\nH 0.0 0.0 0.0\nH 0.74 0.0 0.0\n",
+    "h2o.xyz": "3\nWater molecule\nO 0.0 0.0 0.0\nH 0.757 0.586 0.0\nH -0.757 0.586 0.0\n",
+    "ch4.xyz": "5\nMethane molecule\nC 0.0 0.0 0.0\nH 0.629 0.629 0.629\nH -0.629 -0.629 0.629\n"
+               "H -0.629 0.629 -0.629\nH 0.629 -0.629 -0.629\n",
+}
+DEFAULT_MIX = "optimize=1,jobs=6,upload=1,download=2"
+
+
+def load_molecules(directory=None):
+    """Sample molecules: every .xyz file in ``directory``, or the built-in set"""
+    if not directory:
+        return dict(MOLECULES)
+    molecules = {}
+    for path in sorted(Path(directory).glob("*.xyz")):
+        molecules[path.name] = path.read_text()
+    if not molecules:
+        raise ValueError(f"No .xyz files in {directory}")
+    return molecules
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ("optimize", "jobs", "upload", "download"):
+            raise ValueError(f"Unknown operation '{name}'")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def multipart(fields, files):
+    """Encode form ``fields`` and ``files`` ({name: (filename, text)}) as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: chemical/x-xyz\r\n\r\n{content}\r\n')
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class LoadTest:
+    """
+    Concurrent clients replaying a weighted operation mix against one API
+
+    Parameters:
+    -----------
+    base_url : str
+        API root, e.g. http://127.0.0.1:8000
+    mix : dict
+        Relative weight per operation
+    molecules : dict
+        {filename: XYZ text} submitted by "optimize"
+    seed : int
+        Seed of the per-client random streams, for reproducible traffic
+    """
+
+    def __init__(self, base_url, mix, molecules, concurrency=8, timeout=30.0, seed=0):
+        self.base_url = base_url.rstrip("/")
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.molecules = molecules
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.seed = seed
+        self.results = []  # (operation, status, latency seconds)
+        self.submitted = []
+        self.completed = []
+        self._lock = threading.Lock()
+        self._issued = 0
+
+    def _request(self, method, path, body=None, content_type=None):
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if content_type:
+            request.add_header("Content-Type", content_type)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload, status = e.read(), e.code
+        except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+            payload, status = str(e).encode(), 0
+        return status, payload, time.perf_counter() - start
+
+    def _optimize(self, rng):
+        filename = rng.choice(sorted(self.molecules))
+        body, content_type = multipart({"basis": "sto-3g", "max_steps": 20},
+                                       {"molecule": (filename, self.molecules[filename])})
+        status, payload, latency = self._request("POST", "/optimize", body, content_type)
+        if status == 200:
+            with self._lock:
+                self.submitted.append(json.loads(payload)["job_id"])
+        return "optimize", status, latency
+
+    def _jobs(self, rng):
+        with self._lock:
+            job_id = rng.choice(self.submitted) if self.submitted else None
+        if job_id is None:
+            return self._optimize(rng)
+        status, payload, latency = self._request("GET", f"/jobs/{job_id}")
+        if status == 200 and json.loads(payload)["status"] == "complete":
+            with self._lock:
+                if job_id in self.submitted:
+                    self.submitted.remove(job_id)
+                    self.completed.append(job_id)
+        return "jobs", status, latency
+
+    def _upload(self, rng):
+        filename = rng.choice(sorted(self.molecules))
+        frame = self.molecules[filename]
+        body, content_type = multipart({}, {"molecule": ("trajectory.xyz", frame * 3)})
+        status, _, latency = self._request("POST", "/visualize/upload", body, content_type)
+        return "upload", status, latency
+
+    def _download(self, rng):
+        with self._lock:
+            job_id = rng.choice(self.completed) if self.completed else None
+        if job_id is None:
+            return self._jobs(rng)
+        status, _, latency = self._request("GET", f"/files/{job_id}/geometry_trajectory.xyz")
+        return "download", status, latency
+
+    def _client(self, index, deadline, max_requests):
+        rng = random.Random(self.seed * 1000003 + index)
+        handlers = {"optimize": self._optimize, "jobs": self._jobs, "upload": self._upload,
+                    "download": self._download}
+        while time.time() < deadline:
+            with self._lock:
+                if max_requests is not None and self._issued >= max_requests:
+                    return
+                self._issued += 1
+            # Operations without a job to act on yet fall back to the step that creates one
+            result = handlers[rng.choices(self.operations, self.weights)[0]](rng)
+            with self._lock:
+                self.results.append(result)
+
+    def run(self, duration=None, max_requests=None):
+        """Run until ``duration`` seconds pass or ``max_requests`` requests were sent; returns the report"""
+        deadline = time.time() + (duration if duration is not None else float("inf"))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for index in range(self.concurrency):
+                pool.submit(self._client, index, deadline, max_requests)
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        """Throughput, latency percentiles (ms) and error rates overall and per operation"""
+        def summarize(rows):
+            latencies = sorted(latency * 1000 for _, _, latency in rows)
+            errors = sum(1 for _, status, _ in rows if status == 0 or status >= 500)
+            rejected = sum(1 for _, status, _ in rows if status == 429)
+            client_errors = sum(1 for _, status, _ in rows if 400 <= status < 500 and status != 429)
+            return {
+                "requests": len(rows),
+                "throughput_rps": len(rows) / elapsed if elapsed > 0 else 0.0,
+                "latency_ms": {
+                    "mean": sum(latencies) / len(latencies) if latencies else None,
+                    "p50": percentile(latencies, 50),
+                    "p90": percentile(latencies, 90),
+                    "p99": percentile(latencies, 99),
+                    "max": latencies[-1] if latencies else None,
+                },
+                "error_rate": errors / len(rows) if rows else 0.0,
+                "rejected_rate": rejected / len(rows) if rows else 0.0,
+                "client_error_rate": client_errors / len(rows) if rows else 0.0,
+            }
+
+        by_operation = {}
+        for row in self.results:
+            by_operation.setdefault(row[0], []).append(row)
+        return {
+            "elapsed_s": elapsed,
+            "concurrency": self.concurrency,
+            "overall": summarize(self.results),
+            "operations": {name: summarize(rows) for name, rows in sorted(by_operation.items())},
+            "jobs_completed": len(self.completed),
+        }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, data_dir, fake=True, uvicorn_workers=1, env=None):
+    """Start the API with uvicorn in a subprocess and wait until it answers"""
+    server_env = dict(os.environ, QC_DATA_DIR=data_dir, **(env or {}))
+    if fake:
+        server_env["QC_FAKE_COMPUTE"] = "1"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(uvicorn_workers), "--log-level", "warning"],
+        cwd=str(Path(__file__).resolve().parent), env=server_env,
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url + "/", timeout=1):
+                return process, url
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("API server did not start within 60 s")
+
+
+def print_report(report):
+    print(f"\n{'operation':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} {'429s':>6}")
+    rows = list(report["operations"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        lat = stats["latency_ms"]
+
+        def fmt(value):
+            return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+        print(f"{name:<10} {stats['requests']:>8} {stats['throughput_rps']:>8.1f} {fmt(lat['p50'])} "
+              f"{fmt(lat['p90'])} {fmt(lat['p99'])} {stats['error_rate']:>7.1%} {stats['rejected_rate']:>6.1%}")
+    print(f"\nJobs completed during the run: {report['jobs_completed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the quantum chemistry API")
+    parser.add_argument("--url", help="test a running API instead of starting one")
+    parser.add_argument("--fake", action="store_true", help="run jobs on the deterministic fake compute backend")
+    parser.add_argument("--uvicorn-workers", type=int, default=1, help="API processes when starting locally")
+    parser.add_argument("--job-workers", type=int, default=None,
+                        help="QC_MAX_WORKERS for the local API (default: its own default)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default 30)")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--molecules", help="directory of .xyz files to submit (default: H2, H2O, CH4)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--keep-data", action="store_true", help="keep the local API's data directory")
+    args = parser.parse_args()
+    if args.duration is None and args.requests is None:
+        args.duration = 30.0
+
+    server = None
+    data_dir = None
+    url = args.url
+    if url is None:
+        data_dir = tempfile.mkdtemp(prefix="qc-loadtest-")
+        env = {"QC_MAX_QUEUE": "100000"}
+        if args.job_workers is not None:
+            env["QC_MAX_WORKERS"] = str(args.job_workers)
+        server, url = start_server(free_port(), data_dir, fake=args.fake,
+                                   uvicorn_workers=args.uvicorn_workers, env=env)
+        print(f"Started API at {url} (data in {data_dir}, fake compute: {args.fake})")
+    try:
+        test = LoadTest(url, parse_mix(args.mix), load_molecules(args.molecules),
+                        concurrency=args.concurrency, seed=args.seed)
+        report = test.run(duration=args.duration, max_requests=args.requests)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if data_dir is not None and not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report["config"] = {"url": args.url or "local", "fake": args.fake, "mix": parse_mix(args.mix),
+                        "uvicorn_workers": args.uvicorn_workers, "seed": args.seed}
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
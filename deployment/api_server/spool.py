@@ -0,0 +1,230 @@
+"""
+Spool-directory job queue shared by the API and workers on any number of hosts
+
+The queue is a directory tree on the shared job volume (``QC_SPOOL_DIR``,
+by default ``spool`` under ``QC_DATA_DIR``), so workers only need that
+volume mounted, not the API's job database. Every state change is a single
+``rename``, which is atomic on local filesystems and on NFS, so exactly one
+process wins each race:
+
+- ``pending/<job>.json``: waiting jobs, written by the API
+- ``running/<job>~<worker>.json``: claimed by renaming the pending file; the
+  worker touches it as a heartbeat
+- ``done/``: outcomes, recorded and removed by the API (``sync``)
+- ``metrics/``: metric samples of job processes, added up by the API
+
+A worker finishing a job first renames its claim to ``finishing/``, and a
+process requeueing a stale claim first renames it to ``requeue/``; whichever
+rename succeeds decides whether the result counts or the job runs again.
+Heartbeat ages are measured against the spool's own file times, so the
+hosts' clocks do not need to agree.
+"""
+import json
+import os
+import re
+import time
+import uuid
+
+STATES = ("pending", "running", "finishing", "requeue", "done", "metrics")
+
+
+def _job_id(name):
+    # Spool file names start with the job id: <job>.json, <job>~<worker>.json or <job>.<nonce>.json
+    return re.split(r"[~.]", name, maxsplit=1)[0]
+
+
+class SpoolQueue:
+    """
+    Job queue in a spool directory
+
+    Parameters:
+    -----------
+    root : str
+        Spool directory; every process using the same directory sees the same queue
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for state in STATES:
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def _path(self, state, name):
+        return os.path.join(self.root, state, name)
+
+    @staticmethod
+    def _claim_name(job_id, worker_id):
+        worker = re.sub(r"[^\w.-]", "-", worker_id)  # e.g. no ':' for SMB shares
+        return f"{job_id}~{worker}.json"
+
+    def _list(self, state):
+        return sorted(name for name in os.listdir(os.path.join(self.root, state))
+                      if name.endswith(".json") and not name.startswith("."))
+
+    def _write(self, state, name, data):
+        # Written under a hidden name and renamed, so readers never see a partial file
+        temp = self._path(state, f".{name}.{uuid.uuid4().hex}")
+        with open(temp, "w") as f:
+            json.dump(data, f)
+        os.replace(temp, self._path(state, name))
+
+    def _read(self, state, name):
+        try:
+            with open(self._path(state, name), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, state, name):
+        try:
+            os.remove(self._path(state, name))
+        except FileNotFoundError:
+            pass
+
+    def _move(self, state, name, new_state, new_name):
+        """Take a file for this process by renaming it; False if another process took it first"""
+        source = self._path(state, name)
+        try:
+            # Touch first: the new name must not look stale to a concurrent requeue_stale
+            os.utime(source)
+            os.rename(source, self._path(new_state, new_name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _now(self):
+        """Current time on the spool filesystem's clock, which also stamps the heartbeats"""
+        clock = os.path.join(self.root, ".clock")
+        with open(clock, "a"):
+            os.utime(clock)
+        return os.stat(clock).st_mtime
+
+    def put(self, job):
+        """
+        Queue a job: a dict with ``job_id``, ``directory``, ``kind``, ``params``,
+        ``priority``, ``created_at`` and ``expires_at``
+        """
+        self._write("pending", f"{job['job_id']}.json", dict(job, abandoned=job.get("abandoned", 0)))
+
+    def discard(self, job_id):
+        """Drop a job that is still waiting (e.g. once it has expired)"""
+        self._remove("pending", f"{job_id}.json")
+
+    def claim(self, worker_id):
+        """Claim the highest-priority, oldest pending job for ``worker_id`` and return it, or None"""
+        now = time.time()
+        waiting = []
+        for name in self._list("pending"):
+            job = self._read("pending", name)
+            if job is None:
+                continue  # claimed meanwhile
+            if job["expires_at"] <= now:
+                self._remove("pending", name)  # its record has expired too
+                continue
+            waiting.append(job)
+        waiting.sort(key=lambda job: (-job["priority"], job["created_at"]))
+        for job in waiting:
+            if self._move("pending", f"{job['job_id']}.json", "running", self._claim_name(job["job_id"], worker_id)):
+                return dict(job, worker_id=worker_id, attempts=job["abandoned"] + 1)
+        return None
+
+    def heartbeat(self, worker_id, job_ids):
+        for job_id in job_ids:
+            try:
+                os.utime(self._path("running", self._claim_name(job_id, worker_id)))
+            except FileNotFoundError:
+                pass  # finished or requeued meanwhile
+
+    def finish(self, job_id, worker_id, status, message):
+        """Record a job's outcome unless it has since been requeued; returns whether it was recorded"""
+        name = self._claim_name(job_id, worker_id)
+        if not self._move("running", name, "finishing", name):
+            return False
+        self._write("done", name, {"job_id": job_id, "worker_id": worker_id, "status": status, "message": message})
+        self._remove("finishing", name)
+        return True
+
+    def release(self, job_id, worker_id):
+        """Return a job claimed by ``worker_id`` to the queue without counting the attempt"""
+        self._requeue("running", self._claim_name(job_id, worker_id), "Job requeued")
+
+    def _requeue(self, state, name, message, abandoned=False, max_attempts=None):
+        """Put a claimed job back in the queue (or fail it after ``max_attempts``); None if taken meanwhile"""
+        taken = f"{_job_id(name)}.{uuid.uuid4().hex[:8]}.json"
+        if not self._move(state, name, "requeue", taken):
+            return None
+        job = self._read("requeue", taken)
+        outcome = None
+        if job is not None:
+            job["abandoned"] += int(abandoned)
+            if max_attempts is not None and job["abandoned"] >= max_attempts:
+                outcome = "failed"
+                self._write("done", taken, {"job_id": job["job_id"], "worker_id": None, "status": "failed",
+                                            "message": "Job was abandoned by its workers too often"})
+            else:
+                outcome = "requeued"
+                self._write("pending", f"{job['job_id']}.json", dict(job, message=message))
+        self._remove("requeue", taken)
+        return outcome
+
+    def requeue_stale(self, stale_after, max_attempts=3):
+        """Requeue claims without a heartbeat for ``stale_after`` seconds; returns the number requeued"""
+        cutoff = self._now() - stale_after
+        requeued = 0
+        # Claims of stopped workers, and jobs left half-way through finish() or a requeue by a crash
+        for state in ("running", "finishing", "requeue"):
+            for name in self._list(state):
+                try:
+                    if os.stat(self._path(state, name)).st_mtime >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                outcome = self._requeue(state, name, "Job requeued after its worker stopped", abandoned=True,
+                                        max_attempts=max_attempts)
+                requeued += outcome == "requeued"
+        return requeued
+
+    def add_metrics(self, samples):
+        """Hand additive metric samples (name, labels dict, value) of a job process to the API"""
+        self._write("metrics", f"{uuid.uuid4().hex}.json", [list(sample) for sample in samples])
+
+    def sync(self, store):
+        """
+        Bring the records in ``store`` (a ``JobStore``) up to date with the queue
+
+        Marks claimed jobs running and requeued ones pending, records outcomes
+        and adds up the metric samples of job processes. The API runs this
+        periodically; running it from several processes at once is harmless.
+        """
+        running = {}
+        for name in self._list("running"):
+            job_id, worker = name[:-len(".json")].split("~", 1)
+            running[job_id] = worker
+        pending = [_job_id(name) for name in self._list("pending")]
+        jobs = store.get_many([*running, *pending])
+        for job_id, worker in running.items():
+            job = jobs.get(job_id)
+            if job is not None and job["status"] in ("pending", "running") and job["worker_id"] != worker:
+                store.update(job_id, status="running", message="Job is running", worker_id=worker)
+        for job_id in pending:
+            job = jobs.get(job_id)
+            if job is not None and job["status"] == "running":
+                queued = self._read("pending", f"{job_id}.json") or {}
+                store.update(job_id, status="pending", message=queued.get("message", "Job requeued"),
+                             worker_id=None)
+        # Outcomes are recorded before their files are removed, so a crash here only repeats the update
+        for name in self._list("done"):
+            outcome = self._read("done", name)
+            if outcome is not None:
+                store.update(outcome["job_id"], status=outcome["status"], message=outcome["message"])
+            self._remove("done", name)
+        # Metric samples must be added exactly once: take each file by renaming it first
+        for name in self._list("metrics"):
+            taken = f".{name}.{uuid.uuid4().hex[:8]}"
+            try:
+                os.rename(self._path("metrics", name), self._path("metrics", taken))
+            except FileNotFoundError:
+                continue
+            samples = self._read("metrics", taken)
+            if samples:
+                store.add_metrics(samples)
+            self._remove("metrics", taken)
@@ -0,0 +1,60 @@
+import sys
+import importlib
+import pytest
+from fastapi.testclient import TestClient
+
+H2 = b"2\nhydrogen\nH 0.0 0.0 0.0\nH 0.0 0.0 0.74\n"
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    # The API reads its configuration at import: fake compute, no embedded worker, a fresh data directory
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('QC_FAKE_COMPUTE', '1')
+        mp.setenv('QC_FAKE_COMPUTE_SECONDS', '0')
+        mp.setenv('QC_MAX_WORKERS', '0')
+        mp.setenv('QC_MAX_QUEUE', '1')
+        mp.setenv('QC_DATA_DIR', str(tmp_path_factory.mktemp('qc-data')))
+        for name in ('api', 'jobs', 'fake_compute', 'energy'):
+            sys.modules.pop(name, None)
+        api = importlib.import_module('api')
+        with TestClient(api.app) as client:
+            yield client
+
+
+def post_energy(client, xyz, **data):
+    return client.post('/energy', files={'molecule': ('molecule.xyz', xyz)}, data=data)
+
+
+def test_energy_inline(client):
+    response = post_energy(client, H2, basis='sto-3g')
+    assert response.status_code == 200
+    result = response.json()
+    assert result['converged'] is True
+    assert result['energy'] < 0
+    assert post_energy(client, H2, basis='sto-3g').json()['energy'] == result['energy']
+
+
+def test_energy_rejects_invalid_xyz(client):
+    assert post_energy(client, b"two\n\nH 0 0 0\n").status_code == 400
+
+
+@pytest.mark.parametrize('xyz', [b"2\n\nH 0 0 0\nH 0 0 x\n", b"2\n\nH 0 0 0\nH 0 0 nan\n"])
+def test_non_numeric_coordinates_are_rejected(client, xyz):
+    response = post_energy(client, xyz)
+    assert response.status_code == 400
+    assert 'line 4' in response.json()['detail']
+    response = client.post('/optimize', files={'molecule': ('molecule.xyz', xyz)})
+    assert response.status_code == 400
+    response = client.post('/optimize/batch', files=[('molecules', ('molecule.xyz', xyz))])
+    assert response.status_code == 400
+
+
+def test_large_molecule_is_queued_until_the_queue_is_full(client):
+    chain = b"30\nhydrogen chain\n" + b"".join(b"H 0.0 0.0 %.2f\n" % (0.74 * i) for i in range(30))
+    response = post_energy(client, chain)
+    assert response.status_code == 202
+    assert response.json()['status'] == 'pending'
+    response = post_energy(client, chain, charge='2')
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
@@ -0,0 +1,89 @@
+import gzip
+import os
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from artifacts import precompress, serve_artifact
+
+DATA = b"".join(b"H %.4f 0.0 0.0\n" % (0.74 * i) for i in range(200))
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "trajectory.xyz"
+    path.write_bytes(DATA)
+    return path
+
+
+@pytest.fixture
+def client(artifact):
+    app = FastAPI()
+
+    @app.get("/file")
+    def get_file(request: Request):
+        return serve_artifact(request, str(artifact), filename="trajectory.xyz")
+
+    return TestClient(app)
+
+
+def get(client, **headers):
+    # Identity unless a test asks for compression; the client would otherwise send gzip, deflate
+    return client.get("/file", headers={"Accept-Encoding": "identity", **headers})
+
+
+def test_identity_with_etag_and_revalidation(client):
+    response = get(client)
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["accept-ranges"] == "bytes"
+    etag = response.headers["etag"]
+    assert get(client, **{"If-None-Match": etag}).status_code == 304
+    assert get(client, **{"If-None-Match": '"other", ' + etag}).status_code == 304
+    assert get(client, **{"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_changes_with_the_file(client, artifact):
+    etag = get(client).headers["etag"]
+    artifact.write_bytes(DATA + b"H 0.0 0.0 0.0\n")
+    response = get(client, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_byte_ranges(client):
+    response = get(client, Range="bytes=10-19")
+    assert response.status_code == 206
+    assert response.content == DATA[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+    assert get(client, Range="bytes=-5").content == DATA[-5:]
+    assert get(client, Range=f"bytes={len(DATA) - 3}-").content == DATA[-3:]
+    response = get(client, Range=f"bytes={len(DATA)}-")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_stale_if_range_gets_the_whole_file(client):
+    response = get(client, Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == DATA
+    etag = response.headers["etag"]
+    assert get(client, Range="bytes=0-9", **{"If-Range": etag}).status_code == 206
+
+
+def test_gzip_on_the_fly_and_precompressed(client, artifact):
+    response = client.get("/file", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == DATA  # decoded by the client
+    identity_etag = get(client).headers["etag"]
+    assert response.headers["etag"] != identity_etag
+
+    assert precompress(str(artifact)) and os.path.exists(str(artifact) + ".gz")
+    response = client.get("/file", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-length"] == str(os.path.getsize(str(artifact) + ".gz"))
+    assert response.content == DATA
+    # Ranges are served from the uncompressed file even if the client accepts gzip
+    response = client.get("/file", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-3"})
+    assert response.status_code == 206
+    assert response.content == DATA[:4]
+    assert "content-encoding" not in response.headers
+    assert gzip.decompress((artifact.parent / "trajectory.xyz.gz").read_bytes()) == DATA
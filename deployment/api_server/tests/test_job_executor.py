@@ -0,0 +1,144 @@
+import os
+import queue
+import time
+import pytest
+from job_executor import JobExecutor, QueueFullError
+
+
+def sleep_job(seconds):
+    time.sleep(seconds)
+    return "complete", f"slept {seconds} s"
+
+
+def failing_job():
+    raise ValueError("bad input")
+
+
+class StatusLog:
+    """on_status callback recording every status change"""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def __call__(self, job_id, status, message):
+        self.events.put((job_id, status, message))
+
+    def wait(self, job_id, status, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            event = self.events.get(timeout=max(deadline - time.time(), 0.01))
+            if event[:2] == (job_id, status):
+                return event
+        raise AssertionError(f"{job_id} never reported {status}")
+
+    def outcome(self, job_id, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            event = self.events.get(timeout=max(deadline - time.time(), 0.01))
+            if event[0] == job_id and event[1] != "running":
+                return event[1:]
+        raise AssertionError(f"{job_id} never finished")
+
+
+@pytest.fixture
+def log():
+    return StatusLog()
+
+
+def test_full_queue_is_rejected(log):
+    executor = JobExecutor(max_workers=1, max_queue=1, on_status=log)
+    try:
+        executor.submit("running", sleep_job, (2,))
+        log.wait("running", "running")
+        executor.submit("waiting", sleep_job, (0,))
+        assert executor.queue_position("running") == 0
+        assert executor.queue_position("waiting") == 1
+        with pytest.raises(QueueFullError):
+            executor.submit("rejected", sleep_job, (0,))
+    finally:
+        executor.shutdown()
+
+
+def test_higher_priority_runs_first(log):
+    executor = JobExecutor(max_workers=1, max_queue=4, on_status=log)
+    try:
+        executor.submit("first", sleep_job, (0.5,))
+        log.wait("first", "running")
+        executor.submit("low", sleep_job, (0,), priority=0)
+        executor.submit("high", sleep_job, (0,), priority=5)
+        started = []
+        while len(started) < 2:
+            job_id, status, _ = log.events.get(timeout=10)
+            if status == "running":
+                started.append(job_id)
+        assert started == ["high", "low"]
+    finally:
+        executor.shutdown()
+
+
+def test_job_result_and_errors(log):
+    executor = JobExecutor(max_workers=2, on_status=log)
+    try:
+        executor.submit("ok", sleep_job, (0,))
+        assert log.outcome("ok") == ("complete", "slept 0 s")
+        executor.submit("error", failing_job)
+        assert log.outcome("error") == ("failed", "Error during job: bad input")
+    finally:
+        executor.shutdown()
+
+
+def burn_cpu():
+    while True:
+        pass
+
+
+def allocate(mb):
+    block = bytearray(mb * 1024 * 1024)
+    return "complete", f"allocated {len(block) >> 20} MB"
+
+
+def address_space_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmSize:"):
+                return int(line.split()[1]) // 1024
+
+
+def test_cpu_limit_kills_the_job(log):
+    executor = JobExecutor(cpu_seconds=1, on_status=log)
+    try:
+        executor.submit("spin", burn_cpu)
+        assert log.outcome("spin") == ("failed", "Job exceeded its CPU time limit")
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc to size the limit")
+def test_memory_limit_fails_the_job(log):
+    # The child inherits this process's address space, so the limit sits 256 MB above it
+    # (threads=0: no PySCF thread setup, which would map its BLAS library under the limit)
+    executor = JobExecutor(memory_mb=address_space_mb() + 256, threads=0, on_status=log)
+    try:
+        executor.submit("small", allocate, (64,))
+        assert log.outcome("small") == ("complete", "allocated 64 MB")
+        executor.submit("large", allocate, (1024,))
+        assert log.outcome("large") == ("failed", "Job exceeded its memory limit")
+    finally:
+        executor.shutdown()
+
+
+def test_wall_clock_limit_terminates_the_job(log):
+    executor = JobExecutor(timeout=0.5, on_status=log)
+    try:
+        executor.submit("slow", sleep_job, (30,))
+        assert log.outcome("slow") == ("failed", "Job exceeded its time limit of 0.5 s")
+    finally:
+        executor.shutdown()
+
+
+def test_shutdown_interrupts_running_jobs(log):
+    executor = JobExecutor(on_status=log)
+    executor.submit("long", sleep_job, (30,))
+    log.wait("long", "running")
+    executor.shutdown()
+    assert log.outcome("long") == ("interrupted", "Job was stopped by a shutdown")
@@ -0,0 +1,79 @@
+import os
+import time
+import pytest
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_jobs_persist_across_connections(tmp_path, store):
+    store.create("a", str(tmp_path / "a"), expires_at=time.time() + 60, status="complete", message="done")
+    reopened = JobStore(store.path)
+    job = reopened.get("a")
+    assert (job["status"], job["message"]) == ("complete", "done")
+    assert "a" in reopened and "b" not in reopened
+
+
+def test_update(store):
+    store.create("a", "/nowhere", expires_at=time.time() + 60)
+    store.update("a", status="failed", message="boom")
+    assert store.get("a")["status"] == "failed"
+    with pytest.raises(ValueError):
+        store.update("a", colour="red")
+
+
+def test_expired_jobs_are_hidden_and_reaped(tmp_path, store):
+    live, dead = tmp_path / "live", tmp_path / "dead"
+    live.mkdir()
+    dead.mkdir()
+    store.create("live", str(live), expires_at=time.time() + 60)
+    store.create("dead", str(dead), expires_at=time.time() - 1)
+    store.create_batch("old", ["dead"], ["dead.xyz"], expires_at=time.time() - 1)
+    assert store.get("dead") is None
+    assert list(store.get_many(["live", "dead"])) == ["live"]
+    assert store.count_by_status() == {"pending": 1}
+    assert store.get_batch("old") is None
+
+    assert store.reap_expired() == 1
+    assert not dead.exists() and live.exists()
+    assert JobStore(store.path)._conn().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 1
+
+
+def test_reaper_works_in_batches(tmp_path, store):
+    for i in range(5):
+        store.create(f"job{i}", str(tmp_path / f"job{i}"), expires_at=time.time() - 1)
+    assert store.reap_expired(batch_size=2) == 2
+    assert store.reap_expired(batch_size=10) == 3
+    assert store.reap_expired() == 0
+
+
+def test_metrics_are_added_up(store):
+    store.add_metrics([("qc_jobs_finished_total", {"kind": "optimize", "status": "complete"}, 1.0)])
+    store.add_metrics([("qc_jobs_finished_total", {"status": "complete", "kind": "optimize"}, 2.0)])
+    assert store.metric_samples() == [("qc_jobs_finished_total", {"kind": "optimize", "status": "complete"}, 3.0)]
+
+
+def test_resubmitting_an_expired_job_replaces_it(tmp_path, store):
+    job_dir = tmp_path / "same"
+    job = {"job_id": "same", "directory": str(job_dir), "expires_at": time.time() + 60, "kind": "optimize",
+           "params": {"basis": "sto-3g"}}
+    written = []
+
+    def prepare(job):
+        job_dir.mkdir(exist_ok=True)
+        (job_dir / "input.xyz").write_text("new")
+        written.append(job["job_id"])
+
+    assert store.enqueue_many([job], prepare=prepare) == ["same"]
+    store.update("same", status="complete", expires_at=time.time() - 1)
+    assert store.get("same") is None
+
+    # Not reaped yet: the resubmission takes over the id instead of being ignored
+    assert store.enqueue_many([job], prepare=prepare) == ["same"]
+    assert written == ["same", "same"]
+    assert store.get("same")["status"] == "pending"
+    assert store.reap_expired() == 0
+    assert (job_dir / "input.xyz").read_text() == "new"
@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+import time
+import pytest
+import jobs
+from job_store import JobStore
+from spool import SpoolQueue
+from worker import Worker
+
+
+def job(job_id, priority=0, created_at=None, expires_in=60):
+    now = time.time()
+    return {"job_id": job_id, "directory": f"/jobs/{job_id}", "kind": "optimize", "params": {"basis": "sto-3g"},
+            "priority": priority, "created_at": created_at or now, "expires_at": now + expires_in}
+
+
+def make_stale(queue, state="running"):
+    old = time.time() - 3600
+    for name in os.listdir(os.path.join(queue.root, state)):
+        os.utime(os.path.join(queue.root, state, name), (old, old))
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SpoolQueue(str(tmp_path / "spool"))
+
+
+def test_claim_order_is_priority_then_age(queue):
+    queue.put(job("old", created_at=1.0))
+    queue.put(job("new", created_at=2.0))
+    queue.put(job("urgent", priority=5, created_at=3.0))
+    claimed = [queue.claim("w1")["job_id"] for _ in range(3)]
+    assert claimed == ["urgent", "old", "new"]
+    assert queue.claim("w1") is None
+
+
+def test_expired_jobs_are_not_claimed(queue):
+    queue.put(job("expired", expires_in=-1))
+    assert queue.claim("w1") is None
+    assert os.listdir(os.path.join(queue.root, "pending")) == []
+
+
+def claim_all(root, worker_id, results):
+    queue = SpoolQueue(root)
+    while True:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            break
+        results.put(claimed["job_id"])
+
+
+def test_each_job_is_claimed_by_exactly_one_process(queue):
+    for i in range(40):
+        queue.put(job(f"job{i}"))
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=claim_all, args=(queue.root, f"w{i}", results)) for i in range(4)]
+    for process in workers:
+        process.start()
+    claimed = [results.get(timeout=30) for _ in range(40)]
+    for process in workers:
+        process.join(timeout=30)
+    assert sorted(claimed) == sorted(f"job{i}" for i in range(40))
+    assert results.empty()
+
+
+def test_stale_claim_is_requeued_and_its_late_result_dropped(queue):
+    queue.put(job("a"))
+    assert queue.claim("w1")["attempts"] == 1
+    queue.heartbeat("w1", ["a"])
+    assert queue.requeue_stale(stale_after=60) == 0
+
+    make_stale(queue)
+    assert queue.requeue_stale(stale_after=60) == 1
+    assert queue.finish("a", "w1", "complete", "too late") is False
+    retry = queue.claim("w2")
+    assert (retry["job_id"], retry["attempts"], retry["message"]) == ("a", 2, "Job requeued after its worker stopped")
+    assert queue.finish("a", "w2", "complete", "done") is True
+
+
+def test_job_fails_after_max_attempts(tmp_path, queue):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), queue=queue)
+    store.enqueue("a", "/jobs/a", time.time() + 60, "optimize", {})
+    for attempt in range(3):
+        assert queue.claim(f"w{attempt}") is not None
+        make_stale(queue)
+        queue.requeue_stale(stale_after=60, max_attempts=3)
+    assert queue.claim("w4") is None
+    queue.sync(store)
+    assert (store.get("a")["status"], store.get("a")["message"]) == (
+        "failed", "Job was abandoned by its workers too often")
+
+
+def test_release_does_not_count_as_an_attempt(queue):
+    queue.put(job("a"))
+    queue.claim("w1")
+    queue.release("a", "w1")
+    assert queue.claim("w2")["attempts"] == 1
+
+
+def test_sync_records_claims_outcomes_and_metrics(tmp_path, queue):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), queue=queue)
+    store.enqueue("a", "/jobs/a", time.time() + 60, "optimize", {"basis": "sto-3g"})
+    claimed = queue.claim("host-1:42:abc")
+    assert claimed["params"] == {"basis": "sto-3g"}
+    queue.sync(store)
+    assert (store.get("a")["status"], store.get("a")["worker_id"]) == ("running", "host-1-42-abc")
+
+    queue.finish("a", "host-1:42:abc", "complete", "Optimization completed successfully")
+    queue.add_metrics([("qc_jobs_finished_total", {"kind": "optimize", "status": "complete"}, 1.0)])
+    queue.sync(store)
+    queue.sync(store)
+    assert store.get("a")["status"] == "complete"
+    assert store.metric_samples() == [("qc_jobs_finished_total", {"kind": "optimize", "status": "complete"}, 1.0)]
+    assert all(not os.listdir(os.path.join(queue.root, state)) for state in ("running", "done", "metrics"))
+
+
+def test_reaping_an_expired_job_drops_it_from_the_queue(tmp_path, queue):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), queue=queue)
+    store.enqueue("a", str(tmp_path / "a"), time.time() - 1, "optimize", {})
+    assert store.reap_expired() == 1
+    assert os.listdir(os.path.join(queue.root, "pending")) == []
+
+
+def write_marker(job_dir, value):
+    os.makedirs(job_dir, exist_ok=True)
+    with open(os.path.join(job_dir, "marker"), "w") as f:
+        f.write(value)
+    return "complete", f"wrote {value}"
+
+
+def test_workers_on_separate_queue_handles_run_every_job_once(tmp_path, monkeypatch):
+    # Each worker has its own SpoolQueue on the shared directory, as on separate hosts
+    monkeypatch.setitem(jobs.JOB_KINDS, "marker", write_marker)
+    spool_dir = str(tmp_path / "spool")
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), queue=SpoolQueue(spool_dir))
+    job_ids = [f"job{i}" for i in range(6)]
+    store.enqueue_many([{"job_id": job_id, "directory": str(tmp_path / job_id), "expires_at": time.time() + 60,
+                         "kind": "marker", "params": {"value": job_id}} for job_id in job_ids])
+    workers = [Worker(SpoolQueue(spool_dir), concurrency=2, poll_interval=0.05) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    try:
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            store.queue.sync(store)
+            if all(job["status"] == "complete" for job in store.get_many(job_ids).values()):
+                break
+            time.sleep(0.1)
+    finally:
+        for worker in workers:
+            worker.stop()
+    for job_id in job_ids:
+        assert (store.get(job_id)["status"], store.get(job_id)["message"]) == ("complete", f"wrote {job_id}")
+        assert (tmp_path / job_id / "marker").read_text() == job_id
@@ -0,0 +1,38 @@
+import pytest
+from worker import Worker
+
+
+class RecordingQueue:
+    """The queue calls a Worker makes, recorded instead of executed"""
+
+    def __init__(self):
+        self.calls = []
+
+    def finish(self, job_id, worker_id, status, message):
+        self.calls.append(("finish", job_id, status))
+
+    def release(self, job_id, worker_id):
+        self.calls.append(("release", job_id))
+
+
+@pytest.fixture
+def worker():
+    worker = Worker(RecordingQueue())
+    yield worker
+    worker.executor.shutdown()
+
+
+def test_job_finished_while_stopping_keeps_its_outcome(worker):
+    worker._active.update({"done", "failed"})
+    worker._stop.set()
+    worker._on_status("done", "complete", "Optimization completed successfully")
+    worker._on_status("failed", "failed", "Error during job: bad input")
+    assert worker.queue.calls == [("finish", "done", "complete"), ("finish", "failed", "failed")]
+    assert not worker._active
+
+
+def test_interrupted_job_is_released(worker):
+    worker._active.add("cut")
+    worker._stop.set()
+    worker._on_status("cut", "interrupted", "Job was stopped by a shutdown")
+    assert worker.queue.calls == [("release", "cut")]
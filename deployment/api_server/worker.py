@@ -0,0 +1,186 @@
+"""
+Standalone worker that runs queued API jobs
+
+Workers claim pending jobs from the spool queue (see ``spool``), run each
+one in a resource-limited child process (see ``job_executor``), write
+artifacts to the job's directory under the shared ``QC_DATA_DIR`` and record
+the outcome in the spool. While jobs run, the worker sends heartbeats; any
+worker requeues jobs whose owner has stopped sending them, so a crashed node
+does not lose work.
+
+Start as many workers as needed on any number of hosts. They only need the
+API's data directory (which holds the spool) mounted at the same path, e.g.
+over NFS; they never open the API's job database.
+
+Usage as script:
+    python worker.py [--concurrency N] [--poll-interval SECONDS] [--spool DIR]
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from job_executor import JobExecutor
+from spool import SpoolQueue
+from jobs import (SPOOL_DIR, JOB_CPU_SECONDS, JOB_MEMORY_MB, JOB_THREADS, JOB_TIMEOUT,
+                  HEARTBEAT_INTERVAL, STALE_AFTER, WARM_WORKERS, preload_compute, run_job)
+
+
+class Worker:
+    """
+    Claim jobs from a SpoolQueue and run them on a JobExecutor
+
+    Parameters:
+    -----------
+    queue : SpoolQueue
+        Work queue shared with the API and the other workers
+    concurrency : int
+        Maximum number of jobs this worker runs at once
+    poll_interval : float
+        Seconds between queue polls when the worker is idle or full
+    heartbeat_interval, stale_after : float
+        Heartbeat period, and heartbeat age after which a running job is requeued
+    warm : int
+        Job processes kept started with the compute stack imported (see ``job_executor``)
+    """
+
+    def __init__(self, queue, concurrency=1, poll_interval=1.0, heartbeat_interval=HEARTBEAT_INTERVAL,
+                 stale_after=STALE_AFTER, cpu_seconds=JOB_CPU_SECONDS, memory_mb=JOB_MEMORY_MB,
+                 threads=JOB_THREADS, timeout=JOB_TIMEOUT, warm=WARM_WORKERS):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.executor = JobExecutor(
+            max_workers=concurrency,
+            max_queue=concurrency,
+            cpu_seconds=cpu_seconds,
+            memory_mb=memory_mb,
+            threads=threads,
+            timeout=timeout,
+            on_status=self._on_status,
+            warm_processes=warm,
+            preload=preload_compute,
+        )
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _on_status(self, job_id, status, message):
+        if status == "running":
+            return
+        with self._lock:
+            self._active.discard(job_id)
+        if status == "interrupted":
+            # Terminated by stop() before it finished: hand the job back to the queue instead of failing it.
+            # A job that finished while stopping keeps its outcome.
+            self.queue.release(job_id, self.worker_id)
+        else:
+            self.queue.finish(job_id, self.worker_id, status, message)
+
+    def poll(self):
+        """Requeue stale jobs, then claim jobs until this worker is full; returns the number claimed"""
+        self.queue.requeue_stale(self.stale_after)
+        claimed = 0
+        while True:
+            with self._lock:
+                if len(self._active) >= self.concurrency:
+                    break
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                break
+            with self._lock:
+                self._active.add(job["job_id"])
+            self.executor.submit(job["job_id"], run_job,
+                                 (job["kind"], job["directory"], job["params"], job["created_at"]))
+            claimed += 1
+        return claimed
+
+    def _claim_loop(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.poll()
+            except OSError as e:
+                print(f"Worker {self.worker_id}: error polling job queue: {str(e)}")
+                claimed = 0
+            if not claimed:
+                self._stop.wait(self.poll_interval)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                active = list(self._active)
+            try:
+                self.queue.heartbeat(self.worker_id, active)
+            except OSError as e:
+                print(f"Worker {self.worker_id}: error sending heartbeat: {str(e)}")
+
+    def start(self):
+        """Start warm job processes, then run the claim and heartbeat loops in daemon threads"""
+        self._stop.clear()
+        self.executor.start_warm()
+        self._threads = [
+            threading.Thread(target=self._claim_loop, name="worker-claim", daemon=True),
+            threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=10.0):
+        """Stop claiming, terminate running jobs and return them to the queue"""
+        self._stop.set()
+        self.executor.shutdown()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if not self._active:
+                    return
+            time.sleep(0.1)
+        # Jobs claimed but never started get no status callback
+        with self._lock:
+            remaining = list(self._active)
+            self._active.clear()
+        for job_id in remaining:
+            self.queue.release(job_id, self.worker_id)
+
+    def run_forever(self):
+        self.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stop.set())
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued quantum chemistry API jobs")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("QC_WORKER_CONCURRENCY", 1)),
+                        help="jobs run at once by this worker (default: QC_WORKER_CONCURRENCY or 1)")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="seconds between queue polls when idle")
+    parser.add_argument("--spool", default=SPOOL_DIR,
+                        help="spool directory shared with the API (default: QC_SPOOL_DIR, or spool in QC_DATA_DIR)")
+    parser.add_argument("--warm", type=int, default=WARM_WORKERS,
+                        help="job processes kept started and preloaded (default: QC_WARM_WORKERS or 0)")
+    args = parser.parse_args()
+
+    if not args.warm:
+        # Jobs are forked from this process, so import the compute stack once here
+        preload_compute()
+    worker = Worker(SpoolQueue(args.spool), concurrency=args.concurrency, poll_interval=args.poll_interval,
+                    warm=args.warm)
+    print(f"Worker {worker.worker_id} polling {args.spool} with concurrency {args.concurrency}")
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
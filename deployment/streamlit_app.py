@@ -2,18 +2,19 @@ import streamlit as st
 import os
 import sys
 import tempfile
-import numpy as np
-import matplotlib.pyplot as plt
-from io import StringIO
+import hashlib
+import json
 import base64
-import time
-import shutil
+
+import httpx
 
 # Add parent directory to path to import the quantum chemistry modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from my_hf_program.molecule import load_molecule
-from my_hf_program.visualize_trajectory_py3dmol import read_xyz_trajectory, visualize_trajectory_py3dmol
-from my_hf_program.optimize_geometry import optimize_geometry
+from my_hf_program.visualize_trajectory_py3dmol import parse_xyz_trajectory, visualize_trajectory_py3dmol
+
+# Calculations run on the API service's workers; this app only submits jobs and shows their results
+API_URL = os.environ.get("API_URL", "http://localhost:8000").rstrip("/")
+API_TIMEOUT = float(os.environ.get("API_TIMEOUT", 30))
 
 # Page configuration
 st.set_page_config(
@@ -36,58 +37,155 @@ page = st.sidebar.selectbox(
     ["Home", "Geometry Optimization", "Trajectory Visualization"]
 )
 
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# Parsed trajectories and generated pages are cached across reruns and sessions by content hash;
+# the leading-underscore arguments are not hashed by Streamlit
+@st.cache_data(max_entries=64, show_spinner=False)
+def parse_trajectory(digest: str, _content: bytes):
+    return parse_xyz_trajectory(_content.decode())
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def trajectory_html(digest: str, _content: bytes) -> str:
+    symbols, trajectory = parse_trajectory(digest, _content)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        html_file = os.path.join(temp_dir, 'trajectory_vis.html')
+        visualize_trajectory_py3dmol(symbols, trajectory, html_file, compact=True)
+        with open(html_file, 'r') as f:
+            return f.read()
+
+
+# Finished job artifacts never change, so they are fetched once per job
+@st.cache_data(max_entries=256, show_spinner=False)
+def fetch_job_file(job_id: str, filename: str) -> bytes:
+    response = httpx.get(f"{API_URL}/files/{job_id}/{filename}", timeout=API_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+
+def submit_optimization(xyz: bytes, filename: str, charge: int, basis: str, max_steps: int) -> dict:
+    """Queue an optimization job with the API; returns its status record"""
+    response = httpx.post(
+        f"{API_URL}/optimize",
+        files={"molecule": (filename, xyz, "chemical/x-xyz")},
+        data={"charge": str(charge), "basis": basis, "max_steps": str(max_steps)},
+        timeout=API_TIMEOUT,
+    )
+    if response.status_code == 429:
+        raise RuntimeError(f"The job queue is full; retry in {response.headers.get('Retry-After', '30')} s")
+    response.raise_for_status()
+    return response.json()
+
+
+def job_events(job_id: str, from_step: int = 0):
+    """Yield (event, data) pairs from the API's Server-Sent Events stream until the job finishes"""
+    url = f"{API_URL}/jobs/{job_id}/events"
+    timeout = httpx.Timeout(API_TIMEOUT, read=60.0)  # the API sends keep-alives every 15 s
+    with httpx.stream("GET", url, params={"from_step": from_step}, timeout=timeout) as response:
+        response.raise_for_status()
+        event, data = "message", []
+        for line in response.iter_lines():
+            if line.startswith(":"):
+                continue
+            if not line:
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+
+
+def follow_job(job: dict, max_steps: int):
+    """
+    Show a job's live progress, recording it in ``job`` (kept in the session
+    state) so that a rerun resumes the stream where it left off
+    """
+    progress_bar = st.progress(0.0)
+    status_text = st.empty()
+    chart = st.empty()
+
+    def show():
+        steps = job["steps"]
+        if job["status"] == "complete":
+            progress_bar.progress(1.0)
+        elif steps:
+            # Evaluations, not BFGS iterations: keep the bar short of full until the job finishes
+            progress_bar.progress(min(steps[-1]["step"] / (2 * max_steps), 0.99))
+        if steps:
+            last = steps[-1]
+            status_text.info(f"{job['status'].capitalize()}: evaluation {last['step']}, "
+                             f"E = {last['energy']:.8f} Ha, |grad| = {last['grad_norm']:.2e}")
+            chart.line_chart({"Energy (Hartree)": [event["energy"] for event in steps]})
+        elif job["status"] == "pending":
+            position = job.get("queue_position")
+            status_text.info(f"Waiting for a worker (queue position {position})" if position
+                             else "Waiting for a worker")
+        else:
+            status_text.info(job.get("message") or job["status"])
+
+    show()
+    if job["status"] in ("complete", "failed", "expired"):
+        return
+    from_step = job["steps"][-1]["step"] if job["steps"] else 0
+    for event, data in job_events(job["job_id"], from_step):
+        if event == "step":
+            job["steps"].append({key: data[key] for key in ("step", "energy", "grad_norm")})
+        elif event == "status":
+            job.update(status=data["status"], message=data.get("message", ""),
+                       queue_position=data.get("queue_position"))
+        show()
+
+
 # Function to create a download link for files
-def get_binary_file_downloader_html(bin_file, file_label='File'):
-    with open(bin_file, 'rb') as f:
-        data = f.read()
+def get_binary_download_html(data, filename, file_label='File'):
     bin_str = base64.b64encode(data).decode()
-    href = f'<a href="data:application/octet-stream;base64,{bin_str}" download="{os.path.basename(bin_file)}">{file_label}</a>'
+    href = f'<a href="data:application/octet-stream;base64,{bin_str}" download="{filename}">{file_label}</a>'
     return href
 
 # Home page
 if page == "Home":
     st.header("Welcome to the Quantum Chemistry Web App!")
-    
+
     st.markdown("""
     **Available Functions:**
-    
+
     1. **Geometry Optimization**: Optimize molecular geometries using Hartree-Fock with PySCF and BFGS
     2. **Trajectory Visualization**: Visualize molecular trajectories interactively in 3D
-    
+
     **How to Use:**
     - Navigate using the sidebar on the left
     - Upload XYZ files for molecules
     - Run calculations and visualizations directly in your browser
-    
+
     **Requirements:**
     - XYZ files should follow standard format (number of atoms, comment, then atom coordinates)
     - For best results with visualization, use modern browsers
     """)
-    
-    st.image("https://upload.wikimedia.org/wikipedia/commons/9/9f/Benzene3D.png", 
+
+    st.image("https://upload.wikimedia.org/wikipedia/commons/9/9f/Benzene3D.png",
              caption="Example molecular structure visualization", width=300)
 
 # Geometry Optimization page
 elif page == "Geometry Optimization":
     st.header("Geometry Optimization")
     st.markdown("Optimize molecular geometry using Hartree-Fock calculations with PySCF")
-    
+
     # File upload
     uploaded_file = st.file_uploader("Upload an XYZ file", type="xyz")
-    
+
     if uploaded_file is not None:
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xyz') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            temp_xyz_path = tmp_file.name
-        
+        xyz_content = uploaded_file.getvalue()
         st.success(f"Successfully uploaded {uploaded_file.name}")
-        
+
         # Display the uploaded molecule
-        with open(temp_xyz_path, 'r') as f:
-            xyz_content = f.read()
-        st.text_area("XYZ File Content:", xyz_content, height=200)
-        
+        st.text_area("XYZ File Content:", xyz_content.decode(errors="replace"), height=200)
+
         # Parameters for geometry optimization
         st.subheader("Optimization Parameters")
         col1, col2, col3 = st.columns(3)
@@ -97,98 +195,77 @@ elif page == "Geometry Optimization":
             basis = st.selectbox("Basis Set", ["sto-3g", "3-21g", "6-31g", "cc-pvdz"])
         with col3:
             max_steps = st.slider("Max Optimization Steps", 10, 200, 100)
-        
+
+        # The job for this molecule and these parameters survives reruns of the script
+        job_key = content_hash(xyz_content + f"|{charge}|{basis}|{max_steps}".encode())
+        job = st.session_state.get("optimization")
+        if job is not None and job["key"] != job_key:
+            job = None
+
         # Run optimization
         if st.button("Run Geometry Optimization"):
             try:
-                st.info("Running geometry optimization... This may take a while.")
-                progress_bar = st.progress(0)
-                
-                # Temporarily change directory for file output
-                current_dir = os.getcwd()
-                temp_dir = tempfile.mkdtemp()
-                os.chdir(temp_dir)
-                
-                # Run the optimization
-                optimize_geometry(temp_xyz_path, charge, basis, max_steps=max_steps)
-                
-                # Check for result files
-                trajectory_file = os.path.join(temp_dir, 'geometry_trajectory.xyz')
-                optimized_file = os.path.join(temp_dir, 'optimized.xyz')
-                
-                # Move back to original directory
-                os.chdir(current_dir)
-                
-                if os.path.exists(trajectory_file) and os.path.exists(optimized_file):
-                    st.success("Optimization completed successfully!")
-                    
+                submitted = submit_optimization(xyz_content, uploaded_file.name, int(charge), basis, max_steps)
+                job = {"key": job_key, "job_id": submitted["job_id"], "status": submitted["status"],
+                       "message": submitted["message"], "queue_position": submitted.get("queue_position"),
+                       "steps": [], "visualize": False}
+                st.session_state["optimization"] = job
+            except (httpx.HTTPError, RuntimeError) as e:
+                st.error(f"Could not submit the optimization to {API_URL}: {str(e)}")
+
+        if job is not None:
+            try:
+                follow_job(job, max_steps)
+            except httpx.HTTPError as e:
+                st.warning(f"Lost connection to the API ({str(e)}); progress resumes on the next rerun.")
+
+            if job["status"] == "complete":
+                st.success("Optimization completed successfully!")
+                try:
+                    trajectory_xyz = fetch_job_file(job["job_id"], "geometry_trajectory.xyz")
+                    optimized_xyz = fetch_job_file(job["job_id"], "optimized.xyz")
+
                     # Create download links
                     st.markdown("### Download Results")
-                    st.markdown(get_binary_file_downloader_html(trajectory_file, 'Trajectory XYZ'), unsafe_allow_html=True)
-                    st.markdown(get_binary_file_downloader_html(optimized_file, 'Optimized XYZ'), unsafe_allow_html=True)
-                    
+                    st.markdown(get_binary_download_html(trajectory_xyz, "geometry_trajectory.xyz", 'Trajectory XYZ'),
+                                unsafe_allow_html=True)
+                    st.markdown(get_binary_download_html(optimized_xyz, "optimized.xyz", 'Optimized XYZ'),
+                                unsafe_allow_html=True)
+
                     # Visualize the trajectory
                     st.subheader("Visualization")
                     if st.button("Visualize Trajectory"):
-                        symbols, trajectory = read_xyz_trajectory(trajectory_file)
-                        html_file = os.path.join(temp_dir, 'trajectory_vis.html')
-                        visualize_trajectory_py3dmol(symbols, trajectory, html_file)
-                        
-                        # Display the HTML content in an iframe
-                        with open(html_file, 'r') as f:
-                            html_content = f.read()
-                        st.components.v1.html(html_content, height=600)
-                else:
-                    st.error("Optimization failed. Please check your input file and parameters.")
-            
-            except Exception as e:
-                st.error(f"An error occurred during optimization: {str(e)}")
-            
-            # Clean up temporary files
-            try:
-                os.remove(temp_xyz_path)
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+                        job["visualize"] = True
+                    if job["visualize"]:
+                        st.components.v1.html(trajectory_html(content_hash(trajectory_xyz), trajectory_xyz),
+                                              height=600)
+                except httpx.HTTPError as e:
+                    st.error(f"Could not download the results: {str(e)}")
+            elif job["status"] in ("failed", "expired"):
+                st.error(f"Optimization failed: {job.get('message', '')}. "
+                         "Please check your input file and parameters.")
 
 # Trajectory Visualization page
 elif page == "Trajectory Visualization":
     st.header("Trajectory Visualization")
     st.markdown("Visualize molecular trajectories using interactive 3D viewer")
-    
+
     # File upload
     uploaded_file = st.file_uploader("Upload a trajectory XYZ file", type="xyz")
-    
+
     if uploaded_file is not None:
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xyz') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            temp_xyz_path = tmp_file.name
-        
+        content = uploaded_file.getvalue()
+        digest = content_hash(content)
         st.success(f"Successfully uploaded {uploaded_file.name}")
-        
+
         try:
             # Read trajectory
-            symbols, trajectory = read_xyz_trajectory(temp_xyz_path)
+            symbols, trajectory = parse_trajectory(digest, content)
             st.write(f"Loaded trajectory with {len(trajectory)} frames and {len(symbols)} atoms")
-            
-            # Create visualization
-            temp_dir = tempfile.mkdtemp()
-            html_file = os.path.join(temp_dir, 'trajectory_vis.html')
-            visualize_trajectory_py3dmol(symbols, trajectory, html_file)
-            
-            # Display the HTML content in an iframe
-            with open(html_file, 'r') as f:
-                html_content = f.read()
-            st.components.v1.html(html_content, height=600)
-            
-            # Clean up temporary files
-            try:
-                os.remove(temp_xyz_path)
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-        
+
+            # Display the visualization in an iframe
+            st.components.v1.html(trajectory_html(digest, content), height=600)
+
         except Exception as e:
             st.error(f"An error occurred during visualization: {str(e)}")
             st.error("Please make sure the uploaded file is a valid multi-frame XYZ trajectory file.")
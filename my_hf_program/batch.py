@@ -0,0 +1,264 @@
+"""
+Batch single-point RHF energies for screening many molecules in one run
+
+``python main.py --batch`` takes any number of XYZ files; every frame of a
+multi-frame file is a separate molecule (``screen.xyz#3`` is its third
+frame). Instead of one Python process per molecule, a batch
+
+- pays interpreter start-up and imports once,
+- parses every basis set once (``integrals.basis_template``), in the parent
+  before the worker processes are started,
+- computes each distinct molecule once: repeats in any position,
+  orientation or atom order (see ``result_cache.canonicalize``) reuse the
+  result of the first,
+- runs the molecules on a process pool (``--workers``, default CPU count)
+  that splits the memory budget between its workers.
+
+One JSON record per molecule is streamed as soon as it finishes, to stdout
+or ``--output``: energies, SCF iterations, convergence flag, integral
+strategy and timings, or an ``error``. With ``--resume`` the molecules
+already recorded in ``--output`` are skipped and failed ones are retried,
+so an interrupted screening run continues where it stopped.
+
+Usage as script:
+    python main.py --batch *.xyz --output=results.jsonl
+    python main.py --batch screen.xyz --basis=6-31g --workers=4 --output=results.jsonl --resume
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from .molecule import Molecule, read_xyz_frames
+    from .integrals import get_integrals, build_pyscf_mol, basis_template, HAS_PYSCF
+    from .scf import run_scf
+    from .utils import compute_nuclear_repulsion
+    from .memory_planner import STRATEGIES, MEMORY_BUDGET_MB, plan
+    from .result_cache import canonicalize, cache_key
+except ImportError:  # run as a script from this directory
+    from molecule import Molecule, read_xyz_frames
+    from integrals import get_integrals, build_pyscf_mol, basis_template, HAS_PYSCF
+    from scf import run_scf
+    from utils import compute_nuclear_repulsion
+    from memory_planner import STRATEGIES, MEMORY_BUDGET_MB, plan
+    from result_cache import canonicalize, cache_key
+
+
+def compute_record(atoms, charge=0, basis='sto-3g', strategy=None, symmetry=False, budget_mb=None,
+                   max_iter=50, convergence=1e-6):
+    """
+    RHF energy of one molecule (atoms in Angstrom) as a batch record
+
+    Returns a dict with ``energy``, ``electronic_energy`` and
+    ``nuclear_repulsion`` (Hartree), ``converged``, ``iterations``,
+    ``n_basis``, ``strategy`` and ``timings`` (seconds), or with ``error``
+    if the molecule could not be computed.
+    """
+    start = time.perf_counter()
+    record = {'n_atoms': len(atoms), 'charge': charge, 'basis': basis}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # run_scf reports its progress with print
+            mol = Molecule(atoms, charge=charge)
+            if HAS_PYSCF:
+                nbf = build_pyscf_mol(mol, basis).nao_nr()
+                strategy = plan(nbf, budget_mb=budget_mb,
+                                strategies=(strategy,) if strategy else STRATEGIES)['strategy']
+            strategy = strategy or 'incore'
+            setup = time.perf_counter()
+            S, T, V, ERI = get_integrals(mol, basis=basis, symmetry=symmetry, strategy=strategy)
+            integrals = time.perf_counter()
+            try:
+                E_elec, energies, converged = run_scf(S, T, V, ERI, mol, max_iter=max_iter,
+                                                      convergence=convergence, return_energies=True,
+                                                      return_converged=True)
+            finally:
+                if hasattr(ERI, 'close'):
+                    ERI.close()  # out-of-core integrals live in a temporary file
+            scf = time.perf_counter()
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        record['timings'] = {'total': time.perf_counter() - start}
+        return record
+    E_nuc = compute_nuclear_repulsion(mol)
+    record.update({
+        'n_basis': int(S.shape[0]),
+        'strategy': strategy,
+        'energy': float(E_elec + E_nuc),
+        'electronic_energy': float(E_elec),
+        'nuclear_repulsion': float(E_nuc),
+        'converged': bool(converged),
+        'iterations': len(energies),
+        'timings': {
+            'setup': setup - start,
+            'integrals': integrals - setup,
+            'scf': scf - integrals,
+            'total': time.perf_counter() - start,
+        },
+    })
+    if symmetry:
+        record['point_group'] = mol.point_group
+    return record
+
+
+def _warm_basis_templates(symbols, basis):
+    """Parse the batch's basis sets (run in the parent and as the pool initializer)"""
+    if not HAS_PYSCF:
+        return
+    for symbol in symbols:
+        try:
+            basis_template(symbol, basis)
+        except Exception:
+            pass  # unknown element or basis: reported with the molecules that use it
+
+
+def load_records(path):
+    """
+    Successful records of an earlier run by id, for ``--resume``
+
+    Failed records and a line truncated by an interrupted run are dropped
+    from the file, so that the resumed run appends only valid records.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()
+    records, kept = {}, []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or 'id' not in record or 'error' in record:
+            continue
+        records[record['id']] = record
+        kept.append(line)
+    if len(kept) != len(lines):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.writelines(line + '\n' for line in kept)
+        os.replace(temp_path, path)
+    return records
+
+
+def run_batch(paths, output=None, resume=False, charge=0, basis='sto-3g', strategy=None, symmetry=False,
+              budget_mb=None, max_workers=None, max_iter=50, convergence=1e-6):
+    """
+    Compute the RHF energy of every molecule in ``paths`` and write one JSON line per molecule
+
+    Parameters:
+    -----------
+    paths : list of str
+        XYZ files; every frame of a multi-frame file is a molecule
+    output : str, optional
+        JSONL output file (stdout if not given)
+    resume : bool
+        Skip the molecules already recorded in ``output``
+    strategy : str, optional
+        Integral strategy from ``memory_planner.STRATEGIES`` (planned per molecule if not given)
+    budget_mb : float, optional
+        Memory budget of the whole batch (default ``QC_MEMORY_BUDGET_MB``), split between the workers
+    max_workers : int, optional
+        Worker processes (default CPU count); 1 computes in this process
+
+    Returns:
+    --------
+    dict with the number of ``molecules``, ``computed``, ``repeated``
+    (reused from an identical molecule), ``skipped`` (resumed) and ``failed``
+    """
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError(f"Unknown integral strategy '{strategy}'; choose from {', '.join(STRATEGIES)}")
+    if resume and output is None:
+        raise ValueError("--resume needs an --output file")
+    start = time.perf_counter()
+    done = load_records(output) if resume else {}
+    counts = {'molecules': 0, 'computed': 0, 'repeated': 0, 'skipped': 0, 'failed': 0}
+    stream = open(output, 'a' if resume else 'w') if output else sys.stdout
+
+    def emit(record):
+        stream.write(json.dumps(record) + '\n')
+        stream.flush()
+        counts['failed' if 'error' in record else 'computed' if 'duplicate_of' not in record else 'repeated'] += 1
+
+    # Molecules grouped by canonical fingerprint: each group is computed once
+    groups = {}
+    symbols = set()
+    try:
+        for path in paths:
+            try:
+                frames = read_xyz_frames(path)
+            except (OSError, ValueError) as e:
+                counts['molecules'] += 1
+                emit({'id': path, 'file': path, 'error': str(e)})
+                continue
+            for frame, (comment, atoms) in enumerate(frames, start=1):
+                counts['molecules'] += 1
+                entry = {'id': f"{path}#{frame}" if len(frames) > 1 else path, 'file': path, 'frame': frame,
+                         'comment': comment}
+                try:
+                    fingerprint, _ = canonicalize([symbol for symbol, _ in atoms], [xyz for _, xyz in atoms])
+                    key = cache_key(fingerprint, charge=charge, basis=basis.lower(), strategy=strategy,
+                                    symmetry=symmetry)
+                except KeyError:  # element without a tabulated mass: not deduplicated
+                    key = f"id:{entry['id']}"
+                group = groups.setdefault(key, {'atoms': atoms, 'entries': [], 'result': None, 'first': None})
+                if entry['id'] in done:
+                    counts['skipped'] += 1
+                    if group['result'] is None:
+                        previous = done[entry['id']]
+                        group['result'] = {name: value for name, value in previous.items()
+                                           if name not in entry and name != 'duplicate_of'}
+                        group['first'] = previous.get('duplicate_of', previous['id'])
+                else:
+                    group['entries'].append(entry)
+                    symbols.update(symbol for symbol, _ in atoms)
+
+        def finish(group, result):
+            for entry in group['entries']:
+                record = dict(entry, **result)
+                if group['first'] is None:
+                    group['first'] = entry['id']
+                else:
+                    record['duplicate_of'] = group['first']
+                    record['timings'] = {'total': 0.0}
+                emit(record)
+
+        pending = []
+        for group in groups.values():
+            if not group['entries']:
+                continue
+            if group['result'] is not None:
+                finish(group, group['result'])  # computed by the run being resumed
+            else:
+                pending.append(group)
+
+        if pending:
+            workers = min(max_workers or os.cpu_count() or 1, len(pending))
+            settings = {'charge': charge, 'basis': basis, 'strategy': strategy, 'symmetry': symmetry,
+                        'budget_mb': (budget_mb if budget_mb is not None else MEMORY_BUDGET_MB) / workers,
+                        'max_iter': max_iter, 'convergence': convergence}
+            _warm_basis_templates(sorted(symbols), basis)
+            if workers == 1:
+                for group in pending:
+                    finish(group, compute_record(group['atoms'], **settings))
+            else:
+                # Largest molecules first, so that the pool does not end up waiting on one of them
+                pending.sort(key=lambda group: -len(group['atoms']))
+                with ProcessPoolExecutor(max_workers=workers, initializer=_warm_basis_templates,
+                                         initargs=(sorted(symbols), basis)) as pool:
+                    futures = {pool.submit(compute_record, group['atoms'], **settings): index
+                               for index, group in enumerate(pending)}
+                    for future in as_completed(futures):
+                        try:
+                            result = future.result()
+                        except Exception as e:  # the worker process died (e.g. out of memory)
+                            result = {'error': f"{type(e).__name__}: {e}"}
+                        finish(pending[futures[future]], result)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    counts['seconds'] = time.perf_counter() - start
+    return counts
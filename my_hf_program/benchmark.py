@@ -0,0 +1,339 @@
+"""
+Benchmark suite for the quantum chemistry code
+
+Times the hot paths over a ladder of molecule sizes and basis sets:
+
+- ``nuclear_repulsion``: ``utils.compute_nuclear_repulsion``
+- ``integrals``: ``integrals.get_integrals`` (overlap, kinetic, nuclear, ERI)
+- ``scf.jk``, ``scf.eigh``, ``scf.full``: the Coulomb/exchange build, the
+  Roothaan diagonalization and a complete ``scf.run_scf``
+- ``read_xyz_trajectory``: parsing multi-frame XYZ files
+- ``optimize_geometry``: a full RHF/BFGS optimization (small molecules only)
+- ``visualize.frame`` and ``visualize.py3dmol``: the matplotlib frame renderer
+  and the 3Dmol HTML writer (plain and compact)
+- ``startup``: fresh interpreters importing ``main``, ``optimize_geometry``
+  and the API server, and a complete ``main.py h2.xyz --no-plot`` run
+  (use ``python -X importtime -c 'import main'`` to see where import time goes)
+
+Every case is run until ``--min-time`` seconds have passed (at least
+``--min-repeats`` times) after a warm-up call, and the min/median/mean/stdev
+of the wall time are written as JSON together with the environment. With
+``--compare`` the results are checked against a baseline file: cases whose
+median is more than ``--threshold`` slower are reported as regressions and
+the exit status is 1.
+
+Cases whose ERI tensor would exceed ``--max-basis`` basis functions are
+skipped (the dense (n, n, n, n) tensor grows as n^4).
+
+Usage as script:
+    python -m my_hf_program.benchmark --output bench.json
+    python -m my_hf_program.benchmark --quick --compare bench.json
+    python -m my_hf_program.benchmark --results new.json --compare bench.json   # compare two files
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .molecule import Molecule
+from .integrals import get_integrals, build_pyscf_mol
+from .scf import run_scf
+from .utils import compute_nuclear_repulsion
+from .visualize_trajectory_py3dmol import read_xyz_trajectory, visualize_trajectory_py3dmol
+
+# Molecule ladder (Angstrom), smallest first
+MOLECULES = {
+    'h2': [('H', [0.0, 0.0, 0.0]), ('H', [0.74, 0.0, 0.0])],
+    'water': [('O', [0.0, 0.0, 0.1173]), ('H', [0.0, 0.7572, -0.4692]), ('H', [0.0, -0.7572, -0.4692])],
+    'methane': [('C', [0.0, 0.0, 0.0]), ('H', [0.6276, 0.6276, 0.6276]), ('H', [-0.6276, -0.6276, 0.6276]),
+                ('H', [-0.6276, 0.6276, -0.6276]), ('H', [0.6276, -0.6276, -0.6276])],
+    'acetone': [('O', [0.0003, -1.3171, -0.0002]), ('C', [0.0, -0.0872, 0.0006]), ('C', [1.281, 0.7024, -0.0002]),
+                ('C', [-1.2813, 0.7019, -0.0002]), ('H', [1.3279, 1.3235, -0.898]), ('H', [1.326, 1.3282, 0.8945]),
+                ('H', [2.1351, 0.0196, 0.0027]), ('H', [-2.1352, 0.0187, 0.0027]),
+                ('H', [-1.3284, 1.323, -0.898]), ('H', [-1.3266, 1.3278, 0.8945])],
+    'benzene': [('C', [1.3915 * np.cos(k * np.pi / 3), 1.3915 * np.sin(k * np.pi / 3), 0.0]) for k in range(6)] +
+               [('H', [2.4715 * np.cos(k * np.pi / 3), 2.4715 * np.sin(k * np.pi / 3), 0.0]) for k in range(6)],
+}
+BASIS_SETS = ('sto-3g', '6-31g', 'cc-pvdz')
+QUICK_MOLECULES = ('h2', 'water', 'methane')
+QUICK_BASIS_SETS = ('sto-3g',)
+OPTIMIZE_MOLECULES = ('h2', 'water')
+TRAJECTORY_FRAMES = (10, 100, 1000)
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+API_SERVER_DIR = os.path.join(os.path.dirname(PACKAGE_DIR), 'deployment', 'api_server')
+
+
+def _quiet(func, *args, **kwargs):
+    """Call ``func`` with its progress output suppressed (PySCF writes to the original stdout, so redirect fd 1)"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    try:
+        with open(os.devnull, 'w') as devnull:
+            os.dup2(devnull.fileno(), 1)
+            with contextlib.redirect_stdout(devnull):
+                return func(*args, **kwargs)
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def time_call(func, min_time=0.2, min_repeats=3, max_repeats=1000):
+    """Wall times of repeated calls of ``func`` after one warm-up call"""
+    func()
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_repeats or (time.perf_counter() - start < min_time and len(times) < max_repeats):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def summarize(times):
+    return {
+        'repeats': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def case_name(name, params):
+    labels = ",".join(str(value) for key, value in params.items() if key != 'n_basis')
+    return f"{name}[{labels}]" if labels else name
+
+
+def _write_trajectory(path, atoms, n_frames):
+    rng = np.random.default_rng(0)
+    coords = np.array([xyz for _, xyz in atoms])
+    with open(path, 'w') as f:
+        for step in range(n_frames):
+            frame = coords + 0.01 * rng.standard_normal(coords.shape)
+            f.write(f"{len(atoms)}\nStep {step + 1}\n")
+            f.writelines(f"{symbol} {x:.6f} {y:.6f} {z:.6f}\n" for (symbol, _), (x, y, z) in zip(atoms, frame))
+
+
+def iter_cases(molecules, basis_sets, max_basis, workdir, wanted=lambda key: True):
+    """
+    Yield (name, params, callable) for every benchmark case, or (name, params, reason) to skip it
+
+    Expensive setup (integrals) is only done for cases accepted by ``wanted(key)``.
+    """
+    for name in molecules:
+        mol = Molecule(MOLECULES[name])
+        yield 'nuclear_repulsion', {'molecule': name}, lambda mol=mol: compute_nuclear_repulsion(mol)
+
+    for name in molecules:
+        for basis in basis_sets:
+            mol = Molecule(MOLECULES[name])
+            n_basis = build_pyscf_mol(mol, basis).nao
+            params = {'molecule': name, 'basis': basis, 'n_basis': n_basis}
+            if not any(wanted(case_name(case, params)) for case in ('integrals', 'scf.jk', 'scf.eigh', 'scf.full')):
+                continue
+            if n_basis > max_basis:
+                for case in ('integrals', 'scf.jk', 'scf.eigh', 'scf.full'):
+                    yield case, params, f"{n_basis} basis functions > --max-basis {max_basis}"
+                continue
+            S, T, V, ERI = get_integrals(mol, basis=basis)
+            D = np.random.default_rng(0).standard_normal((n_basis, n_basis))
+            D = 0.01 * (D + D.T)
+            F = T + V + 0.01 * D
+            yield 'integrals', params, lambda mol=mol, basis=basis: get_integrals(mol, basis=basis)
+            yield 'scf.jk', params, lambda ERI=ERI, D=D: (np.einsum('pqrs,rs->pq', ERI, D),
+                                                          np.einsum('prqs,rs->pq', ERI, D))
+            yield 'scf.eigh', params, lambda F=F: np.linalg.eigh(F)
+            yield 'scf.full', params, lambda S=S, T=T, V=V, ERI=ERI, mol=mol: _quiet(run_scf, S, T, V, ERI, mol)
+
+    trajectory_atoms = MOLECULES[molecules[-1]]
+    for n_frames in TRAJECTORY_FRAMES:
+        path = os.path.join(workdir, f"trajectory_{n_frames}.xyz")
+        _write_trajectory(path, trajectory_atoms, n_frames)
+        params = {'molecule': molecules[-1], 'frames': n_frames}
+        yield 'read_xyz_trajectory', params, lambda path=path: read_xyz_trajectory(path)
+        symbols, trajectory = read_xyz_trajectory(path)
+        html_path = os.path.join(workdir, 'trajectory.html')
+        for compact in (False, True):
+            yield 'visualize.py3dmol', dict(params, mode='compact' if compact else 'plain'), \
+                lambda s=symbols, t=trajectory, c=compact: _quiet(visualize_trajectory_py3dmol, s, t, html_path,
+                                                                  compact=c)
+
+    # Imported here: matplotlib and scipy are only needed by these cases
+    from .visualize_trajectory import render_frame, trajectory_limits
+    from .optimize_geometry import optimize_geometry
+    for name in molecules:
+        symbols = [symbol for symbol, _ in MOLECULES[name]]
+        coords = np.array([xyz for _, xyz in MOLECULES[name]])
+        limits = trajectory_limits([coords])
+        yield 'visualize.frame', {'molecule': name}, \
+            lambda s=symbols, c=coords, lim=limits: render_frame(s, c, 0, lim)
+
+    for name in molecules:
+        if name not in OPTIMIZE_MOLECULES:
+            continue
+        path = os.path.join(workdir, f"{name}.xyz")
+        _write_trajectory(path, MOLECULES[name], 1)
+        for basis in basis_sets[:1]:
+            yield 'optimize_geometry', {'molecule': name, 'basis': basis}, \
+                lambda path=path, basis=basis: _quiet(optimize_geometry, path, basis=basis, symmetry=False,
+                                                      output_dir=None)
+
+    yield from startup_cases(workdir)
+
+
+def startup_cases(workdir):
+    """Cases timing fresh interpreters, i.e. the import cost every CLI run and job process pays"""
+    h2_path = os.path.join(workdir, 'h2.xyz')
+    _write_trajectory(h2_path, MOLECULES['h2'], 1)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([PACKAGE_DIR, os.path.dirname(PACKAGE_DIR)]),
+               QC_MAX_WORKERS='0', QC_DATA_DIR=os.path.join(workdir, 'api_data'))
+    commands = {
+        'python': ['-c', 'pass'],
+        'import_main': ['-c', 'import main'],
+        'import_optimize_geometry': ['-c', 'import my_hf_program.optimize_geometry'],
+        'import_api': ['-c', f'import sys; sys.path.insert(0, {API_SERVER_DIR!r}); import api'],
+        'main_h2': [os.path.join(PACKAGE_DIR, 'main.py'), h2_path, '--no-plot'],
+    }
+    for label, args in commands.items():
+        yield 'startup', {'command': label}, \
+            lambda args=args: subprocess.run([sys.executable] + args, cwd=workdir, env=env, check=True,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def environment():
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        import pyscf
+        info['pyscf'] = pyscf.__version__
+    except ImportError:
+        pass
+    try:
+        info['git_commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        pass
+    return info
+
+
+def run_benchmarks(quick=False, name_filter=None, min_time=0.2, min_repeats=3, max_basis=60):
+    """
+    Run the suite and return its results as a JSON-serialisable dict
+
+    Parameters:
+    -----------
+    quick : bool
+        Small molecules and the minimal basis only
+    name_filter : str, optional
+        Only run cases whose name contains this string
+    """
+    molecules = QUICK_MOLECULES if quick else tuple(MOLECULES)
+    basis_sets = QUICK_BASIS_SETS if quick else BASIS_SETS
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        wanted = (lambda key: name_filter in key) if name_filter else (lambda key: True)
+        for name, params, func in iter_cases(molecules, basis_sets, max_basis, workdir, wanted):
+            key = case_name(name, params)
+            if not wanted(key):
+                continue
+            entry = {'name': name, 'key': key, 'params': params}
+            if isinstance(func, str):
+                entry['skipped'] = func
+                print(f"{key:<50} skipped: {func}")
+            else:
+                entry.update(summarize(time_call(func, min_time, min_repeats)))
+                print(f"{key:<50} median {entry['median'] * 1e3:10.3f} ms  (n={entry['repeats']})")
+            results.append(entry)
+    return {'environment': environment(), 'results': results}
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare two result sets by median time
+
+    Returns:
+    --------
+    list of dict
+        One row per case with ``status`` 'regression', 'improvement', 'ok',
+        'new', 'missing' or 'skipped', and the ``ratio`` current/baseline
+    """
+    base = {entry['key']: entry for entry in baseline['results']}
+    rows = []
+    for entry in current['results']:
+        old = base.pop(entry['key'], None)
+        row = {'key': entry['key'], 'baseline': old and old.get('median'), 'current': entry.get('median')}
+        if 'skipped' in entry or (old is not None and 'skipped' in old):
+            row['status'] = 'skipped'
+        elif old is None:
+            row['status'] = 'new'
+        else:
+            row['ratio'] = entry['median'] / old['median']
+            row['status'] = ('regression' if row['ratio'] > 1 + threshold else
+                             'improvement' if row['ratio'] < 1 / (1 + threshold) else 'ok')
+        rows.append(row)
+    rows.extend({'key': key, 'baseline': old.get('median'), 'current': None, 'status': 'missing'}
+                for key, old in base.items())
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        if 'ratio' in row:
+            print(f"{row['key']:<50} {row['baseline'] * 1e3:10.3f} -> {row['current'] * 1e3:10.3f} ms "
+                  f"x{row['ratio']:.2f}  {row['status'].upper() if row['status'] == 'regression' else row['status']}")
+        else:
+            print(f"{row['key']:<50} {row['status']}")
+    regressions = sum(row['status'] == 'regression' for row in rows)
+    print(f"{regressions} regression(s), {sum(row['status'] == 'improvement' for row in rows)} improvement(s) "
+          f"in {len(rows)} case(s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the quantum chemistry code")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--results', help="use results from this JSON file instead of running the suite")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare against a baseline JSON file")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative slowdown of the median flagged as a regression (default 0.10)")
+    parser.add_argument('--quick', action='store_true', help="small molecules and STO-3G only")
+    parser.add_argument('--filter', help="only run cases whose name contains this string")
+    parser.add_argument('--min-time', type=float, default=0.2, help="minimum seconds spent timing each case")
+    parser.add_argument('--min-repeats', type=int, default=3)
+    parser.add_argument('--max-basis', type=int, default=60, help="skip ERI-based cases above this many basis functions")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        current = run_benchmarks(args.quick, args.filter, args.min_time, args.min_repeats, args.max_basis)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Benchmark results saved as {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if print_comparison(compare(baseline, current, args.threshold)):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import numpy as np
+
+try:
+    from .integrals import get_integrals, get_derivative_integrals
+    from .scf import run_scf, SCFConvergenceError
+    from .utils import compute_nuclear_repulsion, compute_nuclear_repulsion_gradient
+    from .instrumentation import timed
+except ImportError:  # run as a script from this directory
+    from integrals import get_integrals, get_derivative_integrals
+    from scf import run_scf, SCFConvergenceError
+    from utils import compute_nuclear_repulsion, compute_nuclear_repulsion_gradient
+    from instrumentation import timed
+
+
+def rhf_electronic_gradient(deriv, C, eps, D, n_occ):
+    # D is the half density C_occ C_occ^T used by run_scf; P is the total density
+    P = 2 * D
+    C_occ = C[:, :n_occ]
+    W = 2 * (C_occ * eps[:n_occ]) @ C_occ.T  # energy-weighted density
+
+    # Bra-differentiated integrals carry the opposite sign of the nuclear derivative
+    dS = -deriv['ipovlp']
+    dH = -(deriv['ipkin'] + deriv['ipnuc'])
+    J = np.einsum('xijkl,lk->xij', deriv['ip1'], P)
+    K = np.einsum('xijkl,jk->xil', deriv['ip1'], P)
+    dG = -(J - 0.5 * K)
+
+    n_atoms = len(deriv['charges'])
+    grad = np.zeros((n_atoms, 3))
+    for a in range(n_atoms):
+        p0, p1 = deriv['ao_slices'][a]
+        # Hellmann-Feynman term: derivative of the nuclear attraction operator of atom a
+        h1 = -deriv['charges'][a] * deriv['iprinv'][a]
+        h1[:, p0:p1] += dH[:, p0:p1]
+        h1 = h1 + h1.transpose(0, 2, 1)
+        grad[a] += np.einsum('xij,ij->x', h1, P)
+        grad[a] += 2 * np.einsum('xij,ij->x', dG[:, p0:p1], P[p0:p1])
+        grad[a] -= 2 * np.einsum('xij,ij->x', dS[:, p0:p1], W[p0:p1])
+    return grad
+
+
+@timed('gradient')
+def compute_rhf_gradient(mol, basis, C, eps, D, converged):
+    # Total RHF nuclear gradient (Hartree/Bohr) from a converged run_scf solution;
+    # the gradient formula only holds at convergence, so an unconverged one is refused
+    if not converged:
+        raise SCFConvergenceError('SCF did not converge: the analytic gradient would be meaningless.')
+    deriv = get_derivative_integrals(mol, basis=basis)
+    grad = rhf_electronic_gradient(deriv, C, eps, D, mol.n_electrons // 2)
+    return grad + compute_nuclear_repulsion_gradient(mol)
+
+
+def energy_and_gradient(mol, basis='sto-3g', integrals=None, D0=None, convergence=1e-6):
+    # One in-house SCF producing both the total energy and its nuclear gradient (used by
+    # optimize_geometry with engine='inhouse'). D0 starts the SCF from the density of a nearby
+    # geometry; returns (energy, gradient, converged density, SCF iterations).
+    if integrals is None:
+        integrals = get_integrals(mol, basis=basis)
+    S, T, V, ERI = integrals
+    E_elec, energies, (C, eps, D), converged = run_scf(S, T, V, ERI, mol, return_energies=True,
+                                                      return_orbitals=True, return_converged=True, D0=D0,
+                                                      convergence=convergence)
+    E_total = E_elec + compute_nuclear_repulsion(mol)
+    return E_total, compute_rhf_gradient(mol, basis, C, eps, D, converged), D, len(energies)
@@ -0,0 +1,216 @@
+"""
+Lightweight, dependency-free metrics for the quantum chemistry code
+
+The computational modules record what they do here, without knowing who
+reads it:
+
+- ``timed(stage)`` times a block or function into the
+  ``qc_stage_duration_seconds`` histogram (stages: integrals, scf, gradient,
+  optimize_geometry, file_io, visualization, ...),
+- ``SCF_ITERATIONS`` counts SCF cycles per solve,
+- ``CACHE_REQUESTS`` counts result-cache hits and misses.
+
+While tracing is enabled (see ``tracing``), every ``timed`` block is also
+recorded as a span of the trace.
+
+Counters and histograms are kept as additive samples, so samples recorded in
+other processes (e.g. job processes) can be drained with ``REGISTRY.drain()``
+and merged elsewhere with ``REGISTRY.merge()``. ``REGISTRY.render()`` writes
+the Prometheus text exposition format.
+
+Usage as module:
+    from instrumentation import timed, REGISTRY
+
+    with timed('integrals'):
+        ...
+    print(REGISTRY.render())
+"""
+import math
+import threading
+import time
+from contextlib import ContextDecorator
+
+try:
+    from .tracing import TRACER
+except ImportError:  # run as a script from this directory
+    from tracing import TRACER
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   300.0, 900.0, 3600.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """A metric family; samples live in the registry so they can be drained and merged"""
+    kind = "untyped"
+
+    def __init__(self, registry, name, documentation):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+
+    def sample_names(self):
+        return (self.name,)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        self.registry._add(self.name, _label_key(labels), amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.registry._lock:
+            # Every bound gets a sample, so a label set's first observation creates its full bucket vector
+            for bound in self.buckets:
+                self.registry._add_locked(f"{self.name}_bucket", key + (("le", _format_value(bound)),),
+                                          int(value <= bound))
+            self.registry._add_locked(f"{self.name}_sum", key, value)
+            self.registry._add_locked(f"{self.name}_count", key, 1)
+
+    def sample_names(self):
+        return (f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count")
+
+    def bucket_rows(self, by_name):
+        """Cumulative bucket samples of every label set, with zeros for bounds missing from ``by_name``"""
+        counts = dict(by_name.get(f"{self.name}_bucket", []))
+        rows = []
+        for key, _ in sorted(by_name.get(f"{self.name}_count", [])):
+            for bound in self.buckets:
+                le = _label_key(dict(key, le=_format_value(bound)))
+                rows.append((f"{self.name}_bucket", le, counts.get(le, 0.0)))
+        return rows
+
+
+class Gauge(Metric):
+    """Point-in-time value supplied by a callback at render time; never drained or merged"""
+    kind = "gauge"
+
+    def __init__(self, registry, name, documentation, callback):
+        super().__init__(registry, name, documentation)
+        self.callback = callback
+
+
+class Registry:
+    """Collection of metric families and their additive samples"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation):
+        return self._register(Counter(self, name, documentation))
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, buckets))
+
+    def gauge(self, name, documentation, callback):
+        """Register a gauge; ``callback()`` returns a list of (labels dict, value)"""
+        metric = Gauge(self, name, documentation, callback)
+        self._metrics[name] = metric
+        return metric
+
+    def _add(self, sample, key, amount):
+        with self._lock:
+            self._add_locked(sample, key, amount)
+
+    def _add_locked(self, sample, key, amount):
+        self._samples[(sample, key)] = self._samples.get((sample, key), 0.0) + amount
+
+    def samples(self):
+        """Additive samples as a list of (sample name, labels dict, value)"""
+        with self._lock:
+            return [(sample, dict(key), value) for (sample, key), value in self._samples.items()]
+
+    def drain(self):
+        """Return the additive samples and reset them, e.g. before handing them to another process"""
+        with self._lock:
+            samples = [(sample, dict(key), value) for (sample, key), value in self._samples.items()]
+            self._samples.clear()
+        return samples
+
+    def merge(self, samples):
+        with self._lock:
+            for sample, labels, value in samples:
+                self._add_locked(sample, _label_key(labels), value)
+
+    def render(self, extra_samples=()):
+        """Prometheus text format of all metrics, adding ``extra_samples`` from other processes"""
+        combined = {}
+        for sample, labels, value in list(self.samples()) + list(extra_samples):
+            key = (sample, _label_key(labels))
+            combined[key] = combined.get(key, 0.0) + value
+        by_name = {}
+        for (sample, key), value in combined.items():
+            by_name.setdefault(sample, []).append((key, value))
+
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if isinstance(metric, Gauge):
+                rows = [(metric.name, _label_key(labels), value) for labels, value in metric.callback()]
+            elif isinstance(metric, Histogram):
+                rows = metric.bucket_rows(by_name) + [
+                    (sample, key, value) for sample in metric.sample_names()[1:]
+                    for key, value in sorted(by_name.get(sample, []))]
+            else:
+                rows = [(sample, key, value) for sample in metric.sample_names()
+                        for key, value in sorted(by_name.get(sample, []))]
+            for sample, key, value in rows:
+                label_text = ",".join(f'{k}="{v}"' for k, v in key)
+                lines.append(f"{sample}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{sample} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "qc_stage_duration_seconds", "Wall time spent per computational stage")
+SCF_ITERATIONS = REGISTRY.histogram(
+    "qc_scf_iterations", "SCF iterations per solve",
+    buckets=(1, 2, 3, 5, 8, 10, 15, 20, 30, 50, 100))
+CACHE_REQUESTS = REGISTRY.counter(
+    "qc_cache_requests_total", "Cache lookups by cache and result (hit or miss)")
+
+
+class timed(ContextDecorator):
+    """Record the wall time of a block or function call as ``stage`` in qc_stage_duration_seconds"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._starts = threading.local()
+
+    def __enter__(self):
+        span = TRACER.span(self.stage).__enter__()
+        self._starts.__dict__.setdefault("stack", []).append((time.perf_counter(), span))
+        return self
+
+    def __exit__(self, *exc):
+        start, span = self._starts.stack.pop()
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=self.stage)
+        span.__exit__(*exc)
+        return False
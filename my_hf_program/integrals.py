@@ -1,25 +1,31 @@
+from functools import lru_cache
+
 import numpy as np
 
 try:
-    from pyscf import gto, scf as pyscf_scf
+    from .instrumentation import timed
+    from .tracing import span, traced
+except ImportError:  # run as a script from this directory
+    from instrumentation import timed
+    from tracing import span, traced
+
+try:
+    from pyscf import gto, scf as pyscf_scf, lib, ao2mo, df
+    from pyscf.scf import _vhf
     HAS_PYSCF = True
 except ImportError:
     HAS_PYSCF = False
 
-def get_integrals(mol, basis='sto-3g'):
-    if not HAS_PYSCF:
-        # Fallback: H2 minimal basis mock
-        S = np.array([[1.0, 0.2], [0.2, 1.0]])
-        T = np.array([[1.0, 0.0], [0.0, 1.0]])
-        V = np.array([[-1.0, -0.2], [-0.2, -1.0]])
-        ERI = np.zeros((2, 2, 2, 2))
-        ERI[0, 0, 0, 0] = 0.7
-        ERI[0, 0, 1, 1] = 0.6
-        ERI[1, 1, 0, 0] = 0.6
-        ERI[1, 1, 1, 1] = 0.7
-        print('PySCF not installed: using mock integrals for H2.')
-        return S, T, V, ERI
+# Rows streamed per block by the out-of-core and density-fitting J/K builds
+BLOCK_BYTES = 64 * 1024 * 1024
 
+@lru_cache(maxsize=512)
+def basis_template(symbol, basis):
+    # Parsed basis functions of one element, shared by every molecule built in this process
+    return gto.basis.load(basis, symbol)
+
+@traced('integrals.mole_build')
+def build_pyscf_mol(mol, basis='sto-3g', symmetry=False):
     # Build PySCF molecule from mol object
     atom_str = ''
     for symbol, coords in mol.atoms:
@@ -29,12 +35,166 @@ def get_integrals(mol, basis='sto-3g'):
     pyscf_mol.atom = atom_str
     pyscf_mol.charge = mol.charge
     pyscf_mol.spin = (mol.n_electrons % 2)  # 0 for closed shell, 1 for open shell
+    if isinstance(basis, str):
+        basis = {symbol: basis_template(symbol, basis) for symbol in {symbol for symbol, _ in mol.atoms}}
     pyscf_mol.basis = basis
+    pyscf_mol.symmetry = symmetry
     pyscf_mol.build()
+    return pyscf_mol
+
+class PackedERI:
+    """8-fold symmetric packed ERIs held in core, contracted by PySCF"""
+
+    def __init__(self, pyscf_mol):
+        self.eri = pyscf_mol.intor('int2e', aosym='s8')
+        self.nbytes = self.eri.nbytes
+
+    def get_jk(self, D):
+        return _vhf.incore(self.eri, D, hermi=1)
+
+
+class OutcoreERI:
+    """4-fold packed ERIs in a temporary HDF5 file, streamed in row blocks for each J/K build"""
+
+    def __init__(self, pyscf_mol, max_memory_mb=256):
+        self.nbf = pyscf_mol.nao_nr()
+        self._file = lib.H5TmpFile()  # deleted when closed or garbage collected
+        ao2mo.outcore.full(pyscf_mol, np.eye(self.nbf), self._file, dataname='eri',
+                           max_memory=max_memory_mb, verbose=0)
+        self.eri = self._file['eri']
+        self.nbytes = 0
+        self.rows, self.cols = np.tril_indices(self.nbf)
+
+    def get_jk(self, D):
+        n = self.nbf
+        J = np.zeros((n, n))
+        K = np.zeros((n, n))
+        step = max(1, BLOCK_BYTES // (n * n * 8))
+        for start in range(0, len(self.rows), step):
+            # Rows are pairs i >= j; each holds (ij|kl) for all k >= l
+            X = lib.unpack_tril(self.eri[start:start + step])
+            i, j = self.rows[start:start + step], self.cols[start:start + step]
+            J[i, j] = J[j, i] = np.einsum('bkl,kl->b', X, D)
+            np.add.at(K, i, np.einsum('bkl,bl->bk', X, D[j]))
+            off = i != j
+            np.add.at(K, j[off], np.einsum('bkl,bl->bk', X[off], D[i[off]]))
+        return J, K
+
+    def close(self):
+        self._file.close()
+
+
+class DirectJK:
+    """Integral-direct J/K: the ERIs are recomputed (with screening) for every build"""
 
-    S = pyscf_mol.intor('int1e_ovlp')
-    T = pyscf_mol.intor('int1e_kin')
-    V = pyscf_mol.intor('int1e_nuc')
-    ERI = pyscf_mol.intor('int2e')
+    def __init__(self, pyscf_mol):
+        self.mol = pyscf_mol
+        self.nbytes = 0
+
+    def get_jk(self, D):
+        return pyscf_scf.hf.get_jk(self.mol, D, hermi=1)
+
+
+class DensityFittedJK:
+    """Density-fitted J/K from Cholesky vectors of the ERIs in an auxiliary basis"""
+
+    def __init__(self, pyscf_mol, auxbasis=None):
+        self.nbf = pyscf_mol.nao_nr()
+        # PySCF's default fitting basis for the orbital basis (e.g. cc-pvdz-jkfit)
+        self.cderi = df.incore.cholesky_eri(pyscf_mol, auxbasis=auxbasis or df.make_auxbasis(pyscf_mol))
+        self.nbytes = self.cderi.nbytes
+
+    def get_jk(self, D):
+        n = self.nbf
+        J = np.zeros((n, n))
+        K = np.zeros((n, n))
+        step = max(1, BLOCK_BYTES // (n * n * 8))
+        for start in range(0, self.cderi.shape[0], step):
+            L = lib.unpack_tril(self.cderi[start:start + step])
+            J += np.einsum('L,Lpq->pq', np.einsum('Lrs,rs->L', L, D), L)
+            K += np.einsum('Lps,Lqs->pq', L @ D, L)
+        return J, K
+
+
+# Representations of the ERIs by strategy (see memory_planner); 'incore' is the full array
+ERI_STRATEGIES = {
+    'packed': PackedERI,
+    'outcore': OutcoreERI,
+    'direct': DirectJK,
+    'density_fit': DensityFittedJK,
+}
+
+
+@timed('integrals')
+def get_integrals(mol, basis='sto-3g', symmetry=False, strategy='incore', pyscf_mol=None):
+    """Overlap, kinetic, nuclear attraction and two-electron integrals of ``mol``.
+
+    With the default ``strategy='incore'`` the ERIs are the full
+    (nbf, nbf, nbf, nbf) array; any other strategy from ``ERI_STRATEGIES``
+    returns an object whose ``get_jk(D)`` builds the Coulomb and exchange
+    matrices instead, which ``scf.run_scf`` accepts in place of the array.
+    ``pyscf_mol``, if already built by ``build_pyscf_mol(mol, basis)``, is
+    reused unless symmetry needs a symmetry-adapted molecule.
+    """
+    if not HAS_PYSCF:
+        # Fallback: H2 minimal basis mock
+        S = np.array([[1.0, 0.2], [0.2, 1.0]])
+        T = np.array([[1.0, 0.0], [0.0, 1.0]])
+        V = np.array([[-1.0, -0.2], [-0.2, -1.0]])
+        ERI = np.zeros((2, 2, 2, 2))
+        ERI[0, 0, 0, 0] = 0.7
+        ERI[0, 0, 1, 1] = 0.6
+        ERI[1, 1, 0, 0] = 0.6
+        ERI[1, 1, 1, 1] = 0.7
+        print('PySCF not installed: using mock integrals for H2.')
+        return S, T, V, ERI
+
+    if symmetry and mol.symmetrize() != 'C1':
+        # Integrals and symmetry-adapted orbitals are both in the input frame
+        pyscf_mol = build_pyscf_mol(mol, basis, symmetry=mol.point_group)
+        mol.point_group = pyscf_mol.groupname
+        mol.symm_orb = pyscf_mol.symm_orb
+    elif pyscf_mol is None:
+        pyscf_mol = build_pyscf_mol(mol, basis)
+    with span('integrals.int1e', nbf=pyscf_mol.nao_nr()) as s:
+        S = pyscf_mol.intor('int1e_ovlp')
+        T = pyscf_mol.intor('int1e_kin')
+        V = pyscf_mol.intor('int1e_nuc')
+        s.add_arrays('result', (S, T, V))
+    with span('integrals.int2e', nbf=pyscf_mol.nao_nr(), strategy=strategy) as s:
+        if strategy == 'incore':
+            ERI = pyscf_mol.intor('int2e')
+            s.add_arrays('result', ERI)
+        elif strategy in ERI_STRATEGIES:
+            ERI = ERI_STRATEGIES[strategy](pyscf_mol)
+            s.set(result_bytes=ERI.nbytes)
+        else:
+            raise ValueError(f"Unknown integral strategy '{strategy}'")
     # ERI is (nbf, nbf, nbf, nbf)
     return S, T, V, ERI
+
+@timed('derivative_integrals')
+def get_derivative_integrals(mol, basis='sto-3g'):
+    """Nuclear-derivative integrals for analytic gradients.
+
+    Returns a dict with the bra-differentiated one-electron integrals
+    ``ipovlp``, ``ipkin``, ``ipnuc`` (3, nbf, nbf), the two-electron
+    ``ip1`` integrals (3, nbf, nbf, nbf, nbf), the per-atom ``iprinv``
+    operator derivatives, nuclear ``charges`` and the AO range of each atom.
+    """
+    if not HAS_PYSCF:
+        raise RuntimeError('PySCF is required for derivative integrals.')
+    pyscf_mol = build_pyscf_mol(mol, basis)
+    iprinv = []
+    for ia in range(pyscf_mol.natm):
+        with pyscf_mol.with_rinv_at_nucleus(ia):
+            iprinv.append(pyscf_mol.intor('int1e_iprinv', comp=3))
+    return {
+        'ipovlp': pyscf_mol.intor('int1e_ipovlp', comp=3),
+        'ipkin': pyscf_mol.intor('int1e_ipkin', comp=3),
+        'ipnuc': pyscf_mol.intor('int1e_ipnuc', comp=3),
+        'ip1': pyscf_mol.intor('int2e_ip1', comp=3),
+        'iprinv': iprinv,
+        'charges': pyscf_mol.atom_charges(),
+        'ao_slices': [tuple(s[2:]) for s in pyscf_mol.aoslice_by_atom()],
+    }
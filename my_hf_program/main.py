@@ -1,37 +1,113 @@
 from molecule import load_molecule
-from integrals import get_integrals
+from integrals import get_integrals, build_pyscf_mol, HAS_PYSCF
 from scf import run_scf
 from utils import compute_nuclear_repulsion
+from tracing import enable_tracing, trace_flag, TRACER
+from memory_planner import STRATEGIES, MemoryBudgetError, basis_dimensions, plan, format_estimate
 
-try:
-    from plot_scf import plot_scf_convergence
-    HAS_PLOT = True
-except ImportError:
-    HAS_PLOT = False
-
+import importlib.util
 import sys
 
+# Plotting (and with it matplotlib) is only imported once a plot is actually drawn
+HAS_PLOT = importlib.util.find_spec('matplotlib') is not None
+
+def option(name, default=None):
+    # Value of a --name=value flag
+    for arg in sys.argv[1:]:
+        if arg.startswith(f'--{name}='):
+            return arg.split('=', 1)[1]
+    return default
+
 def main():
-    # Usage: python main.py [xyz_file] [charge] [basis]
+    # Usage: python main.py [xyz_file] [charge] [basis] [--gradient] [--symmetry] [--trace[=trace.json]]
+    #                       [--strategy=incore|packed|outcore|direct|density_fit] [--memory-budget=MB] [--no-plot]
+    #        python main.py --batch xyz_file... [--charge=0] [--basis=sto-3g] [--output=results.jsonl] [--resume]
+    #                       [--workers=N] [--symmetry] [--strategy=...] [--memory-budget=MB]
+    want_gradient = '--gradient' in sys.argv
+    want_plot = '--no-plot' not in sys.argv
+    use_symmetry = '--symmetry' in sys.argv
+    trace_path = trace_flag(sys.argv[1:])
+    if trace_path:
+        enable_tracing(trace_path)
+    strategy = option('strategy')
+    budget_mb = option('memory-budget')
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if '--batch' in sys.argv:
+        # Many molecules in one process, one JSON record each (see batch.py)
+        from batch import run_batch
+        workers = option('workers')
+        if not args:
+            print("Error: --batch needs at least one XYZ file")
+            sys.exit(1)
+        try:
+            counts = run_batch(args, output=option('output'), resume='--resume' in sys.argv,
+                               charge=int(option('charge', 0)), basis=option('basis', 'sto-3g'), strategy=strategy,
+                               symmetry=use_symmetry, budget_mb=float(budget_mb) if budget_mb else None,
+                               max_workers=int(workers) if workers else None)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
+        # Records may be going to stdout, so the summary goes to stderr
+        print(f"{counts['molecules']} molecules: {counts['computed']} computed, {counts['repeated']} repeated, "
+              f"{counts['skipped']} already done, {counts['failed']} failed in {counts['seconds']:.1f} s",
+              file=sys.stderr)
+        return
     xyz_file = 'h2.xyz'
     charge = 0
     basis = 'sto-3g'
-    if len(sys.argv) > 1:
-        xyz_file = sys.argv[1]
-    if len(sys.argv) > 2:
-        charge = int(sys.argv[2])
-    if len(sys.argv) > 3:
-        basis = sys.argv[3]
+    if len(args) > 0:
+        xyz_file = args[0]
+    if len(args) > 1:
+        charge = int(args[1])
+    if len(args) > 2:
+        basis = args[2]
     mol = load_molecule(xyz_file, charge=charge)
-    S, T, V, ERI = get_integrals(mol, basis=basis)
-    E_elec, energies = run_scf(S, T, V, ERI, mol, return_energies=True)
+    pyscf_mol = None
+    if HAS_PYSCF:
+        # Pick the fastest integral strategy that fits the memory budget before allocating anything
+        strategies = (strategy,) if strategy else STRATEGIES
+        pyscf_mol = build_pyscf_mol(mol, basis)
+        nbf, naux = basis_dimensions(pyscf_mol, strategies=strategies)
+        try:
+            choice = plan(nbf, naux, budget_mb=float(budget_mb) if budget_mb else None,
+                          strategies=strategies, gradient=want_gradient)
+        except MemoryBudgetError as e:
+            print(f"Error: {str(e)}")
+            for estimate in e.estimates:
+                print(f"  {format_estimate(estimate)}")
+            sys.exit(1)
+        strategy = choice['strategy']
+        print(f"Integral strategy for {nbf} basis functions: {format_estimate(choice)}")
+    S, T, V, ERI = get_integrals(mol, basis=basis, symmetry=use_symmetry, strategy=strategy or 'incore',
+                                 pyscf_mol=pyscf_mol)
+    if mol.point_group:
+        print(f"Point group: {mol.point_group}")
+    E_elec, energies, (C, eps, D), converged = run_scf(S, T, V, ERI, mol, return_energies=True,
+                                                      return_orbitals=True, return_converged=True)
     E_nuc = compute_nuclear_repulsion(mol)
     print(f"Nuclear Repulsion Energy: {E_nuc:.6f} a.u.")
     print(f"Total Hartree-Fock Energy: {E_elec + E_nuc:.6f} a.u.")
-    if HAS_PLOT:
+    if not converged:
+        print(f"WARNING: the SCF did not converge in {len(energies)} iterations; "
+              "the energy above is not a Hartree-Fock energy.")
+    if want_gradient and not converged:
+        print("Error: no gradient computed, because the SCF did not converge.")
+    elif want_gradient:
+        from gradients import compute_rhf_gradient
+        grad = compute_rhf_gradient(mol, basis, C, eps, D, converged)
+        print("Nuclear Gradient (Hartree/Bohr):")
+        for (symbol, _), g in zip(mol.atoms, grad):
+            print(f"{symbol} {g[0]:.6f} {g[1]:.6f} {g[2]:.6f}")
+    if want_plot and HAS_PLOT:
+        from plot_scf import plot_scf_convergence
         plot_scf_convergence(energies)
-    else:
+    elif want_plot:
         print("matplotlib not installed: skipping SCF convergence plot.")
+    if trace_path:
+        TRACER.print_summary()
+        print(f"Trace written to {TRACER.write()}")
+    if want_gradient and not converged:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
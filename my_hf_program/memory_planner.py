@@ -0,0 +1,213 @@
+"""
+Memory and runtime planning for the SCF integral strategy
+
+The full two-electron integral tensor takes nbf^4 doubles (a 300-function
+molecule needs 65 GB), so the strategy is picked per molecule and basis
+before anything is allocated:
+
+- ``incore``: full (nbf, nbf, nbf, nbf) array, contracted with einsum,
+- ``packed``: 8-fold symmetric packed integrals in core (about nbf^4/8),
+- ``outcore``: 4-fold packed integrals in a temporary HDF5 file, streamed
+  in blocks every iteration,
+- ``direct``: integrals recomputed every iteration, nothing stored,
+- ``density_fit``: three-index Cholesky vectors (naux x nbf^2/2);
+  approximate (errors of order 1e-4 Hartree), so only chosen when allowed.
+
+``plan()`` estimates memory and runtime of every strategy and picks the
+fastest one within the memory budget, or raises ``MemoryBudgetError`` with
+the estimates. The runtime model is calibrated on one core and is meant for
+ranking strategies and rejecting hopeless jobs, not for precise predictions.
+
+Configuration (environment):
+- ``QC_MEMORY_BUDGET_MB``: memory budget for integrals and SCF arrays (default 2048)
+- ``QC_ALLOW_DENSITY_FITTING``: let the planner choose density fitting (default 0)
+
+Usage as module:
+    from memory_planner import basis_dimensions, plan, format_estimate
+
+    nbf, naux = basis_dimensions(pyscf_mol)
+    choice = plan(nbf, naux, budget_mb=1024)
+    print(format_estimate(choice))
+"""
+import os
+
+STRATEGIES = ('incore', 'packed', 'outcore', 'direct', 'density_fit')
+# Strategies available through PySCF's own RHF (API energies and geometry optimizations)
+PYSCF_STRATEGIES = ('packed', 'direct', 'density_fit')
+APPROXIMATE_STRATEGIES = ('density_fit',)
+
+MEMORY_BUDGET_MB = float(os.environ.get('QC_MEMORY_BUDGET_MB', 2048))
+ALLOW_DENSITY_FITTING = os.environ.get('QC_ALLOW_DENSITY_FITTING', '0') not in ('', '0')
+
+# Streaming block size of the out-of-core and density-fitting J/K builds
+BLOCK_MB = 64
+
+# Cost model (seconds per unit, one core)
+INTEGRAL_SECONDS = 2.5e-7       # per unique (8-fold symmetric) two-electron integral
+FULL_TENSOR_FACTOR = 6.0        # unpacked int2e relative to packed
+OUTCORE_FACTOR = 5.0            # integrals written through ao2mo.outcore relative to packed
+EINSUM_JK_SECONDS = 2e-9        # per nbf^4 and iteration, full tensor
+PACKED_JK_SECONDS = 6.5e-9      # per unique integral and iteration
+DISK_BYTES_PER_SECOND = 5e8
+DF_BUILD_SECONDS = 5e-8         # per naux * nbf^2
+DF_JK_SECONDS = 5e-10           # per naux * nbf^3 and iteration
+DERIVATIVE_FACTOR = 3.0         # derivative integrals relative to integrals
+
+MB = 1024 * 1024
+
+
+class MemoryBudgetError(RuntimeError):
+    """No strategy fits the memory (or time) budget; ``estimates`` holds what each would need"""
+
+    def __init__(self, message, estimates):
+        super().__init__(message)
+        self.estimates = estimates
+
+
+def basis_dimensions(pyscf_mol, auxbasis=None, strategies=STRATEGIES, allow_approximate=None):
+    """
+    Number of basis functions and of density-fitting auxiliary functions of a built PySCF molecule
+
+    The auxiliary basis is only built if ``plan`` could choose density fitting
+    among ``strategies``; otherwise ``naux`` is None (``plan`` assumes 4 * nbf).
+    """
+    nbf = pyscf_mol.nao_nr()
+    if 'density_fit' not in candidate_strategies(strategies, allow_approximate):
+        return nbf, None
+    from pyscf.df import addons
+    try:
+        naux = addons.make_auxmol(pyscf_mol, auxbasis).nao_nr()
+    except (KeyError, RuntimeError, NotImplementedError):
+        naux = 4 * nbf  # typical size of a fitting basis
+    return nbf, naux
+
+
+def candidate_strategies(strategies=STRATEGIES, allow_approximate=None):
+    """Strategies ``plan`` may choose from: approximate ones only if allowed or explicitly the only ones asked for"""
+    allow_approximate = ALLOW_DENSITY_FITTING if allow_approximate is None else allow_approximate
+    candidates = [strategy for strategy in strategies
+                  if allow_approximate or strategy not in APPROXIMATE_STRATEGIES]
+    return candidates or list(strategies)
+
+
+def estimate(nbf, naux=None, n_iter=20, gradient=False, strategies=STRATEGIES):
+    """
+    Memory (MB), scratch disk (MB) and runtime (s) of an RHF energy per strategy
+
+    Parameters:
+    -----------
+    nbf : int
+        Number of basis functions
+    naux : int, optional
+        Number of auxiliary functions for density fitting (default 4 * nbf)
+    n_iter : int
+        Expected number of SCF iterations
+    gradient : bool
+        Include the in-core derivative integrals of ``gradients.compute_rhf_gradient``
+    strategies : sequence of str
+        Strategies to estimate
+
+    Returns:
+    --------
+    list of dict
+        One dict per strategy with ``strategy``, ``memory_mb``, ``disk_mb``, ``seconds`` and ``exact``
+    """
+    n = float(nbf)
+    naux = float(naux if naux is not None else 4 * nbf)
+    npair = n * (n + 1) / 2
+    unique = npair * (npair + 1) / 2
+    matrices = 16 * n * n * 8  # S, T, V, H, D, J, K, F, C, ...
+    block = min(BLOCK_MB * MB, npair * npair * 8)
+    integral_seconds = unique * INTEGRAL_SECONDS
+
+    models = {
+        'incore': (n ** 4 * 8, 0.0,
+                   FULL_TENSOR_FACTOR * integral_seconds + n_iter * n ** 4 * EINSUM_JK_SECONDS),
+        'packed': (unique * 8, 0.0,
+                   integral_seconds + n_iter * unique * PACKED_JK_SECONDS),
+        'outcore': (2 * block, npair * npair * 8,
+                    OUTCORE_FACTOR * integral_seconds
+                    + n_iter * (npair * npair * 8 / DISK_BYTES_PER_SECOND + 2 * unique * PACKED_JK_SECONDS)),
+        'direct': (16 * n * n * 8, 0.0,
+                   n_iter * integral_seconds),
+        'density_fit': (naux * npair * 8 + 2 * min(BLOCK_MB * MB, naux * n * n * 8), 0.0,
+                        naux * n * n * DF_BUILD_SECONDS + n_iter * naux * n ** 3 * DF_JK_SECONDS),
+    }
+    gradient_bytes = 3 * n ** 4 * 8 if gradient else 0.0
+    gradient_seconds = DERIVATIVE_FACTOR * FULL_TENSOR_FACTOR * integral_seconds if gradient else 0.0
+
+    estimates = []
+    for strategy in strategies:
+        memory, disk, seconds = models[strategy]
+        estimates.append({
+            'strategy': strategy,
+            'memory_mb': (memory + matrices + gradient_bytes) / MB,
+            'disk_mb': disk / MB,
+            'seconds': seconds + gradient_seconds,
+            'exact': strategy not in APPROXIMATE_STRATEGIES,
+        })
+    return estimates
+
+
+def plan(nbf, naux=None, budget_mb=None, max_seconds=None, strategies=STRATEGIES, allow_approximate=None,
+         n_iter=20, gradient=False):
+    """
+    Fastest strategy whose estimated memory fits ``budget_mb`` (and runtime ``max_seconds``)
+
+    Returns the chosen estimate (see ``estimate``) with all candidates under
+    ``estimates``; raises ``MemoryBudgetError`` if none fits.
+    """
+    budget_mb = MEMORY_BUDGET_MB if budget_mb is None else budget_mb
+    candidates = candidate_strategies(strategies, allow_approximate)
+    estimates = estimate(nbf, naux, n_iter, gradient, candidates)
+    fitting = [e for e in estimates
+               if e['memory_mb'] <= budget_mb and (max_seconds is None or e['seconds'] <= max_seconds)]
+    if not fitting:
+        smallest = min(estimates, key=lambda e: e['memory_mb'])
+        if smallest['memory_mb'] > budget_mb:
+            message = (f"{nbf} basis functions need at least {format_size(smallest['memory_mb'])} "
+                       f"({smallest['strategy']}), over the {format_size(budget_mb)} memory budget")
+        else:
+            fastest = min(estimates, key=lambda e: e['seconds'])
+            message = (f"{nbf} basis functions need an estimated {fastest['seconds']:.0f} s "
+                       f"({fastest['strategy']}), over the {max_seconds:.0f} s limit")
+        raise MemoryBudgetError(message, estimates)
+    choice = dict(min(fitting, key=lambda e: e['seconds']))
+    choice.update(nbf=nbf, budget_mb=budget_mb, estimates=estimates)
+    return choice
+
+
+def format_size(mb):
+    return f"{mb / 1024:.1f} GB" if mb >= 1024 else f"{mb:.1f} MB"
+
+
+def format_estimate(e):
+    text = f"{e['strategy']}: {format_size(e['memory_mb'])} memory"
+    if e['disk_mb']:
+        text += f", {format_size(e['disk_mb'])} disk"
+    return text + f", ~{e['seconds']:.2g} s"
+
+
+def make_rhf(pyscf_mol, strategy='packed', max_memory_mb=None):
+    """
+    PySCF RHF object set up for a strategy from ``PYSCF_STRATEGIES``
+
+    With ``packed``, PySCF still falls back to direct SCF if the process
+    is already too large to hold the integrals within ``max_memory_mb``.
+    With ``direct``, ``max_memory`` is capped below the size of the
+    integrals, so PySCF never builds them in core.
+    """
+    from pyscf import scf
+    if strategy not in PYSCF_STRATEGIES:
+        raise ValueError(f"Unknown PySCF strategy '{strategy}'; choose from {', '.join(PYSCF_STRATEGIES)}")
+    mf = scf.RHF(pyscf_mol)
+    if strategy == 'density_fit':
+        mf = mf.density_fit()
+    elif strategy == 'direct':
+        mf.direct_scf = True
+    if max_memory_mb is not None:
+        mf.max_memory = max_memory_mb
+    if strategy == 'direct':
+        # PySCF holds the integrals in core whenever nao**4 / 1e6 MB plus the process size fit max_memory
+        mf.max_memory = min(mf.max_memory, pyscf_mol.nao_nr() ** 4 / 1e6)
+    return mf
@@ -1,3 +1,79 @@
+import importlib.util
+import threading
+
+import numpy as np
+
+# PySCF is only imported when symmetry is detected, so loading molecules stays cheap
+HAS_PYSCF = importlib.util.find_spec('pyscf') is not None
+
+# pyscf.symm.geom reads its tolerance from a module global
+_symm_tolerance_lock = threading.Lock()
+
+def detect_point_group(symbols, coords, tol=5e-2):
+    """Largest Abelian (D2h-family) point group of a geometry, within ``tol``
+    (in the unit of ``coords``; Angstrom for ``Molecule``).
+
+    Returns None for C1 (or when PySCF is unavailable); otherwise a dict with the
+    group name, its ``origin``, and for every operation the 3x3 matrix ``ops``
+    acting on row vectors in the input frame and the atom permutation ``perms``
+    (operation i maps atom a onto atom perms[i][a]).
+    """
+    if not HAS_PYSCF or len(symbols) < 2:
+        return None
+    from pyscf.symm import geom as pyscf_geom
+    coords = np.asarray(coords, dtype=float)
+    with _symm_tolerance_lock:
+        old_tol = pyscf_geom.TOLERANCE
+        pyscf_geom.TOLERANCE = tol
+        try:
+            topgroup, origin, axes = pyscf_geom.detect_symm(list(zip(symbols, coords)))
+            group, axes = pyscf_geom.as_subgroup(topgroup, axes)
+            # Linear molecules keep their infinite group names; use the D2h-family subgroup
+            group = {'Dooh': 'D2h', 'Coov': 'C2v'}.get(group, group)
+        finally:
+            pyscf_geom.TOLERANCE = old_tol
+    if group == 'C1':
+        return None
+
+    std_ops = pyscf_geom.symm_ops(group)
+    ops, perms = [], []
+    for name in pyscf_geom.OPERATOR_TABLE[group]:
+        op = axes.T @ (np.eye(3) * std_ops[name]) @ axes
+        moved = (coords - origin) @ op + origin
+        perm = []
+        for a, x in enumerate(moved):
+            dist = np.linalg.norm(coords - x, axis=1)
+            dist[[b for b, sym in enumerate(symbols) if sym != symbols[a]]] = np.inf
+            b = int(np.argmin(dist))
+            if dist[b] > tol * 10:
+                return None
+            perm.append(b)
+        if sorted(perm) != list(range(len(symbols))):
+            return None
+        ops.append(op)
+        perms.append(perm)
+    return {'group': group, 'origin': origin, 'ops': ops, 'perms': perms}
+
+def symmetrize_coords(coords, symmetry):
+    # Average every atom over its images so the geometry is exactly symmetric
+    coords = np.asarray(coords, dtype=float)
+    origin = symmetry['origin']
+    averaged = np.zeros_like(coords)
+    for op, perm in zip(symmetry['ops'], symmetry['perms']):
+        averaged += (coords[perm] - origin) @ op  # ops are involutions
+    return averaged / len(symmetry['ops']) + origin
+
+def symmetric_displacement_basis(symmetry, n_atoms):
+    # Orthonormal basis (3N x k) of totally symmetric Cartesian displacements
+    projector = np.zeros((3 * n_atoms, 3 * n_atoms))
+    for op, perm in zip(symmetry['ops'], symmetry['perms']):
+        for a, b in enumerate(perm):
+            # displacement of atom a, transformed by op, becomes a displacement of atom b
+            projector[3 * b:3 * b + 3, 3 * a:3 * a + 3] += op.T
+    projector /= len(symmetry['ops'])
+    eigvals, eigvecs = np.linalg.eigh((projector + projector.T) / 2)
+    return eigvecs[:, eigvals > 0.5]
+
 class Molecule:
     def __init__(self, atoms, charge=0):
         self.atoms = atoms
@@ -8,6 +84,8 @@ class Molecule:
             'K': 19, 'Ca': 20, 'Sc': 21, 'Ti': 22, 'V': 23, 'Cr': 24, 'Mn': 25, 'Fe': 26, 'Co': 27, 'Ni': 28, 'Cu': 29, 'Zn': 30
         }
         self.n_electrons = sum(self.symbol_to_Z[symbol] for symbol, _ in atoms) - charge
+        self.point_group = None
+        self.symm_orb = None
 
     def get_nuclear_coords(self):
         return [coords for _, coords in self.atoms]
@@ -15,6 +93,41 @@ class Molecule:
     def get_atomic_numbers(self):
         return [self.symbol_to_Z[symbol] for symbol, _ in self.atoms]
 
+    def symmetrize(self, tol=5e-2):
+        # Snap the geometry onto its detected Abelian point group (tol in Angstrom); returns the group name
+        symbols = [symbol for symbol, _ in self.atoms]
+        symmetry = detect_point_group(symbols, self.get_nuclear_coords(), tol=tol)
+        if symmetry is None:
+            self.point_group = 'C1'
+            return self.point_group
+        coords = symmetrize_coords(self.get_nuclear_coords(), symmetry)
+        self.atoms = [(symbol, xyz.tolist()) for symbol, xyz in zip(symbols, coords)]
+        self.point_group = symmetry['group']
+        return self.point_group
+
+def read_xyz_frames(filename):
+    # Every frame of a (multi-frame) XYZ file as (comment, atoms); frames may hold different molecules
+    with open(filename, 'r') as f:
+        lines = f.read().splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+    frames = []
+    i = 0
+    while i < len(lines):
+        try:
+            n_atoms = int(lines[i])
+        except ValueError:
+            raise ValueError(f"{filename}: expected an atom count on line {i + 1}")
+        if i + 2 + n_atoms > len(lines):
+            raise ValueError(f"{filename}: truncated XYZ frame starting at line {i + 1}")
+        atoms = []
+        for line in lines[i + 2:i + 2 + n_atoms]:
+            parts = line.split()
+            atoms.append((parts[0], [float(parts[1]), float(parts[2]), float(parts[3])]))
+        frames.append((lines[i + 1].strip(), atoms))
+        i += n_atoms + 2
+    return frames
+
 def load_molecule(filename, charge=0):
     atoms = []
     with open(filename, 'r') as f:
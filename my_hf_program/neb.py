@@ -0,0 +1,272 @@
+"""
+Climbing-image nudged elastic band (CI-NEB) with PySCF RHF
+
+Finds a minimum-energy path between two optimized endpoint geometries.
+
+- The band is initialized by linear or IDPP (image-dependent pair potential)
+  interpolation after aligning the product onto the reactant.
+- Interior images are evaluated concurrently on a process pool with the same
+  RHF energy/gradient routine used by ``optimize_geometry``; each image's SCF
+  is warm-started from its density of the previous band iteration.
+- The band is relaxed with FIRE; the highest image climbs to the saddle point.
+- The converged path is written as a multi-frame XYZ trajectory that
+  ``visualize_trajectory_py3dmol`` can load.
+
+Usage as script:
+    python -m my_hf_program.neb reactant.xyz product.xyz [n_images] [output_xyz]
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .optimize_geometry import xyz_to_atomstr, build_mole, rhf_energy_and_grad, export_xyz_trajectory
+
+
+def _image_energy_and_grad(atomstr, charge, basis, coords, dm0):
+    """Worker: RHF energy, gradient and density for one image (coordinates in Bohr)"""
+    mol = build_mole(atomstr, charge, basis)
+    mol.set_geom_(coords, unit='Bohr')
+    e, g, mf = rhf_energy_and_grad(mol, dm0=dm0)
+    return e, g.reshape(coords.shape), mf.make_rdm1()
+
+
+def align_to(reference, mobile):
+    """Kabsch-align ``mobile`` onto ``reference`` (same atom order), returning new coordinates"""
+    ref_c = reference - reference.mean(axis=0)
+    mob_c = mobile - mobile.mean(axis=0)
+    u, _, vt = np.linalg.svd(mob_c.T @ ref_c)
+    d = np.sign(np.linalg.det(u @ vt))
+    rot = u @ np.diag([1.0, 1.0, d]) @ vt
+    return mob_c @ rot + reference.mean(axis=0)
+
+
+def linear_interpolation(start, end, n_images):
+    """``n_images`` geometries from ``start`` to ``end`` inclusive"""
+    return [start + t * (end - start) for t in np.linspace(0.0, 1.0, n_images)]
+
+
+def _idpp_evaluator(start, end, n_images):
+    iu = np.triu_indices(len(start), k=1)
+
+    def pair_distances(x):
+        return np.linalg.norm(x[:, None, :] - x[None, :, :], axis=-1)
+
+    d_start = pair_distances(start)
+    d_end = pair_distances(end)
+    targets = [d_start + t * (d_end - d_start) for t in np.linspace(0.0, 1.0, n_images)]
+
+    def evaluate(images, indices):
+        energies, grads = [], []
+        for k in indices:
+            x = images[k]
+            diff = x[:, None, :] - x[None, :, :]
+            d = np.linalg.norm(diff, axis=-1)
+            np.fill_diagonal(d, 1.0)
+            r = d - targets[k]
+            np.fill_diagonal(r, 0.0)
+            energies.append(np.sum((r[iu] ** 2) / d[iu] ** 4))
+            dfdd = 2 * r / d ** 4 - 4 * r ** 2 / d ** 5
+            grads.append(np.sum((dfdd / d)[:, :, None] * diff, axis=1))
+        return energies, grads
+
+    return evaluate
+
+
+def idpp_interpolation(start, end, n_images, fmax=1e-3, max_iter=500):
+    """Linear interpolation refined on the IDPP surface (Smidstrup et al., JCP 140, 214106)"""
+    images = linear_interpolation(start, end, n_images)
+    evaluate = _idpp_evaluator(start, end, n_images)
+    images, _, _ = neb_relax(images, evaluate, spring=0.1, climb=False, fmax=fmax, max_iter=max_iter)
+    return images
+
+
+def _tangent(images, energies, i):
+    tau_plus = images[i + 1] - images[i]
+    tau_minus = images[i] - images[i - 1]
+    e_prev, e, e_next = energies[i - 1], energies[i], energies[i + 1]
+    if e_next > e > e_prev:
+        tau = tau_plus
+    elif e_next < e < e_prev:
+        tau = tau_minus
+    else:
+        dv_max = max(abs(e_next - e), abs(e_prev - e))
+        dv_min = min(abs(e_next - e), abs(e_prev - e))
+        if e_next > e_prev:
+            tau = tau_plus * dv_max + tau_minus * dv_min
+        else:
+            tau = tau_plus * dv_min + tau_minus * dv_max
+    return tau / np.linalg.norm(tau)
+
+
+def neb_forces(images, energies, grads, spring=0.05, climb=False):
+    """NEB forces on the interior images (improved-tangent, optional climbing image)"""
+    climber = 1 + int(np.argmax(energies[1:-1])) if climb else None
+    forces = [np.zeros_like(images[0])]
+    for i in range(1, len(images) - 1):
+        tau = _tangent(images, energies, i)
+        g = grads[i]
+        g_par = np.sum(g * tau)
+        if i == climber:
+            forces.append(-g + 2 * g_par * tau)
+            continue
+        spring_force = spring * (np.linalg.norm(images[i + 1] - images[i]) -
+                                 np.linalg.norm(images[i] - images[i - 1]))
+        forces.append(-g + g_par * tau + spring_force * tau)
+    forces.append(np.zeros_like(images[0]))
+    return forces
+
+
+def neb_relax(images, evaluate, spring=0.05, climb=True, fmax=5e-3, max_iter=200,
+              dt=0.5, dt_max=2.0, max_step=0.2, callback=None):
+    """
+    Relax a band with FIRE
+
+    Parameters:
+    -----------
+    images : list of numpy.ndarray
+        Band including both (fixed) endpoints
+    evaluate : callable
+        ``evaluate(images, indices)`` returns (energies, gradients) for the given images
+    callback : callable, optional
+        Called as ``callback(iteration, images, energies, max_force)``
+
+    Returns:
+    --------
+    images, energies, converged
+    """
+    images = [np.array(x, dtype=float) for x in images]
+    n = len(images)
+    interior = list(range(1, n - 1))
+    energies = np.zeros(n)
+    grads = [np.zeros_like(images[0]) for _ in range(n)]
+    e_ends, g_ends = evaluate(images, [0, n - 1])
+    energies[0], energies[-1] = e_ends
+    grads[0], grads[-1] = g_ends
+
+    velocity = [np.zeros_like(x) for x in images]
+    alpha, n_positive = 0.1, 0
+    converged = False
+    for iteration in range(max_iter):
+        e_int, g_int = evaluate(images, interior)
+        for k, i in enumerate(interior):
+            energies[i] = e_int[k]
+            grads[i] = g_int[k]
+        forces = neb_forces(images, energies, grads, spring=spring, climb=climb)
+        max_force = max(np.max(np.linalg.norm(f, axis=1)) for f in forces[1:-1])
+        if callback:
+            callback(iteration, images, energies, max_force)
+        if max_force < fmax:
+            converged = True
+            break
+
+        f_all = np.concatenate([f.ravel() for f in forces[1:-1]])
+        v_all = np.concatenate([v.ravel() for v in velocity[1:-1]])
+        power = np.dot(f_all, v_all)
+        if power > 0:
+            v_all = (1 - alpha) * v_all + alpha * np.linalg.norm(v_all) * f_all / np.linalg.norm(f_all)
+            n_positive += 1
+            if n_positive > 5:
+                dt = min(dt * 1.1, dt_max)
+                alpha *= 0.99
+        else:
+            v_all = np.zeros_like(v_all)
+            dt *= 0.5
+            alpha, n_positive = 0.1, 0
+        v_all = v_all + dt * f_all
+        step = dt * v_all
+        norm = np.linalg.norm(step)
+        if norm > max_step:
+            step *= max_step / norm
+        size = images[0].size
+        for k, i in enumerate(interior):
+            velocity[i] = v_all[k * size:(k + 1) * size].reshape(images[i].shape)
+            images[i] = images[i] + step[k * size:(k + 1) * size].reshape(images[i].shape)
+    return images, energies, converged
+
+
+def run_neb(reactant_xyz, product_xyz, n_images=9, charge=0, basis='sto-3g', interpolation='idpp',
+            climb=True, spring=0.05, fmax=5e-3, max_iter=200, max_workers=None,
+            output_xyz='neb_path.xyz'):
+    """
+    Climbing-image NEB between two endpoint XYZ files (same atom ordering)
+
+    Parameters:
+    -----------
+    n_images : int
+        Total number of images including both endpoints
+    interpolation : str
+        'idpp' or 'linear'
+    max_workers : int, optional
+        Process pool size for the concurrent image evaluations
+    output_xyz : str or None
+        Multi-frame XYZ file for the final path (Bohr, like ``geometry_trajectory.xyz``)
+
+    Returns:
+    --------
+    dict with ``symbols``, ``images`` (Bohr), ``energies``, ``barrier`` and ``converged``
+    """
+    if n_images < 3:
+        raise ValueError("NEB needs at least one interior image")
+    atomstr = xyz_to_atomstr(reactant_xyz)
+    mol_r = build_mole(atomstr, charge, basis)
+    mol_p = build_mole(xyz_to_atomstr(product_xyz), charge, basis)
+    symbols = [mol_r.atom_symbol(i) for i in range(mol_r.natm)]
+    if symbols != [mol_p.atom_symbol(i) for i in range(mol_p.natm)]:
+        raise ValueError("Reactant and product must contain the same atoms in the same order")
+
+    start = mol_r.atom_coords()
+    end = align_to(start, mol_p.atom_coords())
+    if interpolation == 'idpp':
+        images = idpp_interpolation(start, end, n_images)
+    elif interpolation == 'linear':
+        images = linear_interpolation(start, end, n_images)
+    else:
+        raise ValueError(f"Unknown interpolation '{interpolation}'")
+
+    densities = [None] * n_images
+    if max_workers is None:
+        max_workers = min(n_images - 2, os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        def evaluate(band, indices):
+            futures = [pool.submit(_image_energy_and_grad, atomstr, charge, basis, band[i], densities[i])
+                       for i in indices]
+            energies, grads = [], []
+            for i, future in zip(indices, futures):
+                e, g, dm = future.result()
+                densities[i] = dm
+                energies.append(e)
+                grads.append(g)
+            return energies, grads
+
+        def report(iteration, band, energies, max_force):
+            print(f"NEB iteration {iteration+1}: max force {max_force:.5f} a.u., "
+                  f"highest image energy {np.max(energies):.6f} a.u.")
+
+        images, energies, converged = neb_relax(images, evaluate, spring=spring, climb=climb,
+                                                fmax=fmax, max_iter=max_iter, callback=report)
+
+    barrier = np.max(energies) - energies[0]
+    print(f"Forward barrier: {barrier:.6f} a.u. ({barrier * 627.509:.2f} kcal/mol)")
+    print("NEB converged." if converged else "NEB did not converge.")
+    if output_xyz:
+        comments = [f"Image {i+1} E={e:.8f}" for i, e in enumerate(energies)]
+        export_xyz_trajectory(output_xyz, symbols, images, comments=comments)
+    return {
+        'symbols': symbols,
+        'images': images,
+        'energies': energies,
+        'barrier': barrier,
+        'converged': converged,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m my_hf_program.neb reactant.xyz product.xyz [n_images] [output_xyz]")
+        sys.exit(1)
+    n_images = int(sys.argv[3]) if len(sys.argv) > 3 else 9
+    output_xyz = sys.argv[4] if len(sys.argv) > 4 else 'neb_path.xyz'
+    run_neb(sys.argv[1], sys.argv[2], n_images=n_images, output_xyz=output_xyz)
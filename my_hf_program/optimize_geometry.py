@@ -1,12 +1,21 @@
+import os
 import sys
-try:
-    from pyscf import gto, scf, grad
-except ImportError:
-    print('PySCF is required for geometry optimization. Please install with: pip install pyscf')
-    sys.exit(1)
 import numpy as np
-from .molecule import load_molecule
-from scipy.optimize import minimize
+from .molecule import Molecule, load_molecule, detect_point_group, symmetrize_coords, symmetric_displacement_basis
+from .instrumentation import timed, SCF_ITERATIONS
+from .tracing import traced, enable_tracing, trace_flag, TRACER
+from .memory_planner import make_rhf
+from .utils import ANGSTROM_TO_BOHR
+
+
+def _pyscf():
+    # PySCF and SciPy are imported on first use, so importing this module for its helpers stays fast
+    try:
+        from pyscf import gto, grad
+    except ImportError:
+        print('PySCF is required for geometry optimization. Please install with: pip install pyscf')
+        sys.exit(1)
+    return gto, grad
 
 
 def xyz_to_atomstr(xyz_file):
@@ -18,69 +27,239 @@ def xyz_to_atomstr(xyz_file):
             atoms.append(f"{parts[0]} {parts[1]} {parts[2]} {parts[3]}")
     return "; ".join(atoms)
 
+def format_xyz(symbols, coords, comment="Optimized geometry"):
+    lines = [f"{len(symbols)}\n{comment}\n"]
+    for sym, xyz in zip(symbols, coords):
+        lines.append(f"{sym} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}\n")
+    return "".join(lines)
+
+def format_xyz_trajectory(symbols, trajectory, comments=None):
+    return "".join(format_xyz(symbols, coords, comments[i] if comments else f"Step {i+1}")
+                   for i, coords in enumerate(trajectory))
+
 def save_xyz(filename, symbols, coords, comment="Optimized geometry"):
+    text = format_xyz(symbols, coords, comment)
     with open(filename, 'w') as f:
-        f.write(f"{len(symbols)}\n{comment}\n")
-        for sym, xyz in zip(symbols, coords):
-            f.write(f"{sym} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}\n")
+        f.write(text)
+    return text
 
-def export_xyz_trajectory(filename, symbols, trajectory):
+def export_xyz_trajectory(filename, symbols, trajectory, comments=None):
+    text = format_xyz_trajectory(symbols, trajectory, comments)
     with open(filename, 'w') as f:
-        for i, coords in enumerate(trajectory):
-            f.write(f"{len(symbols)}\nStep {i+1}\n")
-            for sym, xyz in zip(symbols, coords):
-                f.write(f"{sym} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}\n")
+        f.write(text)
     print(f'XYZ trajectory saved as {filename}')
+    return text
 
-def optimize_geometry(xyz_file, charge=0, basis='sto-3g', conv_tol=1e-4, max_steps=100):
-    atomstr = xyz_to_atomstr(xyz_file)
+@traced('optimize_geometry.mole_build')
+def build_mole(atomstr, charge=0, basis='sto-3g', symmetry=False):
+    gto, _ = _pyscf()
     mol = gto.Mole()
     mol.atom = atomstr
     mol.charge = charge
     mol.basis = basis
+    mol.symmetry = symmetry
     mol.build()
-    n_atoms = mol.natm
-    coords0 = mol.atom_coords().flatten()
-    energies = []
-    trajectory = []
-    symbols = [mol.atom_symbol(i) for i in range(n_atoms)]
+    return mol
 
-    def energy_and_grad(flat_coords):
-        mol.set_geom_(flat_coords.reshape((n_atoms, 3)), unit='Bohr')
-        mf = scf.RHF(mol)
-        mf.kernel()
-        e = mf.e_tot
-        g = grad.RHF(mf).kernel().flatten()
-        energies.append(e)
-        trajectory.append(mol.atom_coords().copy())
-        return e, g
+def set_geometry(mol, coords):
+    """Move ``mol`` to ``coords`` (Bohr), without PySCF's warnings from rebuilding it
+
+    With symmetry, every rebuild otherwise warns that the input axes are not
+    PySCF's standard frame ("Unable to identify input symmetry using original
+    axes"), although the point group was already detected and enforced.
+    """
+    from pyscf.lib import logger
+    verbose, mol.verbose = mol.verbose, logger.ERROR
+    try:
+        mol.set_geom_(coords, unit='Bohr')
+    finally:
+        mol.verbose = verbose
+
+def rhf_energy_and_grad(mol, dm0=None, strategy='packed', max_memory_mb=None):
+    """Run RHF at the current geometry of ``mol`` and return (energy, flat gradient, mf).
 
-    def fun(flat_coords):
-        e, _ = energy_and_grad(flat_coords)
-        return e
+    ``dm0`` is an optional initial density matrix, e.g. from a neighbouring geometry.
+    ``strategy`` and ``max_memory_mb`` select the integral handling (see ``memory_planner.make_rhf``).
+    """
+    _, grad = _pyscf()
+    mf = make_rhf(mol, strategy, max_memory_mb)
+    with timed('scf'):
+        mf.kernel(dm0=dm0)
+    if getattr(mf, 'cycles', None) is not None:
+        SCF_ITERATIONS.observe(mf.cycles)
+    mf_grad = mf.nuc_grad_method() if strategy == 'density_fit' else grad.RHF(mf)
+    with timed('gradient'):
+        if mol.symmetry:
+            # Skip PySCF's gradient symmetrization: it re-detects the full top group, which
+            # fails for nearly-degenerate geometries, and optimize_geometry already
+            # projects the gradient onto symmetric displacements
+            g = mf_grad.grad_elec() + mf_grad.grad_nuc()
+        else:
+            g = mf_grad.kernel()
+    return mf.e_tot, g.flatten(), mf
 
-    def jac(flat_coords):
-        _, g = energy_and_grad(flat_coords)
-        return g
+def report_optimization(symbols, coords, trajectory, energy, converged, output_dir='.'):
+    """Print the result and write optimized.xyz and geometry_trajectory.xyz into ``output_dir``.
 
-    result = minimize(fun, coords0, jac=jac, method='BFGS', tol=conv_tol, options={'maxiter': max_steps, 'disp': True})
-    mol.set_geom_(result.x.reshape((n_atoms, 3)), unit='Bohr')
-    coords = mol.atom_coords()
-    save_xyz('optimized.xyz', symbols, coords, comment="Optimized geometry from PySCF")
-    print("\nOptimized geometry saved to optimized.xyz")
+    With ``output_dir=None`` nothing is written. Returns both files' contents.
+    """
+    optimized_xyz = format_xyz(symbols, coords, comment="Optimized geometry from PySCF")
+    trajectory_xyz = format_xyz_trajectory(symbols, trajectory)
+    if output_dir is not None:
+        optimized_path = os.path.join(output_dir, 'optimized.xyz')
+        with timed('file_io'), open(optimized_path, 'w') as f:
+            f.write(optimized_xyz)
+        print(f"\nOptimized geometry saved to {optimized_path}")
     print("Optimized geometry (Bohr):")
     for i, xyz in enumerate(coords):
         print(f"{symbols[i]} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}")
-    print(f"Final energy: {result.fun:.6f} a.u.")
-    if result.success:
+    print(f"Final energy: {energy:.6f} a.u.")
+    if converged:
         print("Geometry optimization converged.")
     else:
         print("Geometry optimization did not converge.")
     # Export XYZ trajectory for visualization
-    export_xyz_trajectory('geometry_trajectory.xyz', symbols, trajectory)
+    if output_dir is not None:
+        trajectory_path = os.path.join(output_dir, 'geometry_trajectory.xyz')
+        with timed('file_io'), open(trajectory_path, 'w') as f:
+            f.write(trajectory_xyz)
+        print(f'XYZ trajectory saved as {trajectory_path}')
+    return {'optimized_xyz': optimized_xyz, 'trajectory_xyz': trajectory_xyz}
+
+@timed('optimize_geometry')
+def optimize_geometry(xyz_file, charge=0, basis='sto-3g', conv_tol=1e-4, max_steps=100, cache=None,
+                      symmetry=False, symmetry_tol=5e-2, output_dir='.', callback=None, scf_strategy='packed',
+                      max_memory_mb=None, engine='pyscf'):
+    """Optimize the geometry in ``xyz_file`` and return the result as a dict.
+
+    With a ``result_cache.ResultCache`` as ``cache``, a molecule already optimized
+    with the same settings (in any position, orientation or atom order) is served
+    from the cache instead of being recomputed.
+
+    With ``symmetry``, the input is snapped onto its Abelian point group (within
+    ``symmetry_tol`` Angstrom, as in ``Molecule.symmetrize``), BFGS runs over
+    totally symmetric displacements only, and PySCF uses the symmetry-adapted
+    SCF. It is off by default: on small molecules BFGS takes as many steps
+    either way and the symmetry-adapted SCF is slower.
+
+    Output files go to ``output_dir`` (never the implicit working directory
+    unless it is left as '.'); with ``output_dir=None`` nothing is written and
+    the file contents are only returned as ``optimized_xyz`` and ``trajectory_xyz``.
+
+    Every geometry is evaluated once, for its energy and gradient together.
+    ``callback``, if given, is called after each new geometry with a dict holding ``step`` (1-based, matching the trajectory frames), ``energy``,
+    ``grad_norm``, ``scf_cycles`` and ``coords`` (Bohr). Cached results are
+    replayed through it with ``grad_norm`` and ``scf_cycles`` set to None.
+
+    ``scf_strategy`` and ``max_memory_mb`` choose how PySCF handles the
+    integrals, e.g. as picked by ``memory_planner.plan`` for a memory budget.
+
+    With ``engine='inhouse'`` every step runs this package's own pipeline
+    instead of PySCF's RHF: ``integrals.get_integrals``, ``scf.run_scf``
+    started from the previous step's density, and the analytic gradient of
+    ``gradients.energy_and_gradient``. An SCF that does not converge stops the
+    optimization with ``scf.SCFConvergenceError``.
+    """
+    if engine not in ('pyscf', 'inhouse'):
+        raise ValueError(f"Unknown engine '{engine}'; choose 'pyscf' or 'inhouse'")
+    settings = {'charge': charge, 'basis': basis, 'conv_tol': conv_tol, 'max_steps': max_steps,
+                'symmetry': symmetry}
+    if scf_strategy == 'density_fit':
+        settings['scf_strategy'] = scf_strategy  # approximate results are cached separately
+    if engine != 'pyscf':
+        settings['engine'] = engine
+    if cache is not None:
+        input_mol = load_molecule(xyz_file, charge=charge)
+        input_symbols = [symbol for symbol, _ in input_mol.atoms]
+        input_coords = input_mol.get_nuclear_coords()
+        cached = cache.lookup(input_symbols, input_coords, **settings)
+        if cached is not None:
+            print("Geometry optimization result served from cache.")
+            if callback is not None:
+                for step, (e, frame) in enumerate(zip(cached['energies'], cached['trajectory']), start=1):
+                    callback({'step': step, 'energy': e, 'grad_norm': None, 'scf_cycles': None,
+                              'coords': np.asarray(frame).tolist()})
+            cached.update(report_optimization(cached['symbols'], cached['coords'], cached['trajectory'],
+                                              cached['energy'], cached['converged'], output_dir))
+            return cached
+
+    atomstr = xyz_to_atomstr(xyz_file)
+    mol = build_mole(atomstr, charge, basis)
+    n_atoms = mol.natm
+    coords0 = mol.atom_coords().flatten()
+    energies = []
+    trajectory = []
+    symbols = [mol.atom_symbol(i) for i in range(n_atoms)]
+
+    # Optimize over x = coords0 + basis @ q; without symmetry the basis is the identity
+    point_group = (detect_point_group(symbols, mol.atom_coords(), tol=symmetry_tol * ANGSTROM_TO_BOHR)
+                   if symmetry else None)
+    if point_group is not None:
+        coords0 = symmetrize_coords(mol.atom_coords(), point_group).flatten()
+        basis_vectors = symmetric_displacement_basis(point_group, n_atoms)
+        mol.symmetry = point_group['group']
+        set_geometry(mol, coords0.reshape((n_atoms, 3)))
+        print(f"Point group {point_group['group']}: optimizing {basis_vectors.shape[1]} "
+              f"of {3 * n_atoms} Cartesian degrees of freedom")
+    else:
+        basis_vectors = np.eye(3 * n_atoms)
+
+    state = {'D': None, 'last': None}
+
+    def energy_and_grad(q):
+        # The line search may ask for the point it just evaluated again
+        if state['last'] is not None and np.array_equal(q, state['last'][0]):
+            return state['last'][1:]
+        flat_coords = coords0 + basis_vectors @ q
+        set_geometry(mol, flat_coords.reshape((n_atoms, 3)))
+        if engine == 'inhouse':
+            from .gradients import energy_and_gradient
+            atoms = [(symbol, list(xyz / ANGSTROM_TO_BOHR)) for symbol, xyz in zip(symbols, mol.atom_coords())]
+            # BFGS line searches need energies far tighter than run_scf's default 1e-6 Hartree
+            e, g, state['D'], cycles = energy_and_gradient(Molecule(atoms, charge=charge), basis, D0=state['D'],
+                                                           convergence=1e-9)
+            g = g.flatten()
+        else:
+            e, g, mf = rhf_energy_and_grad(mol, strategy=scf_strategy, max_memory_mb=max_memory_mb)
+            cycles = getattr(mf, 'cycles', None)
+        energies.append(e)
+        trajectory.append(flat_coords.reshape((n_atoms, 3)).copy())
+        g = basis_vectors.T @ g
+        if callback is not None:
+            callback({'step': len(trajectory), 'energy': float(e), 'grad_norm': float(np.linalg.norm(g)),
+                      'scf_cycles': cycles, 'coords': trajectory[-1].tolist()})
+        state['last'] = (np.array(q), e, g)
+        return e, g
+
+    from scipy.optimize import minimize
+    q0 = np.zeros(basis_vectors.shape[1])
+    result = minimize(energy_and_grad, q0, jac=True, method='BFGS', tol=conv_tol, options={'maxiter': max_steps, 'disp': True})
+    coords = (coords0 + basis_vectors @ result.x).reshape((n_atoms, 3))
+    output = {
+        'symbols': symbols,
+        'coords': coords,
+        'trajectory': trajectory,
+        'energy': float(result.fun),
+        'energies': energies,
+        'converged': bool(result.success),
+    }
+    output.update(report_optimization(symbols, coords, trajectory, result.fun, result.success, output_dir))
+    if cache is not None:
+        cache.store(input_symbols, input_coords, output, **settings)
+    return output
 
 if __name__ == "__main__":
-    xyz_file = sys.argv[1] if len(sys.argv) > 1 else 'h2.xyz'
-    charge = int(sys.argv[2]) if len(sys.argv) > 2 else 0
-    basis = sys.argv[3] if len(sys.argv) > 3 else 'sto-3g'
-    optimize_geometry(xyz_file, charge, basis)
+    # Usage: python -m my_hf_program.optimize_geometry [xyz_file] [charge] [basis] [--trace[=trace.json]]
+    #                                                  [--engine=pyscf|inhouse]
+    trace_path = trace_flag(sys.argv[1:])
+    if trace_path:
+        enable_tracing(trace_path)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    engine = next((arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--engine=')), 'pyscf')
+    xyz_file = args[0] if len(args) > 0 else 'h2.xyz'
+    charge = int(args[1]) if len(args) > 1 else 0
+    basis = args[2] if len(args) > 2 else 'sto-3g'
+    optimize_geometry(xyz_file, charge, basis, engine=engine)
+    if trace_path:
+        TRACER.print_summary()
+        print(f"Trace written to {TRACER.write()}")
@@ -0,0 +1,290 @@
+"""
+Relaxed potential energy surface scans with PySCF RHF
+
+One or two internal coordinates (bond length, angle or dihedral) are held fixed
+on a grid while all remaining degrees of freedom are optimized with SLSQP.
+
+- Every scan point is warm-started from the neighbouring point's geometry and
+  SCF density, so both optimization steps and SCF iterations drop sharply.
+- The grid is split into branches that sweep outwards from the value closest
+  to the input geometry. In a 2-D scan every row of the second coordinate
+  starts from the converged point of its neighbouring row (closer to the
+  input geometry), so both axes are warm-started; branches run in parallel
+  processes as soon as the point they start from is done.
+- The resulting 1-D or 2-D surface is written to a compressed ``.npz`` file.
+
+Usage as script:
+    python -m my_hf_program.pes_scan input.xyz --scan bond 0 1 0.6 1.2 13
+    python -m my_hf_program.pes_scan input.xyz --scan bond 0 1 0.9 1.1 5 --scan angle 1 0 2 100 120 5
+
+Bond values are given in Angstrom, angles and dihedrals in degrees; atom
+indices are zero-based.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from scipy.optimize import minimize
+
+from .optimize_geometry import xyz_to_atomstr, build_mole, rhf_energy_and_grad
+from .utils import BOHR_TO_ANGSTROM
+
+COORD_ATOMS = {'bond': 2, 'angle': 3, 'dihedral': 4}
+
+
+def internal_coordinate(kind, atoms, coords):
+    """Value of an internal coordinate (Angstrom or degrees) from Bohr coordinates"""
+    x = coords[list(atoms)]
+    if kind == 'bond':
+        return np.linalg.norm(x[0] - x[1]) * BOHR_TO_ANGSTROM
+    if kind == 'angle':
+        u = x[0] - x[1]
+        v = x[2] - x[1]
+        cos_t = np.dot(u, v) / (np.linalg.norm(u) * np.linalg.norm(v))
+        return np.degrees(np.arccos(np.clip(cos_t, -1.0, 1.0)))
+    if kind == 'dihedral':
+        b0 = x[0] - x[1]
+        b1 = x[2] - x[1]
+        b2 = x[3] - x[2]
+        b1 = b1 / np.linalg.norm(b1)
+        v = b0 - np.dot(b0, b1) * b1
+        w = b2 - np.dot(b2, b1) * b1
+        return np.degrees(np.arctan2(np.dot(np.cross(b1, v), w), np.dot(v, w)))
+    raise ValueError(f"Unknown internal coordinate type: {kind}")
+
+
+def _coordinate_deviation(kind, atoms, target, coords):
+    delta = internal_coordinate(kind, atoms, coords) - target
+    if kind == 'dihedral':
+        delta = (delta + 180.0) % 360.0 - 180.0
+    return delta
+
+
+def _make_constraint(kind, atoms, target, n_atoms, step=1e-5):
+    def fun(flat_coords):
+        return _coordinate_deviation(kind, atoms, target, flat_coords.reshape((n_atoms, 3)))
+
+    def jac(flat_coords):
+        # Only the atoms defining the coordinate contribute, so the central
+        # difference costs at most 24 cheap geometry evaluations.
+        g = np.zeros_like(flat_coords)
+        for a in atoms:
+            for k in range(3):
+                idx = 3 * a + k
+                xp = flat_coords.copy()
+                xm = flat_coords.copy()
+                xp[idx] += step
+                xm[idx] -= step
+                g[idx] = (fun(xp) - fun(xm)) / (2 * step)
+        return g
+
+    return {'type': 'eq', 'fun': fun, 'jac': jac}
+
+
+def constrained_optimize(mol, coords0, constraints, dm0=None, conv_tol=1e-4, max_steps=100):
+    """
+    Optimize ``mol`` starting from ``coords0`` (Bohr) with internal coordinates fixed
+
+    Parameters:
+    -----------
+    mol : pyscf.gto.Mole
+        Molecule whose geometry is updated in place
+    coords0 : numpy.ndarray
+        Starting geometry, shape (n_atoms, 3), in Bohr
+    constraints : list of (kind, atoms, target)
+        Internal coordinates to hold fixed
+    dm0 : numpy.ndarray, optional
+        Initial SCF density matrix
+
+    Returns:
+    --------
+    energy, coords, dm, converged, scf_cycles
+    """
+    n_atoms = mol.natm
+    cons = [_make_constraint(kind, atoms, target, n_atoms) for kind, atoms, target in constraints]
+    state = {'dm': dm0, 'cycles': 0}
+
+    def fun(flat_coords):
+        mol.set_geom_(flat_coords.reshape((n_atoms, 3)), unit='Bohr')
+        e, g, mf = rhf_energy_and_grad(mol, dm0=state['dm'])
+        state['dm'] = mf.make_rdm1()
+        state['cycles'] += getattr(mf, 'cycles', 0)
+        return e, g
+
+    result = minimize(fun, np.asarray(coords0).flatten(), jac=True, method='SLSQP',
+                      constraints=cons, tol=conv_tol, options={'maxiter': max_steps})
+    coords = result.x.reshape((n_atoms, 3))
+    mol.set_geom_(coords, unit='Bohr')
+    return result.fun, coords, state['dm'], result.success, state['cycles']
+
+
+def _scan_branch(atomstr, charge, basis, scan_coords, branch, conv_tol, max_steps, coords0=None, dm0=None):
+    """
+    Run one branch of grid points sequentially, warm-starting each from the last
+
+    The first point starts from ``coords0`` (Bohr) and ``dm0`` if given, else from the input geometry.
+    """
+    mol = build_mole(atomstr, charge, basis)
+    coords = mol.atom_coords() if coords0 is None else coords0
+    dm = dm0
+    results = []
+    for index in branch:
+        constraints = [(kind, atoms, values[i]) for (kind, atoms, values), i in zip(scan_coords, index)]
+        e, coords, dm, converged, cycles = constrained_optimize(
+            mol, coords, constraints, dm0=dm, conv_tol=conv_tol, max_steps=max_steps)
+        results.append((index, e, coords.copy(), converged, cycles, dm))
+    return results
+
+
+def _split_axis(values, current):
+    """Split an axis into an ascending and a descending sweep around ``current``"""
+    start = int(np.argmin(np.abs(np.asarray(values) - current)))
+    up = list(range(start, len(values)))
+    down = list(range(start - 1, -1, -1))
+    return [sweep for sweep in (up, down) if sweep]
+
+
+def scan_branches(scan_coords, coords):
+    """
+    Branches covering a 1-D or 2-D grid, as (grid indices, seed) pairs
+
+    ``seed`` is the grid index whose converged geometry and density start the
+    branch, or None to start from the input geometry. In a 2-D grid each row
+    is seeded from the same column of the neighbouring row towards the row
+    closest to the input geometry.
+    """
+    current = [internal_coordinate(kind, atoms, coords) for kind, atoms, _ in scan_coords]
+    if len(scan_coords) == 1:
+        return [([(i,) for i in sweep], None) for sweep in _split_axis(scan_coords[0][2], current[0])]
+    first_values = np.asarray(scan_coords[0][2])
+    start = int(np.argmin(np.abs(first_values - current[0])))
+    branches = []
+    for i in range(len(first_values)):
+        previous = None if i == start else i - 1 if i > start else i + 1
+        for sweep in _split_axis(scan_coords[1][2], current[1]):
+            branches.append(([(i, j) for j in sweep], None if previous is None else (previous, sweep[0])))
+    return branches
+
+
+def relaxed_scan(xyz_file, scan_coords, charge=0, basis='sto-3g', conv_tol=1e-4, max_steps=100,
+                 max_workers=None, output='pes_scan.npz'):
+    """
+    Run a relaxed scan over one or two internal coordinates
+
+    Parameters:
+    -----------
+    xyz_file : str
+        Starting geometry (XYZ, Angstrom)
+    scan_coords : list of (kind, atoms, values)
+        ``kind`` is 'bond', 'angle' or 'dihedral', ``atoms`` the zero-based atom
+        indices and ``values`` the grid (Angstrom or degrees)
+    max_workers : int, optional
+        Number of worker processes for the independent branches
+    output : str or None
+        Path of the ``.npz`` file holding the surface
+
+    Returns:
+    --------
+    dict with ``energies``, ``geometries`` (Bohr), ``converged`` and ``scf_cycles``
+    arrays shaped like the grid
+    """
+    if not 1 <= len(scan_coords) <= 2:
+        raise ValueError("A relaxed scan needs one or two scan coordinates")
+    scan_coords = [(kind, tuple(atoms), np.asarray(values, dtype=float)) for kind, atoms, values in scan_coords]
+    for kind, atoms, _ in scan_coords:
+        if COORD_ATOMS.get(kind) != len(atoms):
+            raise ValueError(f"A {kind} scan coordinate needs {COORD_ATOMS.get(kind)} atoms, got {len(atoms)}")
+
+    atomstr = xyz_to_atomstr(xyz_file)
+    mol = build_mole(atomstr, charge, basis)
+    symbols = [mol.atom_symbol(i) for i in range(mol.natm)]
+    shape = tuple(len(values) for _, _, values in scan_coords)
+    branches = scan_branches(scan_coords, mol.atom_coords())
+
+    energies = np.full(shape, np.nan)
+    geometries = np.full(shape + (mol.natm, 3), np.nan)
+    converged = np.zeros(shape, dtype=bool)
+    scf_cycles = np.zeros(shape, dtype=int)
+
+    if max_workers is None:
+        max_workers = min(len(branches), os.cpu_count() or 1)
+    # A branch is submitted once the point it is seeded from has been computed
+    seeds = {seed for _, seed in branches if seed is not None}
+    seed_states = {}
+    waiting = list(branches)
+    running = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            ready = [(branch, seed) for branch, seed in waiting if seed is None or seed in seed_states]
+            for branch, seed in ready:
+                waiting.remove((branch, seed))
+                coords0, dm0 = seed_states.get(seed, (None, None))
+                running.add(pool.submit(_scan_branch, atomstr, charge, basis, scan_coords, branch, conv_tol,
+                                        max_steps, coords0, dm0))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                for index, e, coords, ok, cycles, dm in future.result():
+                    energies[index] = e
+                    geometries[index] = coords
+                    converged[index] = ok
+                    scf_cycles[index] = cycles
+                    if index in seeds:
+                        seed_states[index] = (coords, dm)
+
+    surface = {
+        'energies': energies,
+        'geometries': geometries,
+        'converged': converged,
+        'scf_cycles': scf_cycles,
+        'symbols': np.array(symbols),
+        'coordinates': np.array([f"{kind} {' '.join(str(a) for a in atoms)}" for kind, atoms, _ in scan_coords]),
+    }
+    for axis, (_, _, values) in enumerate(scan_coords):
+        surface[f'axis{axis}'] = values
+    if output:
+        np.savez_compressed(output, **surface)
+        print(f'PES scan saved as {output}')
+    return surface
+
+
+def _parse_scan_arg(spec):
+    kind = spec[0]
+    if kind not in COORD_ATOMS:
+        raise argparse.ArgumentTypeError(f"Unknown scan coordinate '{kind}'")
+    n = COORD_ATOMS[kind]
+    if len(spec) != n + 4:
+        raise argparse.ArgumentTypeError(f"--scan {kind} expects {n} atom indices, start, stop and number of points")
+    try:
+        atoms = tuple(int(a) for a in spec[1:n + 1])
+        start, stop, npts = float(spec[n + 1]), float(spec[n + 2]), int(spec[n + 3])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"--scan {kind}: atom indices and number of points must be integers, "
+                                         "start and stop numbers")
+    return kind, atoms, np.linspace(start, stop, npts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relaxed PES scan with PySCF RHF")
+    parser.add_argument('xyz_file')
+    parser.add_argument('--scan', nargs='+', action='append', required=True,
+                        metavar='SPEC', help="kind atoms... start stop npoints (at most two)")
+    parser.add_argument('--charge', type=int, default=0)
+    parser.add_argument('--basis', default='sto-3g')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='pes_scan.npz')
+    args = parser.parse_args()
+    # nargs='+' collects each --scan as a list, so it is validated here rather than with type=
+    try:
+        scan_coords = [_parse_scan_arg(spec) for spec in args.scan]
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if len(scan_coords) > 2:
+        parser.error("at most two --scan coordinates are supported")
+    surface = relaxed_scan(args.xyz_file, scan_coords, charge=args.charge, basis=args.basis,
+                           max_workers=args.workers, output=args.output)
+    print(f"Lowest energy on the scan: {np.nanmin(surface['energies']):.6f} a.u.")
+
+
+if __name__ == "__main__":
+    main()
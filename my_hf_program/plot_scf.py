@@ -1,12 +1,17 @@
-import matplotlib.pyplot as plt
+def plot_scf_convergence(energies, filename='scf_convergence.png'):
+    # matplotlib is imported on first use and drawn with the headless Agg canvas, so runs
+    # without a plot never pay for it and no display is needed
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-def plot_scf_convergence(energies):
-    plt.figure(figsize=(6,4))
-    plt.plot(range(1, len(energies)+1), energies, marker='o')
-    plt.xlabel('Iteration')
-    plt.ylabel('Electronic Energy (a.u.)')
-    plt.title('SCF Convergence')
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig('scf_convergence.png')
-    print('SCF convergence plot saved as scf_convergence.png')
+    fig = Figure(figsize=(6, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(range(1, len(energies)+1), energies, marker='o')
+    ax.set_xlabel('Iteration')
+    ax.set_ylabel('Electronic Energy (a.u.)')
+    ax.set_title('SCF Convergence')
+    ax.grid(True)
+    fig.tight_layout()
+    fig.savefig(filename)
+    print(f'SCF convergence plot saved as {filename}')
@@ -0,0 +1,231 @@
+"""
+Rotation/translation-invariant result cache for geometry optimizations
+
+Molecules are reduced to a canonical form before lookup:
+
+- translated to the centre of mass,
+- rotated into the principal-axis frame (sign and degeneracy ambiguities are
+  resolved by picking the lexicographically smallest candidate frame),
+- atoms sorted into a canonical order,
+- coordinates rounded.
+
+The cache key combines this fingerprint with the charge, basis and
+convergence settings. On a hit the stored optimized geometry and trajectory
+are rotated, translated and reordered back into the caller's frame.
+
+Entries live in memory and, if a directory is given, as JSON files so that
+several processes (API workers, Streamlit, batch jobs) can share them.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from .instrumentation import CACHE_REQUESTS
+    from .utils import BOHR_TO_ANGSTROM
+except ImportError:  # run as a script from this directory
+    from instrumentation import CACHE_REQUESTS
+    from utils import BOHR_TO_ANGSTROM
+
+ATOMIC_MASSES = {
+    'H': 1.008, 'He': 4.0026, 'Li': 6.94, 'Be': 9.0122, 'B': 10.81, 'C': 12.011, 'N': 14.007, 'O': 15.999,
+    'F': 18.998, 'Ne': 20.180, 'Na': 22.990, 'Mg': 24.305, 'Al': 26.982, 'Si': 28.085, 'P': 30.974,
+    'S': 32.06, 'Cl': 35.45, 'Ar': 39.948, 'K': 39.098, 'Ca': 40.078, 'Sc': 44.956, 'Ti': 47.867,
+    'V': 50.942, 'Cr': 51.996, 'Mn': 54.938, 'Fe': 55.845, 'Co': 58.933, 'Ni': 58.693, 'Cu': 63.546,
+    'Zn': 65.38, 'Br': 79.904, 'I': 126.90
+}
+
+
+def _candidate_frames(coords, masses, tol=1e-3):
+    """Proper rotation matrices (columns = axes) that define a principal-axis frame"""
+    inertia = np.zeros((3, 3))
+    for m, r in zip(masses, coords):
+        inertia += m * (np.dot(r, r) * np.eye(3) - np.outer(r, r))
+    moments, axes = np.linalg.eigh(inertia)
+    scale = max(moments[-1], 1.0)
+    distinct = [abs(moments[1] - moments[0]) > tol * scale, abs(moments[2] - moments[1]) > tol * scale]
+
+    def frame(z, x):
+        x = x - np.dot(x, z) * z
+        x /= np.linalg.norm(x)
+        return np.column_stack([x, np.cross(z, x), z])
+
+    def plane_vectors(z):
+        vecs = [r - np.dot(r, z) * z for r in coords]
+        vecs = [v for v in vecs if np.linalg.norm(v) > 1e-6]
+        if not vecs:
+            # Linear molecule (or single atom): any perpendicular axis will do
+            trial = np.eye(3)[np.argmin(np.abs(z))]
+            vecs = [trial]
+        return vecs
+
+    if all(distinct):
+        frames = []
+        for sx, sz in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+            a = axes * np.array([sx, 1.0, sz])
+            a[:, 1] = np.cross(a[:, 2], a[:, 0])
+            frames.append(a)
+        return frames
+    if any(distinct):
+        # Symmetric top: the unique axis becomes z, x follows an atom in the degenerate plane
+        unique = axes[:, 0] if distinct[0] else axes[:, 2]
+        return [frame(s * unique, v) for s in (1, -1) for v in plane_vectors(s * unique)]
+    # Spherical top: both axes are anchored on atoms
+    frames = []
+    for r in coords:
+        if np.linalg.norm(r) < 1e-6:
+            continue
+        z = r / np.linalg.norm(r)
+        frames.extend(frame(z, v) for v in plane_vectors(z))
+    return frames or [np.eye(3)]
+
+
+def canonicalize(symbols, coords, decimals=3):
+    """
+    Canonical form of a molecule given in Angstrom
+
+    Returns:
+    --------
+    fingerprint : tuple
+        Hashable canonical (symbol, x, y, z) rows
+    transform : dict
+        ``center``, ``rotation`` and ``order`` needed to map canonical
+        coordinates back with ``from_canonical``
+    """
+    coords = np.asarray(coords, dtype=float)
+    masses = np.array([ATOMIC_MASSES.get(s, 1.0) for s in symbols])
+    center = masses @ coords / masses.sum()
+    centered = coords - center
+    best = None
+    for rotation in _candidate_frames(centered, masses):
+        rounded = np.round(centered @ rotation, decimals) + 0.0
+        rows = sorted((symbols[i], *rounded[i], i) for i in range(len(symbols)))
+        key = tuple(row[:4] for row in rows)
+        if best is None or key < best[0]:
+            best = (key, rotation, [row[4] for row in rows])
+    key, rotation, order = best
+    return key, {'center': center, 'rotation': rotation, 'order': order}
+
+
+def to_canonical(coords, transform):
+    coords = (np.asarray(coords, dtype=float) - transform['center']) @ transform['rotation']
+    return coords[transform['order']]
+
+
+def from_canonical(coords, transform):
+    restored = np.empty_like(np.asarray(coords, dtype=float))
+    restored[transform['order']] = np.asarray(coords) @ transform['rotation'].T + transform['center']
+    return restored
+
+
+def cache_key(fingerprint, **settings):
+    payload = json.dumps({'molecule': fingerprint, 'settings': settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of optimization results keyed by canonical molecular fingerprint
+
+    Parameters:
+    -----------
+    directory : str, optional
+        Directory for JSON entries shared between processes
+    max_entries : int
+        Size of the in-memory LRU layer
+    decimals : int
+        Rounding of canonical coordinates (Angstrom)
+    """
+
+    def __init__(self, directory=None, max_entries=256, decimals=3):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.decimals = decimals
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(key, entry)
+            return entry
+        return None
+
+    def lookup(self, symbols, coords, **settings):
+        """
+        Return the cached result for a molecule (coords in Angstrom) in the caller's frame
+
+        The result holds ``coords`` and ``trajectory`` in Bohr (as produced by
+        ``optimize_geometry``), ``energy``, ``energies`` and ``converged``, or
+        None on a miss.
+        """
+        fingerprint, transform = canonicalize(symbols, coords, self.decimals)
+        entry = self._load(cache_key(fingerprint, **settings))
+        if entry is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache='optimization', result='miss')
+            return None
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache='optimization', result='hit')
+
+        def restore(canonical):
+            return from_canonical(np.array(canonical), transform) / BOHR_TO_ANGSTROM
+
+        return {
+            'symbols': list(symbols),
+            'coords': restore(entry['coords']),
+            'trajectory': [restore(frame) for frame in entry['trajectory']],
+            'energy': entry['energy'],
+            'energies': entry['energies'],
+            'converged': entry['converged'],
+        }
+
+    def store(self, symbols, coords, result, **settings):
+        """Store an ``optimize_geometry`` result for the input geometry ``coords`` (Angstrom)"""
+        fingerprint, transform = canonicalize(symbols, coords, self.decimals)
+        key = cache_key(fingerprint, **settings)
+
+        def canonical(bohr_coords):
+            return to_canonical(np.asarray(bohr_coords) * BOHR_TO_ANGSTROM, transform).tolist()
+
+        entry = {
+            'coords': canonical(result['coords']),
+            'trajectory': [canonical(frame) for frame in result['trajectory']],
+            'energy': float(result['energy']),
+            'energies': [float(e) for e in result['energies']],
+            'converged': bool(result['converged']),
+        }
+        self._remember(key, entry)
+        if self.directory:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        return key
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
@@ -1,6 +1,31 @@
 import numpy as np
 
-def run_scf(S, T, V, ERI, mol, max_iter=50, convergence=1e-6, return_energies=False):
+try:
+    from .instrumentation import timed, SCF_ITERATIONS
+    from .tracing import span
+except ImportError:  # run as a script from this directory
+    from instrumentation import timed, SCF_ITERATIONS
+    from tracing import span
+
+
+class SCFConvergenceError(RuntimeError):
+    """The SCF stopped at ``max_iter`` without converging"""
+
+
+def get_jk(ERI, D):
+    """Coulomb and exchange matrices from the full ERI array or a J/K builder from ``integrals``"""
+    if isinstance(ERI, np.ndarray):
+        J = np.einsum('pqrs,rs->pq', ERI, D)  # Coulomb
+        K = np.einsum('prqs,rs->pq', ERI, D)  # Exchange
+        return J, K
+    return ERI.get_jk(D)
+
+
+@timed('scf')
+def run_scf(S, T, V, ERI, mol, max_iter=50, convergence=1e-6, return_energies=False, return_orbitals=False,
+            return_converged=False, D0=None):
+    if max_iter < 1:
+        raise ValueError(f'max_iter must be at least 1, got {max_iter}')
     H_core = T + V
     num_basis = H_core.shape[0]
     num_electrons = mol.n_electrons
@@ -9,20 +34,42 @@ def run_scf(S, T, V, ERI, mol, max_iter=50, convergence=1e-6, return_energies=Fa
     eigvals, eigvecs = np.linalg.eigh(S)
     S_half = eigvecs @ np.diag(1.0 / np.sqrt(eigvals)) @ eigvecs.T
 
-    D = np.zeros((num_basis, num_basis))  # Initial density matrix
+    # Symmetry-adapted blocks: the Fock matrix is block diagonal over irreps
+    blocks = []
+    for so in (getattr(mol, 'symm_orb', None) or []):
+        if so.shape[1] == 0:
+            continue
+        s_vals, s_vecs = np.linalg.eigh(so.T @ S @ so)
+        blocks.append(so @ s_vecs @ np.diag(1.0 / np.sqrt(s_vals)) @ s_vecs.T)
+
+    # Initial density matrix: empty, or e.g. the converged density of a nearby geometry
+    D = np.zeros((num_basis, num_basis)) if D0 is None else np.array(D0)
     energy_old = 0.0
     energies = []
+    converged = False
 
     for iteration in range(max_iter):
         # Build Fock matrix
-        J = np.einsum('pqrs,rs->pq', ERI, D)  # Coulomb
-        K = np.einsum('prqs,rs->pq', ERI, D)  # Exchange
-        F = H_core + 2 * J - K
+        with span('scf.fock', iteration=iteration + 1):
+            J, K = get_jk(ERI, D)
+            F = H_core + 2 * J - K
 
         # Solve Roothaan equations
-        F_prime = S_half.T @ F @ S_half
-        eps, C_prime = np.linalg.eigh(F_prime)
-        C = S_half @ C_prime
+        with span('scf.diagonalize', iteration=iteration + 1):
+            if blocks:
+                eps_blocks, C_blocks = [], []
+                for X in blocks:
+                    eps_b, C_b = np.linalg.eigh(X.T @ F @ X)
+                    eps_blocks.append(eps_b)
+                    C_blocks.append(X @ C_b)
+                eps = np.concatenate(eps_blocks)
+                order = np.argsort(eps, kind='stable')
+                eps = eps[order]
+                C = np.hstack(C_blocks)[:, order]
+            else:
+                F_prime = S_half.T @ F @ S_half
+                eps, C_prime = np.linalg.eigh(F_prime)
+                C = S_half @ C_prime
 
         # Build new density matrix
         num_occ = num_electrons // 2
@@ -33,6 +80,7 @@ def run_scf(S, T, V, ERI, mol, max_iter=50, convergence=1e-6, return_energies=Fa
         E_elec = np.sum((D_new + D) * H_core) + np.sum((D_new + D) * (J - 0.5 * K))
         energies.append(E_elec)
         if abs(E_elec - energy_old) < convergence:
+            converged = True
             print(f'SCF converged in {iteration+1} iterations.')
             print(f'Total Electronic Energy: {E_elec:.6f} a.u.')
             break
@@ -41,7 +89,14 @@ def run_scf(S, T, V, ERI, mol, max_iter=50, convergence=1e-6, return_energies=Fa
         energy_old = E_elec
     else:
         print('SCF did not converge.')
+    SCF_ITERATIONS.observe(len(energies))
 
+    result = (E_elec,)
     if return_energies:
-        return E_elec, energies
-    return E_elec
+        result += (energies,)
+    if return_orbitals:
+        # Converged MO coefficients, orbital energies and density (C_occ C_occ^T)
+        result += ((C, eps, D_new),)
+    if return_converged:
+        result += (converged,)
+    return result if len(result) > 1 else E_elec
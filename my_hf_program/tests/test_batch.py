@@ -0,0 +1,56 @@
+import json
+from my_hf_program.batch import load_records, run_batch
+
+H2 = "2\nhydrogen\nH 0.0 0.0 0.0\nH 0.0 0.0 0.74\n"
+LIH = "2\nlithium hydride\nLi 0.0 0.0 0.0\nH 0.0 0.0 1.60\n"
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_load_records_drops_failed_and_truncated_lines(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    output.write_text(json.dumps({'id': 'a.xyz', 'energy': -1.0}) + '\n'
+                      + json.dumps({'id': 'b.xyz', 'error': 'ValueError: bad'}) + '\n'
+                      + '{"id": "c.xyz", "ener')
+    records = load_records(str(output))
+    assert list(records) == ['a.xyz']
+    assert read_jsonl(output) == [{'id': 'a.xyz', 'energy': -1.0}]
+    assert load_records(str(tmp_path / 'missing.jsonl')) == {}
+
+
+def test_resume_skips_recorded_molecules(tmp_path):
+    h2, lih = tmp_path / 'h2.xyz', tmp_path / 'lih.xyz'
+    h2.write_text(H2)
+    lih.write_text(LIH)
+    output = str(tmp_path / 'results.jsonl')
+    counts = run_batch([str(h2)], output=output, max_workers=1)
+    assert counts['computed'] == 1
+    energy = read_jsonl(output)[0]['energy']
+
+    # An interrupted run left half a record behind
+    with open(output, 'a') as f:
+        f.write('{"id": "' + str(lih))
+    counts = run_batch([str(h2), str(lih)], output=output, resume=True, max_workers=1)
+    assert (counts['skipped'], counts['computed'], counts['failed']) == (1, 1, 0)
+    records = read_jsonl(output)
+    assert [record['id'] for record in records] == [str(h2), str(lih)]
+    assert records[0]['energy'] == energy
+
+    counts = run_batch([str(h2), str(lih)], output=output, resume=True, max_workers=1)
+    assert (counts['skipped'], counts['computed']) == (2, 0)
+    assert len(read_jsonl(output)) == 2
+
+
+def test_repeated_molecule_is_computed_once(tmp_path):
+    h2, shifted = tmp_path / 'h2.xyz', tmp_path / 'shifted.xyz'
+    h2.write_text(H2)
+    shifted.write_text("2\n\nH 1.0 1.0 1.0\nH 1.0 1.74 1.0\n")
+    output = str(tmp_path / 'results.jsonl')
+    counts = run_batch([str(h2), str(shifted)], output=output, max_workers=1)
+    assert (counts['computed'], counts['repeated']) == (1, 1)
+    first, repeat = read_jsonl(output)
+    assert repeat['duplicate_of'] == first['id']
+    assert repeat['energy'] == first['energy']
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from pyscf import gto, scf
+from my_hf_program.molecule import Molecule
+from my_hf_program.gradients import compute_rhf_gradient, energy_and_gradient
+from my_hf_program.optimize_geometry import optimize_geometry
+from my_hf_program.scf import SCFConvergenceError
+from my_hf_program.utils import ANGSTROM_TO_BOHR
+
+# Slightly distorted water, so that every gradient component is nonzero
+WATER = [('O', [0.0, 0.0, 0.12]), ('H', [0.0, 0.78, -0.45]), ('H', [0.05, -0.74, -0.50])]
+
+
+def test_gradient_matches_pyscf():
+    energy, grad, _, _ = energy_and_gradient(Molecule(WATER), basis='sto-3g', convergence=1e-10)
+    mf = scf.RHF(gto.M(atom=WATER, basis='sto-3g', verbose=0))
+    mf.conv_tol = 1e-12
+    assert energy == pytest.approx(mf.kernel(), abs=1e-8)
+    assert np.allclose(grad, mf.nuc_grad_method().kernel(), atol=1e-6)
+
+
+def test_gradient_matches_finite_difference():
+    _, grad, _, _ = energy_and_gradient(Molecule(WATER), basis='sto-3g', convergence=1e-10)
+    step = 1e-3  # Bohr
+    for atom, axis in [(0, 2), (1, 1), (2, 0)]:
+        displaced = []
+        for sign in (1, -1):
+            atoms = [(symbol, list(xyz)) for symbol, xyz in WATER]
+            atoms[atom][1][axis] += sign * step / ANGSTROM_TO_BOHR
+            displaced.append(energy_and_gradient(Molecule(atoms), basis='sto-3g', convergence=1e-10)[0])
+        assert (displaced[0] - displaced[1]) / (2 * step) == pytest.approx(grad[atom, axis], abs=1e-5)
+
+
+def test_unconverged_scf_is_refused():
+    with pytest.raises(SCFConvergenceError):
+        compute_rhf_gradient(Molecule(WATER), 'sto-3g', None, None, None, converged=False)
+
+
+def test_inhouse_optimization_matches_pyscf(tmp_path):
+    xyz = tmp_path / 'h2.xyz'
+    xyz.write_text("2\nstretched hydrogen\nH 0.0 0.0 0.0\nH 0.0 0.0 0.80\n")
+    results = {engine: optimize_geometry(str(xyz), output_dir=None, engine=engine) for engine in ('pyscf', 'inhouse')}
+    assert results['inhouse']['converged']
+    assert results['inhouse']['energy'] == pytest.approx(results['pyscf']['energy'], abs=1e-6)
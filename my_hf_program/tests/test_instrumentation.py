@@ -0,0 +1,37 @@
+from my_hf_program.instrumentation import Registry
+
+
+def bucket_lines(text, name):
+    return [line for line in text.splitlines() if line.startswith(f"{name}_bucket")]
+
+
+def test_histogram_renders_every_cumulative_bucket():
+    registry = Registry()
+    histogram = registry.histogram("test_seconds", "Test durations", buckets=(0.1, 1.0, 10.0))
+    histogram.observe(0.5, stage="scf")
+    histogram.observe(5.0, stage="scf")
+    text = registry.render()
+    assert bucket_lines(text, "test_seconds") == [
+        'test_seconds_bucket{le="0.1",stage="scf"} 0',
+        'test_seconds_bucket{le="1",stage="scf"} 1',
+        'test_seconds_bucket{le="10",stage="scf"} 2',
+        'test_seconds_bucket{le="+Inf",stage="scf"} 2',
+    ]
+    assert 'test_seconds_sum{stage="scf"} 5.5' in text
+    assert 'test_seconds_count{stage="scf"} 2' in text
+    assert "# TYPE test_seconds histogram" in text
+
+
+def test_merged_samples_fill_missing_buckets():
+    source, target = Registry(), Registry()
+    for registry in (source, target):
+        registry.histogram("test_seconds", "Test durations", buckets=(1.0, 10.0))
+    source._metrics["test_seconds"].observe(20.0, stage="scf")
+    # Samples from an older process that only recorded the buckets it hit
+    partial = [(name, labels, value) for name, labels, value in source.drain() if labels.get("le") != "1"]
+    text = target.render(extra_samples=partial)
+    assert bucket_lines(text, "test_seconds") == [
+        'test_seconds_bucket{le="1",stage="scf"} 0',
+        'test_seconds_bucket{le="10",stage="scf"} 0',
+        'test_seconds_bucket{le="+Inf",stage="scf"} 1',
+    ]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from my_hf_program.molecule import Molecule
+from my_hf_program.integrals import ERI_STRATEGIES, build_pyscf_mol, get_integrals
+from my_hf_program.memory_planner import make_rhf
+from my_hf_program.scf import run_scf
+
+WATER = [('O', [0.0, 0.0, 0.12]), ('H', [0.0, 0.78, -0.45]), ('H', [0.05, -0.74, -0.50])]
+
+
+@pytest.fixture(scope='module')
+def reference():
+    # J/K of the converged SCF density from the full in-core ERIs
+    mol = Molecule(WATER)
+    S, T, V, eri = get_integrals(mol, basis='6-31g')
+    _, (_, _, D) = run_scf(S, T, V, eri, mol, return_orbitals=True)
+    return D, np.einsum('pqrs,rs->pq', eri, D), np.einsum('prqs,rs->pq', eri, D)
+
+
+@pytest.mark.parametrize('strategy', sorted(ERI_STRATEGIES))
+def test_jk_matches_incore(strategy, reference):
+    D, J_ref, K_ref = reference
+    _, _, _, eri = get_integrals(Molecule(WATER), basis='6-31g', strategy=strategy)
+    try:
+        J, K = eri.get_jk(D)
+    finally:
+        if hasattr(eri, 'close'):
+            eri.close()
+    # Density fitting approximates the ERIs; every other strategy is exact
+    atol = 5e-3 if strategy == 'density_fit' else 1e-10
+    assert np.allclose(J, J_ref, atol=atol)
+    assert np.allclose(K, K_ref, atol=atol)
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        get_integrals(Molecule(WATER), strategy='semidirect')
+
+
+def test_prebuilt_pyscf_mol_is_reused(monkeypatch):
+    mol = Molecule(WATER)
+    pyscf_mol = build_pyscf_mol(mol, '6-31g')
+
+    def rebuild(*args, **kwargs):
+        raise AssertionError('the PySCF molecule was built again')
+
+    monkeypatch.setattr('my_hf_program.integrals.build_pyscf_mol', rebuild)
+    S, _, _, _ = get_integrals(mol, basis='6-31g', strategy='packed', pyscf_mol=pyscf_mol)
+    assert np.allclose(S, pyscf_mol.intor('int1e_ovlp'))
+
+
+def test_direct_rhf_never_holds_the_integrals():
+    pyscf_mol = build_pyscf_mol(Molecule(WATER), '6-31g')
+    pyscf_mol.verbose = 0
+    packed, direct = make_rhf(pyscf_mol, 'packed', 4000), make_rhf(pyscf_mol, 'direct', 4000)
+    assert abs(direct.kernel() - packed.kernel()) < 1e-8
+    assert packed._eri is not None and direct._eri is None
@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from my_hf_program.molecule import read_xyz_frames
+from my_hf_program.optimize_geometry import optimize_geometry
+
+MOLECULES = {
+    'h2': "2\nhydrogen\nH 0.0 0.0 0.0\nH 0.0 0.0 0.80\n",
+    'lih': "2\nlithium hydride\nLi 0.0 0.0 0.0\nH 0.0 0.0 1.70\n",
+}
+
+
+def test_concurrent_runs_write_to_their_own_directories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    jobs = {}
+    for name, xyz in MOLECULES.items():
+        job_dir = tmp_path / name
+        job_dir.mkdir()
+        (job_dir / 'input.xyz').write_text(xyz)
+        jobs[name] = job_dir
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        results = dict(zip(jobs, pool.map(
+            lambda job_dir: optimize_geometry(str(job_dir / 'input.xyz'), output_dir=str(job_dir)), jobs.values())))
+    for name, job_dir in jobs.items():
+        symbols = [symbol for symbol, _ in read_xyz_frames(str(job_dir / 'optimized.xyz'))[0][1]]
+        assert symbols == [line.split()[0] for line in MOLECULES[name].splitlines()[2:]]
+        assert (job_dir / 'geometry_trajectory.xyz').read_text() == results[name]['trajectory_xyz']
+    assert not os.path.exists(tmp_path / 'optimized.xyz')
+
+
+def test_in_memory_results_write_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    xyz = tmp_path / 'h2.xyz'
+    xyz.write_text(MOLECULES['h2'])
+    result = optimize_geometry(str(xyz), output_dir=None)
+    assert result['optimized_xyz'].startswith('2\n')
+    assert len(result['trajectory_xyz'].splitlines()) == 4 * len(result['trajectory'])
+    assert sorted(os.listdir(tmp_path)) == ['h2.xyz']
+
+
+def test_each_geometry_is_evaluated_and_reported_once(tmp_path):
+    xyz = tmp_path / 'lih.xyz'
+    xyz.write_text(MOLECULES['lih'])
+    events = []
+    result = optimize_geometry(str(xyz), output_dir=None, callback=events.append)
+    assert [event['step'] for event in events] == list(range(1, len(result['trajectory']) + 1))
+    assert len(result['energies']) == len(result['trajectory'])
+    geometries = {tuple(map(tuple, frame)) for frame in result['trajectory']}
+    assert len(geometries) == len(result['trajectory'])
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from my_hf_program.result_cache import ResultCache, canonicalize, to_canonical, from_canonical, cache_key
+from my_hf_program.utils import ANGSTROM_TO_BOHR
+
+SYMBOLS = ['C', 'O', 'H', 'H']
+FORMALDEHYDE = np.array([[0.0, 0.0, -0.53], [0.0, 0.0, 0.68], [0.0, 0.94, -1.12], [0.0, -0.94, -1.12]])
+
+
+def random_rotation(seed):
+    q, r = np.linalg.qr(np.random.default_rng(seed).standard_normal((3, 3)))
+    q = q * np.sign(np.diag(r))
+    return q if np.linalg.det(q) > 0 else -q
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_fingerprint_is_invariant_to_rotation_translation_and_order(seed):
+    reference, _ = canonicalize(SYMBOLS, FORMALDEHYDE)
+    order = np.random.default_rng(seed).permutation(len(SYMBOLS))
+    moved = FORMALDEHYDE @ random_rotation(seed).T + [1.5, -2.0, 0.3]
+    fingerprint, _ = canonicalize([SYMBOLS[i] for i in order], moved[order])
+    assert fingerprint == reference
+    assert cache_key(fingerprint, basis='sto-3g') == cache_key(reference, basis='sto-3g')
+
+
+def test_different_geometries_differ():
+    stretched = FORMALDEHYDE.copy()
+    stretched[1, 2] += 0.05
+    assert canonicalize(SYMBOLS, stretched)[0] != canonicalize(SYMBOLS, FORMALDEHYDE)[0]
+    fingerprint = canonicalize(SYMBOLS, FORMALDEHYDE)[0]
+    assert cache_key(fingerprint, basis='sto-3g') != cache_key(fingerprint, basis='6-31g')
+
+
+def test_canonical_coordinates_map_back():
+    coords = FORMALDEHYDE @ random_rotation(7).T + [0.2, 0.4, -1.0]
+    _, transform = canonicalize(SYMBOLS, coords)
+    assert np.allclose(from_canonical(to_canonical(coords, transform), transform), coords)
+
+
+def test_cached_result_is_returned_in_the_callers_frame(tmp_path):
+    bohr = FORMALDEHYDE * ANGSTROM_TO_BOHR
+    result = {'coords': bohr, 'trajectory': [bohr * 1.01, bohr], 'energy': -112.35, 'energies': [-112.3, -112.35],
+              'converged': True}
+    ResultCache(str(tmp_path)).store(SYMBOLS, FORMALDEHYDE, result, basis='sto-3g')
+
+    rotation = random_rotation(3)
+    moved = FORMALDEHYDE @ rotation.T + [0.5, 0.0, -0.5]
+    cache = ResultCache(str(tmp_path))  # a fresh process: read from disk
+    hit = cache.lookup(SYMBOLS, moved, basis='sto-3g')
+    assert hit['energy'] == -112.35
+    assert np.allclose(hit['coords'] / ANGSTROM_TO_BOHR, moved, atol=1e-8)
+    assert cache.lookup(SYMBOLS, moved, basis='6-31g') is None
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,31 @@
+import pytest
+from my_hf_program.molecule import Molecule
+from my_hf_program.integrals import get_integrals
+from my_hf_program.scf import run_scf
+
+H2 = [('H', [0.0, 0.0, 0.0]), ('H', [0.0, 0.0, 0.74])]
+
+
+@pytest.fixture(scope='module')
+def h2():
+    mol = Molecule(H2)
+    return (*get_integrals(mol), mol)
+
+
+def test_converges(h2):
+    E_elec, energies, converged = run_scf(*h2, return_energies=True, return_converged=True)
+    assert converged
+    assert E_elec == pytest.approx(-1.8310, abs=1e-3)
+    assert energies[-1] == E_elec
+
+
+def test_stops_unconverged_at_max_iter(h2):
+    E_elec, energies, converged = run_scf(*h2, max_iter=1, return_energies=True, return_converged=True)
+    assert not converged
+    assert energies == [E_elec]
+
+
+@pytest.mark.parametrize('max_iter', [0, -1])
+def test_rejects_max_iter_below_one(h2, max_iter):
+    with pytest.raises(ValueError):
+        run_scf(*h2, max_iter=max_iter)
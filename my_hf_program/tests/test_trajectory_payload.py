@@ -0,0 +1,43 @@
+import base64
+import json
+import numpy as np
+from my_hf_program.visualize_trajectory_py3dmol import encode_trajectory, decimate_frames
+
+
+def decode_trajectory(payload):
+    # Python mirror of decode() in viewer/viewer.js
+    first = np.frombuffer(base64.b64decode(payload['first']), dtype='<i4')
+    dtype = '<i2' if payload['dtype'] == 'int16' else '<i4'
+    deltas = np.frombuffer(base64.b64decode(payload['deltas']), dtype=dtype).astype(np.int64)
+    values = np.concatenate([first, deltas]).reshape(-1, len(first)).cumsum(axis=0)
+    return values.reshape(len(payload['steps']), -1, 3) * payload['precision']
+
+
+def relaxation(n_frames, n_atoms, step=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(-3, 3, (n_atoms, 3))
+    return [start + step * rng.standard_normal((n_atoms, 3)) * (n_frames - i) / n_frames for i in range(n_frames)]
+
+
+def test_round_trip_within_precision():
+    trajectory = relaxation(12, 5)
+    payload = json.loads(json.dumps(encode_trajectory(['C', 'H', 'H', 'H', 'H'], trajectory)))
+    assert payload['dtype'] == 'int16'
+    assert payload['steps'] == list(range(1, 13))
+    assert np.allclose(decode_trajectory(payload), trajectory, atol=payload['precision'] / 2 + 1e-12)
+
+
+def test_large_jumps_fall_back_to_int32():
+    trajectory = [np.zeros((2, 3)), np.full((2, 3), 1.0)]  # 1 Angstrom = 100000 quanta
+    payload = encode_trajectory(['H', 'H'], trajectory)
+    assert payload['dtype'] == 'int32'
+    assert np.allclose(decode_trajectory(payload), trajectory, atol=1e-5)
+
+
+def test_selected_steps():
+    trajectory = relaxation(20, 3, step=0.001)
+    steps = decimate_frames(trajectory, min_rmsd=0.01)
+    assert 1 < len(steps) < len(trajectory)
+    payload = encode_trajectory(['O', 'H', 'H'], trajectory, steps=steps, precision=1e-4)
+    assert payload['steps'] == [step + 1 for step in steps]
+    assert np.allclose(decode_trajectory(payload), [trajectory[step] for step in steps], atol=5e-5 + 1e-12)
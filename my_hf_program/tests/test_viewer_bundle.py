@@ -0,0 +1,17 @@
+import importlib
+import os
+from my_hf_program import viewer_bundle
+
+
+def test_vendor_dir_can_live_outside_the_source_tree(tmp_path, monkeypatch):
+    monkeypatch.setenv('QC_VIEWER_VENDOR_DIR', str(tmp_path))
+    try:
+        bundle = importlib.reload(viewer_bundle)
+        assert bundle.bundle_path('3Dmol-min.js') == os.path.join(str(tmp_path), '3Dmol-min.js')
+        assert bundle.bundle_path('viewer.js') == os.path.join(bundle.BUNDLE_DIR, 'viewer.js')
+        (tmp_path / '3Dmol-min.js').write_text('// 3Dmol')
+        assert bundle.is_vendored()
+        assert bundle.vendor() == str(tmp_path / '3Dmol-min.js')  # already there: no download
+    finally:
+        monkeypatch.delenv('QC_VIEWER_VENDOR_DIR')
+        importlib.reload(viewer_bundle)
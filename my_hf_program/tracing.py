@@ -0,0 +1,262 @@
+"""
+Lightweight tracing of nested spans for finding hot spots in single runs
+
+Where ``instrumentation`` aggregates timings for monitoring, a trace keeps
+every span of one run with its parent/child structure:
+
+- wall time and process CPU time (including BLAS threads) per span,
+- peak Python/NumPy memory allocated while the span was open (tracemalloc),
+- shapes and sizes of the arrays returned by ``@traced`` functions,
+- every ``timed(stage)`` block of ``instrumentation`` becomes a span too.
+
+Tracing is off by default and then costs one attribute check per span. It
+is switched on by the ``QC_TRACE`` environment variable (``1`` writes
+``trace.json``, any other value is the output path; ``QC_TRACE_MEMORY=0``
+skips memory tracking, which slows allocation-heavy code), by the
+``--trace[=file]`` flag of ``main.py`` and ``optimize_geometry.py``, or by
+``enable_tracing()``. The output is Chrome trace-event JSON, readable in
+chrome://tracing or https://ui.perfetto.dev.
+
+Usage as module:
+    from tracing import span, traced, enable_tracing
+
+    enable_tracing('trace.json')
+
+    @traced('integrals.int2e')
+    def eri(mol):
+        ...
+
+    with span('scf.iteration', iteration=3):
+        ...
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+from functools import wraps
+
+import numpy as np
+
+
+class _NoSpan:
+    """Shared do-nothing span returned while tracing is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def add_arrays(self, label, value):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+def array_info(value):
+    """Shapes and total bytes of the NumPy arrays in ``value`` (an array, or a tuple/list/dict of them)"""
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, np.ndarray):
+        arrays = [value]
+    elif isinstance(value, (tuple, list)):
+        arrays = [item for item in value if isinstance(item, np.ndarray)]
+    else:
+        arrays = []
+    if not arrays:
+        return {}
+    return {'shapes': [list(array.shape) for array in arrays], 'bytes': int(sum(array.nbytes for array in arrays))}
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'attrs', 'wall0', 'cpu0', 'mem0', 'peak')
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add_arrays(self, label, value):
+        info = array_info(value)
+        if info:
+            self.attrs[f'{label}_shapes'] = info['shapes']
+            self.attrs[f'{label}_bytes'] = info['bytes']
+
+    def __enter__(self):
+        self.tracer._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._exit(self)
+        return False
+
+
+class Tracer:
+    """Collects finished spans as Chrome trace events"""
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.path = None
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+        self._atexit = False
+        self._written = 0
+
+    def enable(self, path='trace.json', memory=True):
+        """Start recording spans; they are written to ``path`` at exit (or by ``write()``)"""
+        self.path = path
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+        if not self._atexit:
+            atexit.register(self._write_at_exit)
+            self._atexit = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs) if self.enabled else NO_SPAN
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, span):
+        stack = self._stack()
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # The peak counter is shared: bank the parent's peak before restarting it for the child
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            span.mem0 = span.peak = current
+        stack.append(span)
+        span.cpu0 = time.process_time_ns()
+        span.wall0 = time.perf_counter_ns()
+
+    def _exit(self, span):
+        wall1 = time.perf_counter_ns()
+        cpu1 = time.process_time_ns()
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        args = dict(span.attrs)
+        args['cpu_ms'] = round((cpu1 - span.cpu0) / 1e6, 3)
+        if self.memory:
+            span.peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, span.peak)
+            args['peak_alloc_kb'] = round((span.peak - span.mem0) / 1024, 1)
+        event = {
+            'name': span.name,
+            'cat': span.name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': (span.wall0 - self._origin) / 1000,
+            'dur': (wall1 - span.wall0) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """Per span name: calls, total wall and CPU ms and the largest peak allocation, slowest first"""
+        rows = {}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            row = rows.setdefault(event['name'], {'name': event['name'], 'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0,
+                                                  'peak_alloc_kb': 0.0})
+            row['calls'] += 1
+            row['wall_ms'] += event['dur'] / 1000
+            row['cpu_ms'] += event['args']['cpu_ms']
+            row['peak_alloc_kb'] = max(row['peak_alloc_kb'], event['args'].get('peak_alloc_kb', 0.0))
+        return sorted(rows.values(), key=lambda row: -row['wall_ms'])
+
+    def print_summary(self, limit=20):
+        print(f"{'span':<32}{'calls':>7}{'wall ms':>12}{'cpu ms':>12}{'peak KB':>12}")
+        for row in self.summary()[:limit]:
+            print(f"{row['name']:<32}{row['calls']:>7}{row['wall_ms']:>12.2f}{row['cpu_ms']:>12.2f}"
+                  f"{row['peak_alloc_kb']:>12.1f}")
+
+    def write(self, path=None):
+        """Write the recorded spans as Chrome trace-event JSON; returns the path"""
+        path = path or self.path or 'trace.json'
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        self._written = len(events)
+        return path
+
+    def _write_at_exit(self):
+        if len(self.events) > self._written:
+            print(f"Trace written to {self.write()}")
+
+
+TRACER = Tracer()
+
+
+def span(name, **attrs):
+    """Context manager timing a block as a span named ``name``; a no-op unless tracing is enabled"""
+    if not TRACER.enabled:
+        return NO_SPAN
+    return Span(TRACER, name, attrs)
+
+
+def traced(name=None):
+    """Decorator recording each call as a span, with the shapes and sizes of the returned arrays"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with Span(TRACER, span_name, {}) as s:
+                result = func(*args, **kwargs)
+                s.add_arrays('result', result)
+            return result
+        return wrapper
+    return decorator
+
+
+def enable_tracing(path='trace.json', memory=None):
+    """Turn tracing on; ``memory`` defaults to the QC_TRACE_MEMORY setting (on)"""
+    if memory is None:
+        memory = os.environ.get('QC_TRACE_MEMORY', '1') not in ('', '0')
+    TRACER.enable(path, memory)
+    return TRACER
+
+
+def trace_flag(argv):
+    """Output path requested with ``--trace`` or ``--trace=file`` in ``argv``, or None"""
+    for arg in argv:
+        if arg == '--trace':
+            return 'trace.json'
+        if arg.startswith('--trace='):
+            return arg.split('=', 1)[1]
+    return None
+
+
+_env_trace = os.environ.get('QC_TRACE', '')
+if _env_trace not in ('', '0'):
+    enable_tracing('trace.json' if _env_trace == '1' else _env_trace)
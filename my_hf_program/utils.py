@@ -1,7 +1,11 @@
 import numpy as np
 
+BOHR_TO_ANGSTROM = 0.52917721092
+ANGSTROM_TO_BOHR = 1.0 / BOHR_TO_ANGSTROM
+
 def compute_nuclear_repulsion(mol):
-    coords = mol.get_nuclear_coords()
+    # Molecule coordinates are in Angstrom; the energy is in atomic units
+    coords = np.array(mol.get_nuclear_coords()) * ANGSTROM_TO_BOHR
     Z = mol.get_atomic_numbers()
     E_nuc = 0.0
     n = len(Z)
@@ -10,3 +14,12 @@ def compute_nuclear_repulsion(mol):
             R = np.linalg.norm(np.array(coords[i]) - np.array(coords[j]))
             E_nuc += Z[i] * Z[j] / R
     return E_nuc
+
+def compute_nuclear_repulsion_gradient(mol):
+    # dE_nuc/dR_A in Hartree/Bohr, shape (n_atoms, 3)
+    coords = np.array(mol.get_nuclear_coords()) * ANGSTROM_TO_BOHR
+    Z = np.array(mol.get_atomic_numbers(), dtype=float)
+    diff = coords[:, None, :] - coords[None, :, :]
+    dist = np.linalg.norm(diff, axis=-1)
+    np.fill_diagonal(dist, np.inf)
+    return -np.einsum('a,b,abx->ax', Z, Z, diff / dist[:, :, None] ** 3)
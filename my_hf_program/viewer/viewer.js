@@ -0,0 +1,151 @@
+/*
+ * Trajectory viewer bundle (see viewer_bundle.py)
+ *
+ * Plays a compact trajectory payload (visualize_trajectory_py3dmol.encode_trajectory)
+ * with 3Dmol.js. A page provides <div id="qc-viewer"> and the payload, either inline
+ * in <script type="application/json" id="trajectory-data"> or as a URL in that
+ * element's data-src attribute.
+ */
+(function () {
+    "use strict";
+
+    function base64Bytes(text) {
+        const binary = atob(text);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+        return bytes.buffer;
+    }
+
+    // Undo the delta encoding into one integer array of all frames
+    function decode(payload) {
+        const first = new Int32Array(base64Bytes(payload.first));
+        const deltas = payload.dtype === "int16" ? new Int16Array(base64Bytes(payload.deltas))
+                                                 : new Int32Array(base64Bytes(payload.deltas));
+        const n = first.length;
+        const values = new Int32Array(n + deltas.length);
+        values.set(first);
+        for (let i = n; i < values.length; i++) values[i] = values[i - n] + deltas[i - n];
+        return {
+            symbols: payload.symbols,
+            steps: payload.steps,
+            precision: payload.precision,
+            coords: values,
+            count: payload.steps.length
+        };
+    }
+
+    function frameXYZ(trajectory, i) {
+        const n = trajectory.symbols.length;
+        const digits = Math.max(0, Math.ceil(-Math.log10(trajectory.precision)));
+        const lines = [String(n), `Step ${trajectory.steps[i]}`];
+        for (let a = 0; a < n; a++) {
+            const base = (i * n + a) * 3;
+            const xyz = [0, 1, 2].map(k => (trajectory.coords[base + k] * trajectory.precision).toFixed(digits));
+            lines.push(trajectory.symbols[a] + " " + xyz.join(" "));
+        }
+        return lines.join("\n") + "\n";
+    }
+
+    function element(tag, attributes, text) {
+        const el = document.createElement(tag);
+        Object.keys(attributes || {}).forEach(key => el.setAttribute(key, attributes[key]));
+        if (text !== undefined) el.textContent = text;
+        return el;
+    }
+
+    function buildControls(root, count) {
+        const container = element("div", {class: "qc-container"});
+        container.appendChild(element("h1", {}, "Molecular Trajectory Visualization"));
+        const viewport = container.appendChild(element("div", {class: "qc-viewport"}));
+        const counter = container.appendChild(element("div", {class: "qc-counter"}));
+        const frameSlider = element("input", {type: "range", min: 0, max: count - 1, value: 0});
+        container.appendChild(element("div", {class: "qc-slider"})).appendChild(frameSlider);
+        const buttons = container.appendChild(element("div", {class: "qc-controls"}));
+        const prev = buttons.appendChild(element("button", {}, "Previous"));
+        const play = buttons.appendChild(element("button", {}, "Play"));
+        const next = buttons.appendChild(element("button", {}, "Next"));
+        const reset = buttons.appendChild(element("button", {}, "Reset View"));
+        const speedBox = container.appendChild(element("div", {class: "qc-slider"}));
+        speedBox.appendChild(element("label", {}, "Animation Speed: "));
+        const speed = speedBox.appendChild(element("input", {type: "range", min: 100, max: 2000, value: 500,
+                                                             class: "qc-speed"}));
+        const speedValue = speedBox.appendChild(element("span", {}, "500 ms"));
+        container.appendChild(element("div", {class: "qc-notes"}))
+            .appendChild(element("p", {}, "Use left/right arrow keys to navigate frames, spacebar to play/pause"));
+        root.appendChild(container);
+        return {viewport, counter, frameSlider, prev, play, next, reset, speed, speedValue};
+    }
+
+    function start(root, trajectory) {
+        const ui = buildControls(root, trajectory.count);
+        const viewer = $3Dmol.createViewer(ui.viewport, {backgroundColor: "white"});
+        let currentFrame = 0;
+        let playInterval = null;
+        let frameDelay = 500;
+
+        function showFrame(frameIndex) {
+            if (frameIndex < 0 || frameIndex >= trajectory.count) return;
+            currentFrame = frameIndex;
+            let counter = `Frame ${frameIndex + 1} / ${trajectory.count}`;
+            if (trajectory.steps[frameIndex] !== frameIndex + 1) counter += ` (step ${trajectory.steps[frameIndex]})`;
+            ui.counter.textContent = counter;
+            ui.frameSlider.value = frameIndex;
+
+            viewer.clear();
+            const model = viewer.addModel(frameXYZ(trajectory, frameIndex), "xyz");
+            model.addBonds();
+            viewer.setStyle({}, {
+                stick: {radius: 0.2, colorscheme: "Jmol"},
+                sphere: {scale: 0.3, colorscheme: "Jmol"}
+            });
+            viewer.center();
+            viewer.zoomTo();
+            viewer.render();
+        }
+
+        function step(offset) {
+            showFrame((currentFrame + offset + trajectory.count) % trajectory.count);
+        }
+
+        function setPlaying(playing) {
+            clearInterval(playInterval);
+            playInterval = playing ? setInterval(() => step(1), frameDelay) : null;
+            ui.play.textContent = playing ? "Pause" : "Play";
+        }
+
+        ui.prev.addEventListener("click", () => step(-1));
+        ui.next.addEventListener("click", () => step(1));
+        ui.play.addEventListener("click", () => setPlaying(playInterval === null));
+        ui.reset.addEventListener("click", () => {
+            viewer.center();
+            viewer.zoomTo();
+            viewer.render();
+        });
+        ui.frameSlider.addEventListener("input", () => showFrame(parseInt(ui.frameSlider.value, 10)));
+        ui.speed.addEventListener("input", () => {
+            frameDelay = parseInt(ui.speed.value, 10);
+            ui.speedValue.textContent = `${frameDelay} ms`;
+            if (playInterval !== null) setPlaying(true);
+        });
+        document.addEventListener("keydown", e => {
+            if (e.key === "ArrowLeft") step(-1);
+            else if (e.key === "ArrowRight") step(1);
+            else if (e.key === " ") {
+                e.preventDefault();
+                setPlaying(playInterval === null);
+            }
+        });
+        showFrame(0);
+    }
+
+    window.QCViewer = {decode, frameXYZ};
+
+    document.addEventListener("DOMContentLoaded", () => {
+        const root = document.getElementById("qc-viewer");
+        const data = document.getElementById("trajectory-data");
+        if (!root || !data) return;
+        const payload = data.dataset.src ? fetch(data.dataset.src).then(r => r.json())
+                                         : Promise.resolve(JSON.parse(data.textContent));
+        payload.then(p => start(root, decode(p)));
+    });
+})();
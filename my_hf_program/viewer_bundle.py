@@ -0,0 +1,107 @@
+"""
+Shared, versioned static bundle for the interactive trajectory viewer
+
+Pages written by ``visualize_trajectory_py3dmol(..., viewer_url=...)`` contain
+only the compact trajectory payload and load the player from this bundle:
+
+- ``viewer.js`` and ``viewer.css`` (in ``viewer/``, no jQuery),
+- ``3Dmol-min.js``, pinned to ``THREEDMOL_VERSION`` and vendored into
+  ``viewer/vendor/`` (or ``QC_VIEWER_VENDOR_DIR``) by ``vendor()`` so that the
+  viewer works without network.
+
+``VIEWER_VERSION`` is derived from the bundle contents, so URLs that include it
+can be cached forever: a changed bundle gets a new URL.
+
+Usage as script:
+    python viewer_bundle.py --vendor              # download the pinned 3Dmol.js (e.g. at image build time)
+    python viewer_bundle.py --output viewer_dir   # copy the bundle for offline use next to generated pages
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import urllib.request
+
+BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'viewer')
+# Outside the source tree if set, e.g. in images where the source is bind-mounted over
+VENDOR_DIR = os.environ.get('QC_VIEWER_VENDOR_DIR') or os.path.join(BUNDLE_DIR, 'vendor')
+THREEDMOL_VERSION = '2.4.2'
+THREEDMOL_URL = f'https://cdn.jsdelivr.net/npm/3dmol@{THREEDMOL_VERSION}/build/3Dmol-min.js'
+BUNDLE_FILES = ('viewer.js', 'viewer.css', '3Dmol-min.js')
+
+
+def bundle_path(filename):
+    """Location of a bundle file on disk (vendored libraries live in ``VENDOR_DIR``)"""
+    if filename not in BUNDLE_FILES:
+        raise ValueError(f"'{filename}' is not part of the viewer bundle")
+    if filename == '3Dmol-min.js':
+        return os.path.join(VENDOR_DIR, filename)
+    return os.path.join(BUNDLE_DIR, filename)
+
+
+def is_vendored():
+    return os.path.exists(bundle_path('3Dmol-min.js'))
+
+
+def _bundle_version():
+    digest = hashlib.sha256(THREEDMOL_VERSION.encode())
+    for filename in ('viewer.js', 'viewer.css'):
+        with open(bundle_path(filename), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+VIEWER_VERSION = _bundle_version()
+
+
+def vendor(force=False):
+    """Download the pinned 3Dmol.js into the bundle; returns its path"""
+    path = bundle_path('3Dmol-min.js')
+    if os.path.exists(path) and not force:
+        return path
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with urllib.request.urlopen(THREEDMOL_URL, timeout=60) as response, open(tmp_path, 'wb') as f:
+        shutil.copyfileobj(response, f)
+    os.replace(tmp_path, path)
+    print(f"Vendored 3Dmol.js {THREEDMOL_VERSION} into {path}")
+    return path
+
+
+def write_viewer_bundle(directory):
+    """
+    Copy the bundle into ``directory`` so that pages generated with
+    ``viewer_url=<relative path to directory>`` open offline
+
+    Returns:
+    --------
+    list of str
+        Paths written
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for filename in BUNDLE_FILES:
+        if not os.path.exists(bundle_path(filename)):
+            print(f"Warning: {filename} is not vendored; run 'python viewer_bundle.py --vendor' first")
+            continue
+        target = os.path.join(directory, filename)
+        shutil.copyfile(bundle_path(filename), target)
+        written.append(target)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the static trajectory viewer bundle")
+    parser.add_argument('--vendor', action='store_true', help=f"download 3Dmol.js {THREEDMOL_VERSION} into the bundle")
+    parser.add_argument('--force', action='store_true', help="re-download even if already vendored")
+    parser.add_argument('--output', help="copy the bundle into this directory")
+    args = parser.parse_args()
+    if args.vendor:
+        vendor(force=args.force)
+    if args.output:
+        write_viewer_bundle(args.output)
+    print(f"Viewer bundle version {VIEWER_VERSION} (3Dmol.js {'vendored' if is_vendored() else 'not vendored'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.colors import LightSource, to_rgb
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from mpl_toolkits.mplot3d import Axes3D
 import imageio
 import os
@@ -39,67 +44,193 @@ def read_xyz_trajectory(filename):
         i += n_atoms + 2
     return symbols, trajectory
 
-# Helper to draw spheres for atoms
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
-
-def draw_sphere(ax, center, radius, color):
-    u, v = np.mgrid[0:2*np.pi:20j, 0:np.pi:10j]
-    x = center[0] + radius * np.cos(u) * np.sin(v)
-    y = center[1] + radius * np.sin(u) * np.sin(v)
-    z = center[2] + radius * np.cos(v)
-    ax.plot_surface(x, y, z, color=color, shade=True, linewidth=0, antialiased=False, alpha=1.0)
-
-
-def animate_trajectory(symbols, trajectory, filename='geometry_optimization.gif'):
-    images = []
-    n_atoms = len(symbols)
-    n_steps = len(trajectory)
-    temp_files = []
-    for step, coords in enumerate(trajectory):
-        fig = plt.figure(figsize=(6,6))
-        ax = fig.add_subplot(111, projection='3d')
-        # Draw bonds (thin lines)
-        for i in range(n_atoms):
-            for j in range(i+1, n_atoms):
-                r1 = coords[i]
-                r2 = coords[j]
-                d = np.linalg.norm(r1 - r2)
-                rad1 = CPK_RADII.get(symbols[i], 0.7)
-                rad2 = CPK_RADII.get(symbols[j], 0.7)
-                if d < 1.2 * (rad1 + rad2):
-                    ax.plot([r1[0], r2[0]], [r1[1], r2[1]], [r1[2], r2[2]], color='gray', linewidth=1.2, alpha=0.7)
-        # Draw atoms as spheres
-        for i, (atom, xyz) in enumerate(zip(symbols, coords)):
-            color = CPK_COLORS.get(atom, '#FF00FF')
-            radius = CPK_RADII.get(atom, 0.7)
-            draw_sphere(ax, xyz, radius, color)
-        ax.set_xlabel('X (Bohr)')
-        ax.set_ylabel('Y (Bohr)')
-        ax.set_zlabel('Z (Bohr)')
-        ax.set_title(f'Geometry Step {step+1}')
-        ax.set_xlim([np.min(trajectory[0][:,0])-2, np.max(trajectory[0][:,0])+2])
-        ax.set_ylim([np.min(trajectory[0][:,1])-2, np.max(trajectory[0][:,1])+2])
-        ax.set_zlim([np.min(trajectory[0][:,2])-2, np.max(trajectory[0][:,2])+2])
-        ax.set_facecolor('white')
-        fig.patch.set_facecolor('white')
-        plt.tight_layout()
-        temp_file = f'_traj_frame_{step}.png'
-        plt.savefig(temp_file, dpi=100)
-        temp_files.append(temp_file)
-        plt.close(fig)
-    for temp_file in temp_files:
-        images.append(imageio.imread(temp_file))
-    imageio.mimsave(filename, images, duration=0.7)
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection, Line3DCollection
+
+
+def unit_sphere_faces(n_u=20, n_v=10):
+    """Quadrilateral faces of a unit sphere, shape (n_faces, 4, 3), on an (n_u, n_v) longitude/latitude grid"""
+    u, v = np.mgrid[0:2*np.pi:n_u*1j, 0:np.pi:n_v*1j]
+    grid = np.stack([np.cos(u) * np.sin(v), np.sin(u) * np.sin(v), np.cos(v)], axis=-1)
+    return np.stack([grid[:-1, :-1], grid[1:, :-1], grid[1:, 1:], grid[:-1, 1:]], axis=2).reshape(-1, 4, 3)
+
+
+def find_bonds(symbols, coords, radii=CPK_RADII, scale=1.2):
+    """Atom index pairs (i < j) closer than ``scale`` times the sum of their radii"""
+    coords = np.asarray(coords)
+    rad = np.array([radii.get(symbol, 0.7) for symbol in symbols])
+    dist = np.linalg.norm(coords[:, None, :] - coords[None, :, :], axis=-1)
+    i, j = np.nonzero(np.triu(dist < scale * (rad[:, None] + rad[None, :]), k=1))
+    return np.stack([i, j], axis=1)
+
+
+class MoleculeRenderer:
+    """
+    Draws a molecule on a 3D axes with two artists, whatever its size
+
+    All atoms are instances of one precomputed unit-sphere mesh in a single
+    Poly3DCollection with per-face colours (shading is baked in once, since
+    translating a sphere does not change its normals), and all bonds are one
+    Line3DCollection. ``update(coords)`` moves the existing artists to a new
+    geometry, so animating a trajectory never rebuilds the figure.
+    """
+
+    def __init__(self, ax, symbols, coords=None, colors=CPK_COLORS, radii=CPK_RADII, n_u=20, n_v=10):
+        self.ax = ax
+        self.symbols = list(symbols)
+        self.radii = radii
+        unit = unit_sphere_faces(n_u, n_v)
+        self._faces = np.array([radii.get(symbol, 0.7) for symbol in self.symbols])[:, None, None, None] * unit
+        normals = unit.mean(axis=1)
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        shade = 0.5 + 0.5 * LightSource(azdeg=225, altdeg=19.4712).shade_normals(normals, fraction=1.0)
+        base = np.array([to_rgb(colors.get(symbol, '#FF00FF')) for symbol in self.symbols])
+        facecolors = np.clip(base[:, None, :] * shade[None, :, None], 0, 1).reshape(-1, 3)
+        if coords is None:
+            coords = np.zeros((len(self.symbols), 3))
+        coords = np.asarray(coords, dtype=float)
+        self.spheres = Poly3DCollection(self._sphere_verts(coords), facecolors=facecolors, edgecolors='none',
+                                        linewidths=0)
+        self.bonds = Line3DCollection(self._bond_segments(coords),
+                                      colors='gray', linewidths=1.2, alpha=0.7)
+        ax.add_collection3d(self.bonds)
+        ax.add_collection3d(self.spheres)
+
+    def _sphere_verts(self, coords):
+        return (coords[:, None, None, :] + self._faces).reshape(-1, 4, 3)
+
+    def _bond_segments(self, coords):
+        pairs = find_bonds(self.symbols, coords, self.radii)
+        # A degenerate segment keeps the collection non-empty when there are no bonds
+        return coords[pairs] if len(pairs) else np.zeros((1, 2, 3))
+
+    def update(self, coords):
+        coords = np.asarray(coords, dtype=float)
+        self.spheres.set_verts(self._sphere_verts(coords))
+        self.bonds.set_segments(self._bond_segments(coords))
+
+
+def trajectory_limits(trajectory, padding=2.0):
+    """Fixed axis limits for all frames: the first geometry's extent plus ``padding`` (Bohr)"""
+    first = np.asarray(trajectory[0])
+    return [(np.min(first[:, k]) - padding, np.max(first[:, k]) + padding) for k in range(3)]
+
+
+def select_frames(n_steps, stride=1):
+    """Indices of every ``stride``-th step, always ending on the final geometry"""
+    indices = list(range(0, n_steps, max(1, int(stride))))
+    if indices and indices[-1] != n_steps - 1:
+        indices.append(n_steps - 1)
+    return indices
+
+
+@lru_cache(maxsize=1)
+def _frame_canvas(symbols, limits, dpi):
+    """Off-screen figure and renderer reused for every frame of one trajectory (one per process)"""
+    fig = Figure(figsize=(6, 6), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111, projection='3d')
+    renderer = MoleculeRenderer(ax, symbols)
+    ax.set_xlabel('X (Bohr)')
+    ax.set_ylabel('Y (Bohr)')
+    ax.set_zlabel('Z (Bohr)')
+    ax.set_xlim(limits[0])
+    ax.set_ylim(limits[1])
+    ax.set_zlim(limits[2])
+    ax.set_facecolor('white')
+    fig.patch.set_facecolor('white')
+    ax.set_title('Geometry Step 1')  # lay out with room for the per-frame title
+    fig.tight_layout()
+    return canvas, ax, renderer
+
+
+def render_frame(symbols, coords, step, limits, dpi=100):
+    """
+    Render one trajectory frame off-screen and return it as an RGB array
+
+    Uses a bare Agg canvas instead of pyplot, so it needs no display and is
+    safe to call from worker processes. Consecutive frames of the same
+    molecule reuse one figure and only update its vertex data.
+    """
+    canvas, ax, renderer = _frame_canvas(tuple(symbols), tuple(tuple(lim) for lim in limits), dpi)
+    renderer.update(coords)
+    ax.set_title(f'Geometry Step {step+1}')
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[:, :, :3].copy()
+
+
+def _render_task(args):
+    return render_frame(*args)
+
+
+def render_frames(symbols, trajectory, stride=1, max_workers=None, dpi=100):
+    """
+    Yield rendered frames (RGB arrays) in trajectory order
+
+    Frames are rendered on a process pool; at most ``2 * max_workers`` frames
+    are in flight, so memory stays bounded however long the trajectory is.
+
+    Parameters:
+    -----------
+    stride : int
+        Render every ``stride``-th step (the final step is always included)
+    max_workers : int, optional
+        Rendering processes; defaults to the CPU count, 1 renders in-process
+    """
+    limits = trajectory_limits(trajectory)
+    tasks = [(symbols, trajectory[step], step, limits, dpi) for step in select_frames(len(trajectory), stride)]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if max_workers <= 1:
+        for task in tasks:
+            yield _render_task(task)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        remaining = iter(tasks)
+        for task in remaining:
+            pending.append(pool.submit(_render_task, task))
+            if len(pending) >= 2 * max_workers:
+                break
+        while pending:
+            frame = pending.popleft().result()
+            task = next(remaining, None)
+            if task is not None:
+                pending.append(pool.submit(_render_task, task))
+            yield frame
+
+
+def animate_trajectory(symbols, trajectory, filename='geometry_optimization.gif', stride=1, max_workers=None,
+                       duration=0.7, dpi=100):
+    """
+    Animate a geometry optimization trajectory as a GIF, or an MP4 if ``filename`` ends in .mp4
+
+    Frames are streamed from ``render_frames`` straight into the encoder;
+    nothing is written to disk except ``filename``. MP4 output needs the
+    ``imageio-ffmpeg`` package.
+
+    Parameters:
+    -----------
+    stride : int
+        Animate every ``stride``-th step (the final step is always included)
+    max_workers : int, optional
+        Rendering processes; defaults to the CPU count
+    duration : float
+        Seconds per frame
+    """
+    if filename.lower().endswith('.mp4'):
+        writer = imageio.get_writer(filename, fps=1.0 / duration)
+    else:
+        # The GIF writer takes frame durations in milliseconds
+        writer = imageio.get_writer(filename, mode='I', duration=duration * 1000)
+    with writer:
+        for frame in render_frames(symbols, trajectory, stride=stride, max_workers=max_workers, dpi=dpi):
+            writer.append_data(frame)
     print(f'Geometry trajectory animation saved as {filename}')
-    # Clean up temp files
-    for temp_file in temp_files:
-        try:
-            os.remove(temp_file)
-        except Exception:
-            pass
 
 if __name__ == "__main__":
-    xyz_traj = sys.argv[1] if len(sys.argv) > 1 else 'geometry_trajectory.xyz'
-    out_gif = sys.argv[2] if len(sys.argv) > 2 else 'geometry_optimization.gif'
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg)
+    xyz_traj = args[0] if len(args) > 0 else 'geometry_trajectory.xyz'
+    out_gif = args[1] if len(args) > 1 else 'geometry_optimization.gif'
     symbols, trajectory = read_xyz_trajectory(xyz_traj)
-    animate_trajectory(symbols, trajectory, filename=out_gif)
+    animate_trajectory(symbols, trajectory, filename=out_gif, stride=int(options.get('stride', 1)),
+                       max_workers=int(options['workers']) if 'workers' in options else None)
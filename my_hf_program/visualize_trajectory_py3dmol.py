@@ -12,8 +12,18 @@ The visualization includes:
 - Keyboard shortcuts (arrow keys, spacebar)
 - Automatic view centering and zoom
 
+Long trajectories can be written compactly: ``compact=True`` sends the symbols
+once and the coordinates as base64, quantized, delta-encoded typed arrays that
+the page decodes; ``min_rmsd`` drops frames that barely move; ``sidecar=True``
+moves the payload into a JSON file fetched after the page has loaded.
+
+With ``viewer_url`` the page holds only the payload and loads the player from
+the shared, versioned viewer bundle (``viewer_bundle.py``), which can be
+vendored for offline use instead of loading 3Dmol.js and jQuery from CDNs.
+
 Usage as script:
-    python visualize_trajectory_py3dmol.py [xyz_trajectory_file] [output_html_file]
+    python visualize_trajectory_py3dmol.py [xyz_trajectory_file] [output_html_file] [--compact] [--sidecar]
+                                           [--min-rmsd=X] [--viewer-url=URL]
 
 Usage as module:
     from visualize_trajectory_py3dmol import visualize_trajectory_py3dmol
@@ -24,9 +34,18 @@ Usage as module:
     # Create visualization
     html_file = visualize_trajectory_py3dmol(symbols, trajectory, 'my_visualization.html')
 """
+import base64
+import json
+import os
 import sys
+from html import escape as html_escape
 import numpy as np
 
+try:
+    from .instrumentation import timed
+except ImportError:  # run as a script from this directory
+    from instrumentation import timed
+
 def read_xyz_trajectory(filename):
     """
     Read a multi-frame XYZ trajectory file
@@ -44,7 +63,13 @@ def read_xyz_trajectory(filename):
         List of coordinate arrays for each step
     """
     with open(filename, 'r') as f:
-        lines = f.readlines()
+        return parse_xyz_trajectory(f.read())
+
+def parse_xyz_trajectory(text):
+    """Parse the contents of a multi-frame XYZ trajectory file (see ``read_xyz_trajectory``)"""
+    lines = text.splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
     trajectory = []
     symbols = []
     i = 0
@@ -62,7 +87,117 @@ def read_xyz_trajectory(filename):
         i += n_atoms + 2
     return symbols, trajectory
 
-def visualize_trajectory_py3dmol(symbols, trajectory, output_html='trajectory_visualization.html'):
+def decimate_frames(trajectory, min_rmsd):
+    """
+    Indices of the frames worth showing: the first, the last, and every frame whose
+    RMSD from the previously kept frame is at least ``min_rmsd``
+    """
+    kept = [0]
+    for i in range(1, len(trajectory) - 1):
+        diff = np.asarray(trajectory[i]) - np.asarray(trajectory[kept[-1]])
+        if np.sqrt(np.mean(np.sum(diff ** 2, axis=1))) >= min_rmsd:
+            kept.append(i)
+    if len(trajectory) > 1:
+        kept.append(len(trajectory) - 1)
+    return kept
+
+
+def encode_trajectory(symbols, trajectory, steps=None, precision=1e-5):
+    """
+    Compact JSON-serialisable payload of a trajectory
+
+    Symbols are stored once. Coordinates are quantized to integer multiples of
+    ``precision``; the first frame is stored as little-endian int32 and every
+    later frame as the difference from the previous one, as int16 when all
+    differences fit (int32 otherwise). Both arrays are base64-encoded.
+
+    Parameters:
+    -----------
+    steps : list of int, optional
+        Indices of the frames to include (default: all), e.g. from ``decimate_frames``
+    """
+    if steps is None:
+        steps = list(range(len(trajectory)))
+    quantized = np.rint(np.array([trajectory[step] for step in steps], dtype=float) / precision).astype(np.int64)
+    deltas = np.diff(quantized, axis=0).ravel()
+    dtype = '<i2' if deltas.size == 0 or np.abs(deltas).max() < 2 ** 15 else '<i4'
+    return {
+        'symbols': list(symbols),
+        'steps': [step + 1 for step in steps],
+        'precision': precision,
+        'first': base64.b64encode(quantized[0].astype('<i4').tobytes()).decode('ascii'),
+        'dtype': 'int16' if dtype == '<i2' else 'int32',
+        'deltas': base64.b64encode(deltas.astype(dtype).tobytes()).decode('ascii'),
+    }
+
+
+BUNDLE_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>Molecular Trajectory Visualization</title>
+    <link rel="stylesheet" href="VIEWER_URL/viewer.css">
+    <script src="VIEWER_URL/3Dmol-min.js"></script>
+    <script src="VIEWER_URL/viewer.js"></script>
+</head>
+<body>
+    <div id="qc-viewer"></div>
+    TRAJECTORY_DATA
+</body>
+</html>
+"""
+
+PLAIN_LOADER = """            const frames = [
+FRAME_DATA
+            ];
+            const frameSteps = FRAME_STEPS;
+            const frameCount = frames.length;
+            function frameXYZ(i) { return frames[i]; }
+            function frameStep(i) { return frameSteps[i]; }
+            function loadFrames(done) { done(); }"""
+
+COMPACT_LOADER = """            let payload = null;
+            let coords = null;
+            const frameCount = FRAME_TOTAL;
+            function base64Bytes(text) {
+                const binary = atob(text);
+                const bytes = new Uint8Array(binary.length);
+                for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+                return bytes.buffer;
+            }
+            function decodeFrames(p) {
+                // Undo the delta encoding into one integer array of all frames
+                const first = new Int32Array(base64Bytes(p.first));
+                const deltas = p.dtype === "int16" ? new Int16Array(base64Bytes(p.deltas))
+                                                   : new Int32Array(base64Bytes(p.deltas));
+                const n = first.length;
+                const values = new Int32Array(n + deltas.length);
+                values.set(first);
+                for (let i = n; i < values.length; i++) values[i] = values[i - n] + deltas[i - n];
+                payload = p;
+                coords = values;
+            }
+            function frameXYZ(i) {
+                const n = payload.symbols.length;
+                const digits = Math.max(0, Math.ceil(-Math.log10(payload.precision)));
+                const lines = [String(n), `Step ${payload.steps[i]}`];
+                for (let a = 0; a < n; a++) {
+                    const base = (i * n + a) * 3;
+                    lines.push(payload.symbols[a] + " " + [0, 1, 2].map(
+                        k => (coords[base + k] * payload.precision).toFixed(digits)).join(" "));
+                }
+                return lines.join("\\n") + "\\n";
+            }
+            function frameStep(i) { return payload.steps[i]; }
+            function loadFrames(done) {
+                PAYLOAD_SOURCE.then(function(p) { decodeFrames(p); done(); });
+            }"""
+
+
+@timed('visualization')
+def visualize_trajectory_py3dmol(symbols, trajectory, output_html='trajectory_visualization.html', compact=False,
+                                 precision=1e-5, min_rmsd=None, sidecar=False, viewer_url=None):
     """
     Create an HTML file with an interactive 3D visualization of the molecular trajectory using py3Dmol.
     
@@ -74,14 +209,58 @@ def visualize_trajectory_py3dmol(symbols, trajectory, output_html='trajectory_vi
         List of coordinate arrays for each step of the trajectory
     output_html : str
         Output HTML file name
+    compact : bool
+        Embed the frames as a compact payload (see ``encode_trajectory``) decoded in
+        the page instead of one XYZ text block per frame
+    precision : float
+        Coordinate resolution of the compact payload
+    min_rmsd : float, optional
+        Drop frames whose RMSD from the last kept frame is below this (see ``decimate_frames``)
+    sidecar : bool
+        Write the compact payload to ``<output_html stem>_frames.json`` and fetch it
+        after the page loads; the page must then be opened over HTTP next to that file
+    viewer_url : str, optional
+        URL (absolute or relative to the page) of the shared viewer bundle (see
+        ``viewer_bundle``); the page then holds only the compact payload and
+        loads no scripts from public CDNs
     """
-    # Convert trajectory to XYZ format strings
-    xyz_frames = []
-    for i, coords in enumerate(trajectory):
-        frame = f"{len(symbols)}\nStep {i+1}\n"
-        for sym, xyz in zip(symbols, coords):
-            frame += f"{sym} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}\n"
-        xyz_frames.append(frame)
+    steps = decimate_frames(trajectory, min_rmsd) if min_rmsd else list(range(len(trajectory)))
+    sidecar_path = None
+    if compact or sidecar or viewer_url:
+        payload = json.dumps(encode_trajectory(symbols, trajectory, steps, precision), separators=(',', ':'))
+        inline_payload = payload.replace("</", "<\\/")  # safe inside a <script> element
+        if sidecar:
+            sidecar_path = os.path.splitext(output_html)[0] + '_frames.json'
+            with open(sidecar_path, 'w') as f:
+                f.write(payload)
+        if viewer_url:
+            viewer_url = html_escape(viewer_url.rstrip('/'))
+            if sidecar:
+                data = f'<script type="application/json" id="trajectory-data" ' \
+                       f'data-src="{html_escape(os.path.basename(sidecar_path))}"></script>'
+            else:
+                data = f'<script type="application/json" id="trajectory-data">{inline_payload}</script>'
+            html = BUNDLE_PAGE.replace("VIEWER_URL", viewer_url).replace("TRAJECTORY_DATA", data)
+            with open(output_html, 'w') as f:
+                f.write(html)
+            print(f"3D visualization saved as '{output_html}' (viewer bundle at {viewer_url})")
+            return output_html
+        if sidecar:
+            frame_loader = COMPACT_LOADER.replace(
+                "PAYLOAD_SOURCE", f'fetch({json.dumps(os.path.basename(sidecar_path))}).then(r => r.json())')
+        else:
+            frame_loader = COMPACT_LOADER.replace(
+                "PAYLOAD_SOURCE", "Promise.resolve(" + inline_payload + ")")
+        frame_loader = frame_loader.replace("FRAME_TOTAL", str(len(steps)))
+    else:
+        # Full XYZ text per frame
+        xyz_frames = []
+        for step in steps:
+            lines = [f"{len(symbols)}", f"Step {step+1}"]
+            lines.extend(f"{sym} {xyz[0]:.6f} {xyz[1]:.6f} {xyz[2]:.6f}" for sym, xyz in zip(symbols, trajectory[step]))
+            xyz_frames.append(json.dumps("\n".join(lines) + "\n"))
+        frame_loader = PLAIN_LOADER.replace("FRAME_DATA", ",\n".join(f"                {frame}" for frame in xyz_frames))
+        frame_loader = frame_loader.replace("FRAME_STEPS", json.dumps([step + 1 for step in steps]))
     
     # Create HTML with JavaScript for 3D visualization using 3Dmol.js
     html = """<!DOCTYPE html>
@@ -192,10 +371,8 @@ def visualize_trajectory_py3dmol(symbols, trajectory, output_html='trajectory_vi
             let playInterval;
             let frameDelay = 500;
             
-            // Store all XYZ frames
-            const frames = [
-FRAME_DATA
-            ];
+            // Frame source: defines frameCount, frameXYZ(i), frameStep(i) and loadFrames(done)
+FRAME_LOADER
             
             // Initialize the 3Dmol viewer
             viewer = $3Dmol.createViewer($("#viewer"), {
@@ -204,17 +381,19 @@ FRAME_DATA
             
             // Function to show a specific frame
             function showFrame(frameIndex) {
-                if (frameIndex < 0 || frameIndex >= frames.length) return;
+                if (frameIndex < 0 || frameIndex >= frameCount) return;
                 
                 currentFrame = frameIndex;
                 
                 // Update UI
-                $("#frameCounter").text(`Frame ${frameIndex + 1} / ${frames.length}`);
+                let counter = `Frame ${frameIndex + 1} / ${frameCount}`;
+                if (frameStep(frameIndex) !== frameIndex + 1) counter += ` (step ${frameStep(frameIndex)})`;
+                $("#frameCounter").text(counter);
                 $("#frameSlider").val(frameIndex);
                 
                 // Update viewer
                 viewer.clear();
-                let model = viewer.addModel(frames[frameIndex], "xyz");
+                let model = viewer.addModel(frameXYZ(frameIndex), "xyz");
                 model.addBonds();
                 
                 // Set style for atoms and bonds
@@ -242,7 +421,7 @@ FRAME_DATA
                     isPlaying = false;
                 } else {
                     playInterval = setInterval(function() {
-                        showFrame((currentFrame + 1) % frames.length);
+                        showFrame((currentFrame + 1) % frameCount);
                     }, frameDelay);
                     $("#playBtn").text("Pause");
                     isPlaying = true;
@@ -251,11 +430,11 @@ FRAME_DATA
             
             // UI event handlers
             $("#prevBtn").click(function() {
-                showFrame((currentFrame - 1 + frames.length) % frames.length);
+                showFrame((currentFrame - 1 + frameCount) % frameCount);
             });
             
             $("#nextBtn").click(function() {
-                showFrame((currentFrame + 1) % frames.length);
+                showFrame((currentFrame + 1) % frameCount);
             });
             
             $("#playBtn").click(togglePlay);
@@ -278,7 +457,7 @@ FRAME_DATA
                 if (isPlaying) {
                     clearInterval(playInterval);
                     playInterval = setInterval(function() {
-                        showFrame((currentFrame + 1) % frames.length);
+                        showFrame((currentFrame + 1) % frameCount);
                     }, frameDelay);
                 }
             });
@@ -300,42 +479,37 @@ FRAME_DATA
             });
             
             // Initialize first frame
-            showFrame(0);
+            loadFrames(function() { showFrame(0); });
         });
     </script>
 </body>
 </html>
 """
     # Replace placeholders in the template
-    frames_str = ""
-    for i, frame in enumerate(xyz_frames):
-        frame_escaped = frame.replace("\n", "\\n").replace('"', '\\"')
-        frames_str += f'                "{frame_escaped}"'
-        if i < len(xyz_frames) - 1:
-            frames_str += ',\n'
-        else:
-            frames_str += '\n'
-    
-    html = html.replace("FRAME_COUNT", str(len(xyz_frames)))
-    html = html.replace("FRAME_MAX", str(len(xyz_frames) - 1))
-    html = html.replace("FRAME_DATA", frames_str)
+    html = html.replace("FRAME_COUNT", str(len(steps)))
+    html = html.replace("FRAME_MAX", str(len(steps) - 1))
+    html = html.replace("FRAME_LOADER", frame_loader)
     
     # Write the HTML file
     with open(output_html, 'w') as f:
         f.write(html)
     
-    print(f"3D visualization saved as '{output_html}'")
+    print(f"3D visualization saved as '{output_html}'" + (f" with frames in '{sidecar_path}'" if sidecar_path else ""))
     return output_html
 
 def main():
-    # Parse command line arguments
-    if len(sys.argv) > 1:
-        xyz_file = sys.argv[1]
+    # Parse command line arguments: positional files, then --compact, --sidecar, --min-rmsd=X, --viewer-url=URL
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    min_rmsd = next((float(flag.split('=', 1)[1]) for flag in flags if flag.startswith('--min-rmsd=')), None)
+    viewer_url = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--viewer-url=')), None)
+    if len(args) > 0:
+        xyz_file = args[0]
     else:
         xyz_file = 'geometry_trajectory.xyz'
     
-    if len(sys.argv) > 2:
-        output_file = sys.argv[2]
+    if len(args) > 1:
+        output_file = args[1]
     else:
         output_file = 'trajectory_visualization.html'
     
@@ -343,7 +517,8 @@ def main():
     symbols, trajectory = read_xyz_trajectory(xyz_file)
     
     # Create the visualization
-    html_file = visualize_trajectory_py3dmol(symbols, trajectory, output_file)
+    html_file = visualize_trajectory_py3dmol(symbols, trajectory, output_file, compact='--compact' in flags,
+                                             min_rmsd=min_rmsd, sidecar='--sidecar' in flags, viewer_url=viewer_url)
     
     print(f"Visualized {len(trajectory)} frames from {xyz_file}")
     print(f"Open {html_file} in a web browser to view the interactive 3D animation")
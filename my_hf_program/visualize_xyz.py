@@ -1,7 +1,9 @@
 import sys
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.lines import Line2D
 from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
 
 # Simple covalent radii (in Angstroms) for common elements
 COVALENT_RADII = {
@@ -32,30 +34,26 @@ def plot_xyz(filename, title=None, savefig=True):
     atoms, coords = read_xyz(filename)
     fig = plt.figure(figsize=(6,6))
     ax = fig.add_subplot(111, projection='3d')
-    # Draw bonds
-    for i in range(len(atoms)):
-        for j in range(i+1, len(atoms)):
-            r1 = coords[i]
-            r2 = coords[j]
-            d = np.linalg.norm(r1 - r2)
-            rad1 = COVALENT_RADII.get(atoms[i], 0.7)
-            rad2 = COVALENT_RADII.get(atoms[j], 0.7)
-            if d < 1.2 * (rad1 + rad2):  # Simple bond threshold
-                ax.plot([r1[0], r2[0]], [r1[1], r2[1]], [r1[2], r2[2]], color='gray', linewidth=2, alpha=0.7)
-    # Draw atoms
-    for i, (atom, xyz) in enumerate(zip(atoms, coords)):
-        color = ATOM_COLORS.get(atom, 'magenta')
-        ax.scatter(*xyz, s=200, c=color, edgecolors='k', label=atom if i == atoms.index(atom) else "")
+    # Draw all bonds as one collection
+    rad = np.array([COVALENT_RADII.get(atom, 0.7) for atom in atoms])
+    dist = np.linalg.norm(coords[:, None, :] - coords[None, :, :], axis=-1)
+    i, j = np.nonzero(np.triu(dist < 1.2 * (rad[:, None] + rad[None, :]), k=1))  # Simple bond threshold
+    if len(i):
+        ax.add_collection3d(Line3DCollection(np.stack([coords[i], coords[j]], axis=1), colors='gray',
+                                             linewidths=2, alpha=0.7))
+    # Draw all atoms with a single scatter; the legend gets one proxy marker per element
+    colors = [ATOM_COLORS.get(atom, 'magenta') for atom in atoms]
+    ax.scatter(coords[:, 0], coords[:, 1], coords[:, 2], s=200, c=colors, edgecolors='k', depthshade=False)
+    for atom, xyz in zip(atoms, coords):
         ax.text(*xyz, f'{atom}', fontsize=12, ha='center', va='center')
+    handles = {atom: Line2D([], [], marker='o', linestyle='', markersize=10, markerfacecolor=color,
+                            markeredgecolor='k', label=atom) for atom, color in zip(atoms, colors)}
     ax.set_xlabel('X (Angstrom)')
     ax.set_ylabel('Y (Angstrom)')
     ax.set_zlabel('Z (Angstrom)')
     if title:
         ax.set_title(title)
-    # Only show unique legend entries
-    handles, labels = ax.get_legend_handles_labels()
-    by_label = dict(zip(labels, handles))
-    ax.legend(by_label.values(), by_label.keys())
+    ax.legend(handles=list(handles.values()))
     plt.tight_layout()
     if savefig:
         plt.savefig('geometry_3d.png')